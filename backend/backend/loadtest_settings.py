@@ -0,0 +1,23 @@
+"""Settings for the servers started by the load-test commands (see users/utils/loadtest.py).
+
+The project settings named by LOADTEST_BASE_SETTINGS, with the default database pointed
+at the load test's throwaway database (LOADTEST_DATABASE_NAME), put in DB_POOL_MODE
+when that is set, and any settings in the LOADTEST_SETTINGS JSON object applied on top.
+"""
+import importlib
+import json
+import os
+from users.utils.db_pool import configure_database
+
+globals().update({
+    name: value
+    for name, value in vars(importlib.import_module(os.environ.get("LOADTEST_BASE_SETTINGS", "backend.settings"))).items()
+    if name.isupper()
+})
+
+DATABASES = {**DATABASES, "default": {**DATABASES["default"], "NAME": os.environ["LOADTEST_DATABASE_NAME"]}}
+
+if os.environ.get("DB_POOL_MODE"):
+    DATABASES["default"] = configure_database(DATABASES["default"])
+
+globals().update(json.loads(os.environ.get("LOADTEST_SETTINGS", "{}")))
@@ -0,0 +1,117 @@
+"""Gunicorn configuration, picked up automatically from the working directory.
+
+Environment:
+    GUNICORN_WORKER_CLASS         gthread (default), gevent or uvicorn
+    WEB_CONCURRENCY               worker processes (default: sized from the CPUs)
+    GUNICORN_THREADS              threads per gthread worker (default 4)
+    GUNICORN_WORKER_CONNECTIONS   concurrent connections per gevent worker (default 1000)
+    GUNICORN_MAX_REQUESTS         requests before a worker is recycled (default 1000, 0 disables)
+    GUNICORN_MAX_REQUESTS_JITTER  random extra requests, so workers don't recycle together (default 10%)
+    GUNICORN_TIMEOUT              seconds before a silent worker is killed (default 30)
+    GUNICORN_PRELOAD              load the app once in the master and fork it (default 1)
+    GUNICORN_LOGLEVEL             error log level (default info)
+    PORT                          listening port (default 8000)
+
+gevent needs `gevent` (and `psycogreen` for cooperative Postgres I/O) installed; uvicorn
+serves the ASGI application, async views included. Every worker also starts its own
+password-hash pool; unless PASSWORD_HASH_WORKERS is set (in the environment or the
+Django settings), the CPUs are split between the workers' pools, or, when there are at
+least as many workers as CPUs, every worker hashes inline on its request threads.
+"""
+import os
+
+try:
+    CPUS = len(os.sched_getaffinity(0))
+except AttributeError:
+    CPUS = os.cpu_count() or 1
+
+worker_type = os.environ.get("GUNICORN_WORKER_CLASS", "gthread").lower()
+
+if worker_type == "gevent":
+    # Patch before the app is preloaded, or the master's imports keep blocking sockets.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+if worker_type == "uvicorn":
+    try:
+        import uvicorn_worker  # noqa: F401
+
+        worker_class = "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        worker_class = "uvicorn.workers.UvicornWorker"
+    wsgi_app = "backend.asgi:application"
+    default_workers = CPUS
+elif worker_type == "gevent":
+    worker_class = "gevent"
+    wsgi_app = "backend.wsgi:application"
+    default_workers = CPUS
+    worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+elif worker_type == "gthread":
+    worker_class = "gthread"
+    wsgi_app = "backend.wsgi:application"
+    # Threads overlap I/O waits; the extra processes cover the GIL-bound work.
+    default_workers = 2 * CPUS + 1
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+else:
+    raise RuntimeError(f"Unsupported GUNICORN_WORKER_CLASS {worker_type!r}; use gthread, gevent or uvicorn.")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
+# Read by users.utils.password_hashing in every worker, so all their pools together
+# run about one hash per CPU instead of one per CPU each: `workers * (CPUS // workers)`
+# pool processes per host. With at least as many workers as CPUs (gthread's default
+# 2 * CPUS + 1) that is 0 and the workers hash inline, so the host runs `workers` hashes
+# at most rather than one pool process per worker on top of the workers themselves.
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(CPUS // workers))
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+backlog = 2048
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers to bound slow memory growth, staggered so they don't all restart at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").lower() not in ("0", "false", "no")
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers into timeouts.
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+
+def pre_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # Nothing opened by the preloaded app in the master may be shared with a worker:
+    # close its database connections and pools so every worker opens its own.
+    from django.db import connections
+
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+
+
+def post_fork(server, worker):
+    """Drops per-process clients inherited from the master; each is rebuilt on first use."""
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+    from users.utils.email_transport import close_transport
+    from users.utils.password_hashing import shutdown_executor
+
+    for connection in connections.all(initialized_only=True):
+        # Forget, don't close: closing would end the master's session on the shared socket.
+        connection.connection = None
+    close_transport()
+    shutdown_executor()
+
+    if worker_type == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning("psycogreen is not installed; Postgres queries will block the gevent worker.")
+        else:
+            patch_psycopg()
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from django.db import transaction
+from .models import CustomUser, OutboundEmail
+from users.authentication import invalidate_user
+from users.utils.profile_cache import invalidate_profile
+from users.utils.revocation import revoke_deleted_users, revoke_tokens
 
 class CustomUserAdmin(UserAdmin):
     """Admin panel customization for CustomUser."""
@@ -23,4 +27,39 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and form.changed_data:
+            # Outstanding tokens carry the old email and flags as claims.
+            obj.token_version = revoke_tokens(obj.pk)[obj.pk]
+        invalidate_profile(obj.pk)
+        invalidate_user(obj.pk)
+
+    def delete_model(self, request, obj):
+        user_id = obj.pk
+        with transaction.atomic():
+            revoke_deleted_users(user_id)
+            super().delete_model(request, obj)
+        invalidate_profile(user_id)
+        invalidate_user(user_id)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            user_ids = list(queryset.values_list("pk", flat=True))
+            revoke_deleted_users(*user_ids)
+            super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            invalidate_profile(user_id)
+            invalidate_user(user_id)
+
+admin.site.register(CustomUser, CustomUserAdmin)
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Read-mostly view of the email outbox for troubleshooting deliveries."""
+
+    list_display = ("to_email", "subject", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("to_email",)
+    ordering = ("-created_at",)
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
\ No newline at end of file
@@ -1,6 +1,16 @@
+import os
 from django.apps import AppConfig
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from users.hashers import autotune
+        # Registers the execute wrapper on every database connection opened from here on.
+        import users.utils.metrics  # noqa: F401
+        from users.utils.password_hashing import POOL_WORKER_ENV
+
+        if not os.environ.get(POOL_WORKER_ENV):
+            autotune()
@@ -0,0 +1,222 @@
+"""Async variants of the hottest endpoints, served under /api/async/ by the ASGI profile.
+
+They answer exactly like their counterparts in users.views, but never hold the event
+loop: the ORM is used through its async API, password hashing is awaited on the hash
+pool and verification emails are queued with an awaited INSERT. The few synchronous
+steps that may touch the network (JWT authentication, cooldown claims, the profile
+cache) run in a thread.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
+from django.utils.timezone import now
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import StatelessJWTAuthentication
+from .password_policy import validate_password
+from .serializers import CustomTokenObtainPairSerializer, UserProfileSerializer
+from users.utils import password_hashing
+from users.utils.email_service import asend_verification_email, generate_verification_code
+from users.utils.profile_cache import get_profile_cache
+
+User = get_user_model()
+
+
+def error(message, status=400, **extra):
+    return JsonResponse({"error": message, **extra}, status=status)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    """JSON in, JSON out; CSRF-exempt like DRF's APIView since auth is by bearer token."""
+
+    http_method_names = ["post", "options"]
+
+    @staticmethod
+    def parse_json(request):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    @staticmethod
+    def exception_response(exc):
+        """The response DRF's exception handler would give for an APIException."""
+        detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        response = JsonResponse(detail, status=exc.status_code)
+        if exc.status_code == 401:
+            response["WWW-Authenticate"] = 'Bearer realm="api"'
+        return response
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method == "POST":
+            request.data = self.parse_json(request)
+            if request.data is None:
+                return JsonResponse({"detail": "JSON parse error."}, status=400)
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            # E.g. HashingUnavailable (503) when the hash pool is saturated.
+            return self.exception_response(exc)
+
+
+async def claim_verification_code_request(user):
+    # The cooldown lives in the shared cache, which may be a network round trip away.
+    return await sync_to_async(user.claim_verification_code_request, thread_sensitive=False)()
+
+
+async def send_new_verification_code(user, email):
+    verification_code = generate_verification_code()
+    if await User.objects.aset_verification_code(user.pk, verification_code):
+        await asend_verification_email(email, verification_code)
+
+
+### User Registration with Email Verification
+class AsyncRegisterView(AsyncAPIView):
+    query_budget = 3
+
+    async def post(self, request):
+        email = request.data.get("email")
+        password = request.data.get("password")
+        confirm_password = request.data.get("confirm_password")
+
+        if not email or not password or not confirm_password:
+            return error("Email, password, and confirmation are required.")
+
+        if password != confirm_password:
+            return error("Passwords do not match.")
+
+        try:
+            validate_email(email)
+        except ValidationError:
+            return error("Invalid email format.")
+
+        violations = validate_password(password, email)
+        if violations:
+            return error(violations[0], errors=violations)
+
+        user = await User.objects.filter_email(email).afirst()
+
+        if user and not user.is_active:
+            if not await claim_verification_code_request(user):
+                return error("User already exists but is not verified. Please wait before requesting another verification code.")
+
+            await send_new_verification_code(user, email)
+            return error("User already exists but is not verified. A new verification code has been sent to your email.")
+
+        if user:
+            return error("Email is already registered.")
+
+        user = User(
+            email=User.objects.normalize_email(email),
+            is_active=False,
+            verification_code=generate_verification_code(),
+            verification_code_sent_at=now(),
+        )
+        await password_hashing.aset_password(user, password)
+        await user.asave()
+        await claim_verification_code_request(user)
+
+        await asend_verification_email(email, user.verification_code)
+
+        return JsonResponse({"message": "User registered successfully. Check your email for the verification code."}, status=201)
+
+
+### Verify Email
+class AsyncVerifyEmailView(AsyncAPIView):
+    query_budget = 2
+
+    async def post(self, request):
+        email, code = request.data.get("email"), request.data.get("code")
+        if await User.objects.averify_email(email, code):
+            return JsonResponse({"message": "Email verified successfully."})
+
+        user = await User.objects.filter_email(email).values("verification_code").afirst()
+        if user is None:
+            return error("User not found.", status=404)
+        if not code or user["verification_code"] != code:
+            return error("Invalid verification code.")
+        return error("Verification code has expired.")
+
+
+### User Login
+class AsyncLoginView(AsyncAPIView):
+    query_budget = 2
+
+    async def post(self, request):
+        email = request.data.get("email")
+        password = request.data.get("password")
+
+        user = await User.objects.filter_email(email).afirst()
+        if user is None:
+            return error("User not found", status=404)
+
+        if not user.is_active:
+            if not await claim_verification_code_request(user):
+                return error("Email not verified. Please check your email.")
+
+            await send_new_verification_code(user, email)
+            return error("Email not verified. A new verification code has been sent.")
+
+        if not email or not password:
+            return JsonResponse({"non_field_errors": ["Email and password are required."]}, status=400)
+        if not await password_hashing.acheck_password(user, password):
+            return JsonResponse({"non_field_errors": ["Invalid email or password."]}, status=400)
+
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            user.last_login = now()
+            await user.asave(update_fields=["last_login"])
+
+        return JsonResponse({
+            "refresh": str(refresh),
+            "access": str(refresh.access_token),
+            "user": {
+                "id": user.id,
+                "email": user.email,
+                "is_active": user.is_active,
+                "is_staff": user.is_staff,
+            },
+        })
+
+
+### User profile
+class AsyncUserProfileView(AsyncAPIView):
+    http_method_names = ["get", "options"]
+    query_budget = 1
+
+    async def get(self, request):
+        authenticated = await sync_to_async(StatelessJWTAuthentication().authenticate)(request)
+        if authenticated is None:
+            raise NotAuthenticated()
+        user = authenticated[0]
+
+        # The profile cache is the shared cache by default, a network round trip away.
+        profiles = get_profile_cache()
+        key, entry = await sync_to_async(profiles.lookup, thread_sensitive=False)(user.pk)
+        if entry is None:
+            try:
+                instance = await User.objects.aget(pk=user.pk)
+            except User.DoesNotExist:
+                # Deleted after the token was issued; answered like users.authentication.load_user().
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            entry = await sync_to_async(profiles.store, thread_sensitive=False)(key, UserProfileSerializer(instance).data)
+        data, etag = entry
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponse(status=304)
+        else:
+            response = JsonResponse(data)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
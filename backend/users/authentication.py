@@ -0,0 +1,166 @@
+"""JWT authentication that answers most requests from the token's own claims.
+
+Tokens issued by `CustomTokenObtainPairSerializer` carry the user's id, email,
+`is_active`, `is_staff` and `token_version`. For read-only requests
+`StatelessJWTAuthentication` builds a `ClaimsUser` from those claims without touching
+the database; the `CustomUser` row is only loaded, through a short-TTL per-process
+cache, if the view reads an attribute the claims don't cover. Requests that may write
+still get a freshly loaded model instance. Either way, tokens older than the user's
+current `token_version` are rejected (see `users.utils.revocation`).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from users.utils.revocation import is_token_revoked
+
+STATELESS_CLAIMS = ("email", "is_active", "is_staff", "token_version")
+
+USER_CACHE_TTL = getattr(settings, "AUTH_USER_CACHE_TTL", 30)
+USER_CACHE_SIZE = getattr(settings, "AUTH_USER_CACHE_SIZE", 10_000)
+
+
+def add_user_claims(token, user):
+    """Copies the claims `StatelessJWTAuthentication` trusts onto a freshly issued token."""
+    for claim in STATELESS_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class UserCache:
+    """Per-process LRU of recently loaded users, each kept for at most `ttl` seconds.
+
+    Callers get a shallow copy so one request can't see another's unsaved changes.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return copy.copy(entry[1])
+
+    def set(self, user):
+        with self._lock:
+            self._entries[user.pk] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._entries.move_to_end(user.pk)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(user_id):
+    """Drops the cached row after a write that changes the user (password, email, profile, flags)."""
+    user_cache.invalidate(user_id)
+
+
+def load_user(user_id):
+    """The user's model instance, from the user cache when it's fresh enough."""
+    user = user_cache.get(user_id)
+    if user is None:
+        try:
+            user = get_user_model().objects.get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        user_cache.set(user)
+    return user
+
+
+class ClaimsUser:
+    """Authenticated user backed by token claims.
+
+    `id`, `pk`, `email`, `is_active`, `is_staff` and `token_version` come straight from
+    the token; any other attribute loads the model via `load_user()` on first use.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = get_user_model()._meta.pk.to_python(token[jwt_settings.USER_ID_CLAIM])
+        self.email = token["email"]
+        self.is_active = token["is_active"]
+        self.is_staff = token["is_staff"]
+        self.token_version = token["token_version"]
+        self._instance = None
+
+    @property
+    def instance(self):
+        if self._instance is None:
+            self._instance = load_user(self.pk)
+        return self._instance
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+
+    def __str__(self):
+        return self.email
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+def get_model_instance(user):
+    """The `CustomUser` behind `request.user`, whichever authentication produced it."""
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Trusts signed claims on safe methods; loads the user from the database otherwise.
+
+    Tokens issued before the claims were added fall back to the database lookup.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        if request.method in SAFE_METHODS and all(claim in validated_token for claim in STATELESS_CLAIMS):
+            if jwt_settings.CHECK_USER_IS_ACTIVE and not validated_token["is_active"]:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return ClaimsUser(validated_token), validated_token
+        user = self.get_user(validated_token)
+        # The row is at hand anyway, so also catch revocations the mirror hasn't synced yet.
+        if validated_token.get("token_version", 0) < user.token_version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        return user, validated_token
@@ -0,0 +1,123 @@
+"""Password hashers whose algorithm and work factor are chosen per environment.
+
+`PASSWORD_HASH_POLICY` in settings holds the work factors, e.g.::
+
+    PASSWORD_HASHERS = password_hashers(os.environ.get("PASSWORD_HASH_ALGORITHM", "pbkdf2_sha256"))
+    PASSWORD_HASH_POLICY = {"pbkdf2_iterations": 1_000_000, "target_ms": 250}
+
+The configured work factors are floors. With `target_ms` set, `autotune()` times a hash
+at startup and raises the preferred hasher's cost toward that budget. Stored hashes
+weaker than the current policy are rehashed by Django on the next successful
+`check_password()`; stronger ones are left alone, so pods tuned to slightly different
+costs don't keep rewriting each other's hashes.
+"""
+import math
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+    get_hasher,
+)
+
+# Work factors raised by autotune(), keyed by policy name.
+_tuned = {}
+
+POLICY_HASHERS = {
+    "pbkdf2_sha256": "users.hashers.PolicyPBKDF2PasswordHasher",
+    "scrypt": "users.hashers.PolicyScryptPasswordHasher",
+    "argon2": "users.hashers.PolicyArgon2PasswordHasher",
+}
+
+
+def password_hashers(algorithm="pbkdf2_sha256"):
+    """PASSWORD_HASHERS value that hashes with `algorithm` and still verifies the others."""
+    if algorithm not in POLICY_HASHERS:
+        raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+    preferred = POLICY_HASHERS[algorithm]
+    return [preferred] + [path for path in POLICY_HASHERS.values() if path != preferred]
+
+
+def policy(name, default):
+    """Current work factor `name`: the autotuned value, else PASSWORD_HASH_POLICY, else default."""
+    if name in _tuned:
+        return _tuned[name]
+    return getattr(settings, "PASSWORD_HASH_POLICY", {}).get(name, default)
+
+
+class PolicyPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with iterations from `pbkdf2_iterations`."""
+
+    @property
+    def iterations(self):
+        return policy("pbkdf2_iterations", PBKDF2PasswordHasher.iterations)
+
+    def must_update(self, encoded):
+        return self.decode(encoded)["iterations"] < self.iterations
+
+    def tune(self, scale):
+        return {"pbkdf2_iterations": max(self.iterations, int(self.iterations * scale))}
+
+
+class PolicyScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with N from `scrypt_work_factor`."""
+
+    @property
+    def work_factor(self):
+        return policy("scrypt_work_factor", ScryptPasswordHasher.work_factor)
+
+    def must_update(self, encoded):
+        return self.decode(encoded)["work_factor"] < self.work_factor
+
+    def tune(self, scale):
+        # scrypt's N must stay a power of two.
+        exponent = round(math.log2(self.work_factor * scale))
+        return {"scrypt_work_factor": max(self.work_factor, 2 ** exponent)}
+
+
+class PolicyArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with `argon2_time_cost` / `argon2_memory_cost` (requires argon2-cffi)."""
+
+    @property
+    def time_cost(self):
+        return policy("argon2_time_cost", Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return policy("argon2_memory_cost", Argon2PasswordHasher.memory_cost)
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return decoded["time_cost"] < self.time_cost or decoded["memory_cost"] < self.memory_cost
+
+    def tune(self, scale):
+        return {"argon2_time_cost": max(self.time_cost, round(self.time_cost * scale))}
+
+
+def time_hash(hasher, rounds=3):
+    """Median seconds per `encode()` for the hasher at its current cost."""
+    salt = hasher.salt()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hasher.encode("autotune-Pa55word!", salt)
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)[len(samples) // 2]
+
+
+def autotune():
+    """Raise the preferred hasher's work factor toward PASSWORD_HASH_POLICY["target_ms"].
+
+    Returns the tuned work factors, or an empty dict when no budget is configured or the
+    preferred hasher is not one of the policy hashers.
+    """
+    target_ms = getattr(settings, "PASSWORD_HASH_POLICY", {}).get("target_ms")
+    hasher = get_hasher("default")
+    if not target_ms or not hasattr(hasher, "tune"):
+        return {}
+
+    elapsed = time_hash(hasher)
+    tuned = hasher.tune(target_ms / 1000 / elapsed)
+    _tuned.update(tuned)
+    return tuned
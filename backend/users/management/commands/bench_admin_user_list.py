@@ -0,0 +1,55 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.utils.admin_users import ADMIN_USER_FIELDS, encode_cursor
+from users.utils.bench import benchmark_database, seed_users, summarize
+from users.views import AdminUserListView
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and show admin user list latency at increasing page depth."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500_000, help="Users to seed.")
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20, help="Requests timed per page position.")
+
+    def handle(self, *args, users, page_size, repeat, **options):
+        with benchmark_database():
+            self.stdout.write(f"Seeding {users} users...")
+            seed_users(users)
+            admin = User.objects.create_superuser(email="bench-admin@example.com", password="x")
+
+            view = AdminUserListView.as_view()
+            factory = APIRequestFactory()
+            ids = User.objects.order_by("id").values_list("id", flat=True)
+
+            self.stdout.write(f"{'page depth':>12} {'keyset p50':>12} {'keyset p95':>12} {'OFFSET p50':>12}")
+            for position in sorted({0, users // 100, users // 10, users // 2, max(users - page_size, 0)}):
+                params = {"page_size": page_size}
+                if position:
+                    params["cursor"] = encode_cursor(ids[position - 1])
+
+                keyset = []
+                for _ in range(repeat):
+                    request = factory.get("/api/admin/users/", params)
+                    force_authenticate(request, user=admin)
+                    started = time.perf_counter()
+                    response = view(request)
+                    keyset.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.data
+
+                offset = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    list(User.objects.order_by("id").values(*ADMIN_USER_FIELDS)[position:position + page_size])
+                    offset.append(time.perf_counter() - started)
+
+                keyset_stats, offset_stats = summarize(keyset), summarize(offset)
+                self.stdout.write(
+                    f"{position // page_size + 1:>12} {keyset_stats['p50_ms']:>9.2f} ms "
+                    f"{keyset_stats['p95_ms']:>9.2f} ms {offset_stats['p50_ms']:>9.2f} ms"
+                )
@@ -0,0 +1,100 @@
+import logging
+import platform
+import time
+from unittest import mock
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from users.throttling import SharedScopedRateThrottle
+from users.utils.api_bench import ROUTES, ApiFixture, compare, load_baseline, run_route, save_baseline
+from users.utils.bench import StubEmailServer, benchmark_database
+from users.utils.email_service import process_outbox_batch
+from users.utils.revocation import token_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every users API route with concurrent clients against a seeded throwaway database and report "
+        "RPS, p50/p95/p99, queries and CPU per request. Save the results as a baseline or compare against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5000, help="Users seeded before the run.")
+        parser.add_argument("--requests", type=int, default=100, help="Requests per route.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Client threads per route.")
+        parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+        parser.add_argument("--save", metavar="PATH", help="Write the results to PATH as a baseline.")
+        parser.add_argument("--compare", dest="baseline_path", metavar="PATH", help="Compare the results against the baseline at PATH.")
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Relative change in RPS, p95 or CPU/request counted as a regression.")
+        parser.add_argument("--fail-on-regression", action="store_true", help="Exit with an error if any metric regressed.")
+
+    def handle(self, *args, users, requests, concurrency, routes, save, baseline_path, threshold, fail_on_regression,
+               **options):
+        baseline = load_baseline(baseline_path) if baseline_path else None
+        if connection.vendor == "sqlite" and concurrency > 1:
+            self.stderr.write("SQLite serializes writers; running with one client thread.")
+            concurrency = 1
+
+        # Status codes are part of the report; keep Django's per-request warnings out of it.
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        rates = {scope: "1000000/min" for scope in ("resend_verification", "forgot_password", "change_email")}
+
+        with StubEmailServer() as stub, benchmark_database(), \
+                override_settings(AZURE_EMAIL_CONNECTION_STRING=stub.connection_string, PASSWORD_HASH_WORKERS=0), \
+                mock.patch.object(SharedScopedRateThrottle, "THROTTLE_RATES", rates), \
+                mock.patch.object(token_versions, "interval", 0):
+            fixture = ApiFixture(users)
+            prepared = [(route, ROUTES[route](fixture, requests)) for route in routes]
+
+            results = {}
+            self.stdout.write(
+                f"{'route':<22} {'RPS':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'CPU ms':>8}  statuses"
+            )
+            for route, route_requests in prepared:
+                metrics = results[route] = run_route(route, route_requests, concurrency).metrics()
+                self.stdout.write(
+                    f"{route:<22} {metrics['rps']:>8.1f} {metrics['p50_ms']:>6.1f} ms {metrics['p95_ms']:>6.1f} ms "
+                    f"{metrics['p99_ms']:>6.1f} ms {metrics['queries_per_request']:>8.2f} "
+                    f"{metrics['cpu_ms_per_request']:>8.2f}  "
+                    + ", ".join(f"{code}: {count}" for code, count in metrics["statuses"].items())
+                )
+
+            started, delivered = time.perf_counter(), 0
+            while True:
+                sent, failed = process_outbox_batch()
+                delivered += sent
+                if not sent and not failed:
+                    break
+            self.stdout.write(f"{delivered} queued emails delivered to the stub in {time.perf_counter() - started:.2f} s")
+
+        meta = {
+            "users": users, "requests": requests, "concurrency": concurrency,
+            "database": connection.vendor, "python": platform.python_version(), "machine": platform.node(),
+        }
+        if save:
+            save_baseline(save, meta, results)
+            self.stdout.write(f"Baseline saved to {save}")
+        if baseline:
+            self.report_comparison(baseline, meta, results, threshold, fail_on_regression)
+
+    def report_comparison(self, baseline, meta, results, threshold, fail_on_regression):
+        differing = {key: (baseline["meta"].get(key), value) for key, value in meta.items() if baseline["meta"].get(key) != value}
+        if differing:
+            self.stdout.write(self.style.WARNING(f"Baseline ran with different settings: {differing}"))
+
+        rows = compare(baseline["routes"], results, threshold)
+        regressions = [row for row in rows if row[-1]]
+        self.stdout.write(f"\n{'route':<22} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+        for route, metric, before, after, regressed in rows:
+            change = f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+            line = f"{route:<22} {metric:<20} {before:>10.2f} {after:>10.2f} {change:>8}"
+            self.stdout.write(self.style.ERROR(line + "  REGRESSION") if regressed else line)
+
+        if regressions:
+            summary = f"{len(regressions)} regression(s) against the baseline."
+            if fail_on_regression:
+                raise CommandError(summary)
+            self.stdout.write(self.style.ERROR(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
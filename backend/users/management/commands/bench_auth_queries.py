@@ -0,0 +1,84 @@
+import logging
+import time
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from users import views
+from users.authentication import StatelessJWTAuthentication, user_cache
+from users.serializers import CustomTokenObtainPairSerializer
+from users.utils.bench import benchmark_database, summarize
+from users.utils.profile_cache import get_profile_cache
+
+User = get_user_model()
+
+AUTHENTICATED_VIEWS = [
+    view for view in vars(views).values()
+    if isinstance(view, type) and StatelessJWTAuthentication in getattr(view, "authentication_classes", ())
+]
+
+
+class Command(BaseCommand):
+    help = "Compare queries and latency per request for simplejwt's default authentication and the stateless one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200, help="Requests timed per route and mode.")
+
+    def routes(self, member, admin):
+        return [
+            ("GET profile", member, "get", reverse("user_profile"), None),
+            ("GET admin users", admin, "get", reverse("admin_users"), None),
+            ("GET admin user", admin, "get", reverse("admin_user_detail", args=[member.id]), None),
+            ("POST verify new email", member, "post", reverse("verify-new-email"), {"code": "000000"}),
+        ]
+
+    def measure(self, routes, repeat):
+        results = []
+        for label, client, method, url, data in routes:
+            user_cache.clear()
+            get_profile_cache.cache_clear()
+            timings, queries = [], 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data, format="json")
+                    timings.append(time.perf_counter() - started)
+                queries += len(captured)
+            assert response.status_code < 500, response.content
+            results.append((label, queries / repeat, summarize(timings)["p50_ms"]))
+        return results
+
+    def handle(self, *args, repeat, **options):
+        with benchmark_database():
+            member = User.objects.create_user(email="bench-member@example.com", password="x", is_active=True)
+            admin = User.objects.create_superuser(email="bench-admin@example.com", password="x")
+
+            clients = {}
+            for user in (member, admin):
+                client = APIClient()
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}")
+                clients[user.pk] = client
+            routes = [(label, clients[user.pk], *rest) for label, user, *rest in self.routes(member, admin)]
+
+            # The verify-new-email route answers 400 by design; keep those warnings out of the report.
+            logging.getLogger("django.request").setLevel(logging.ERROR)
+            patches = [mock.patch.object(view, "authentication_classes", [JWTAuthentication]) for view in AUTHENTICATED_VIEWS]
+            for patch in patches:
+                patch.start()
+            try:
+                before = self.measure(routes, repeat)
+            finally:
+                for patch in patches:
+                    patch.stop()
+            after = self.measure(routes, repeat)
+
+            self.stdout.write(f"{'route':<24} {'queries/req before':>19} {'after':>7} {'p50 before':>11} {'after':>9}")
+            for (label, queries_before, p50_before), (_, queries_after, p50_after) in zip(before, after):
+                self.stdout.write(
+                    f"{label:<24} {queries_before:>19.2f} {queries_after:>7.2f} "
+                    f"{p50_before:>8.2f} ms {p50_after:>6.2f} ms"
+                )
@@ -0,0 +1,73 @@
+import json
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from users.serializers import CustomTokenObtainPairSerializer
+from users.utils.bench import benchmark_database, summarize
+from users.utils.db_pool import POOL_MODES
+from users.utils.loadtest import ServerError, drive, port_is_free, route_requests, seed_load_users, server, server_env
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request latency of UserProfileView.get (and other cheap routes) with each DB_POOL_MODE, "
+        "under gunicorn against a throwaway copy of the configured Postgres database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", nargs="+", choices=POOL_MODES, default=["none", "persistent", "pool"],
+                            help="pgbouncer needs DB_HOST/DB_PORT pointing at a running PgBouncer.")
+        parser.add_argument("--routes", nargs="+", choices=["profile", "validate-reset-token"], default=["profile"])
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--port", type=int, default=8767)
+
+    def handle(self, *args, modes, routes, workers, threads, users, concurrency, duration, port, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The server processes need a shared database; configure a PostgreSQL-compatible one.")
+        if not port_is_free(port):
+            raise CommandError(f"Port {port} is already in use.")
+
+        with benchmark_database():
+            tokens, emails = seed_load_users(users)
+            staff = get_user_model().objects.create_superuser(email="bench-pool-admin@example.com", password="x")
+            admin_token = str(CustomTokenObtainPairSerializer.get_token(staff).access_token)
+            connection.close()
+
+            self.stdout.write(f"{workers} worker(s) x {threads} threads, {concurrency} connections, {duration:.0f} s per run")
+            self.stdout.write(
+                f"{'mode':<11} {'route':<21} {'served/s':>9} {'p50':>9} {'p99':>10} {'waits':>7} {'wait ms':>9}"
+            )
+            for mode in modes:
+                env = server_env(
+                    DB_POOL_MODE=mode,
+                    DB_POOL_MAX_SIZE=str(threads),
+                    GUNICORN_WORKER_CLASS="gthread",
+                    WEB_CONCURRENCY=str(workers),
+                    GUNICORN_THREADS=str(threads),
+                    GUNICORN_LOGLEVEL="warning",
+                    GUNICORN_MAX_REQUESTS="0",
+                    # Every profile read goes to the database rather than the profile cache.
+                    LOADTEST_SETTINGS=json.dumps({"PROFILE_CACHE_OPTIONS": {"timeout": 0}}),
+                )
+                try:
+                    with server(["gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"], port, env=env):
+                        for route in routes:
+                            latencies, statuses, elapsed = drive(
+                                port, route_requests(route, "/api/", tokens, emails), concurrency, duration
+                            )
+                            stats = summarize(latencies)
+                            pool = httpx.get(
+                                f"http://127.0.0.1:{port}/api/admin/db-pool/",
+                                headers={"Authorization": f"Bearer {admin_token}"},
+                            ).json()
+                            self.stdout.write(
+                                f"{mode:<11} {route:<21} {len(latencies) / elapsed:>9.1f} {stats['p50_ms']:>6.2f} ms "
+                                f"{stats['p99_ms']:>7.2f} ms {pool.get('waits', '-'):>7} {pool.get('wait_time_ms', '-'):>9}"
+                            )
+                except ServerError as exc:
+                    raise CommandError(f"gunicorn with DB_POOL_MODE={mode} did not start:\n{exc}")
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from users.utils.bench import StubEmailServer, summarize
+from users.utils.email_service import build_message
+from users.utils.email_transport import AzureEmailTransport
+
+
+class Command(BaseCommand):
+    help = "Compare per-email latency of a reused Azure email client against one client per send."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--emails", type=int, default=200, help="Messages sent per mode.")
+
+    def handle(self, *args, emails, **options):
+        message = build_message("bench@example.com", "Benchmark", "Benchmark message")
+
+        with StubEmailServer() as server:
+            for label, reuse in (("per-send client", False), ("reused client", True)):
+                transport = AzureEmailTransport(server.connection_string, reuse_client=reuse)
+                server.connections.clear()
+                latencies = []
+                for _ in range(emails):
+                    started = time.perf_counter()
+                    transport.send(message)
+                    latencies.append(time.perf_counter() - started)
+                transport.close()
+
+                stats = summarize(latencies)
+                self.stdout.write(
+                    f"{label:<16} mean {stats['mean_ms']:7.2f} ms  p50 {stats['p50_ms']:7.2f} ms  "
+                    f"p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms  "
+                    f"connections {len(server.connections)}"
+                )
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+from itertools import product
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from users.utils.bench import benchmark_database, summarize
+from users.utils.loadtest import (
+    ASYNC_ROUTES, ServerError, drive, format_statuses, port_is_free, route_requests, seed_load_users, server, server_env,
+)
+
+CPUS = os.cpu_count() or 1
+
+# Worker class -> (module it needs, URL prefix of the views it serves).
+WORKER_CLASSES = {
+    "gthread": (None, "/api/"),
+    "gevent": ("gevent", "/api/"),
+    "uvicorn": ("uvicorn", "/api/async/"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Sweep gunicorn worker classes, worker counts and thread counts under gunicorn.conf.py "
+        "and report throughput per configuration, against a throwaway copy of the configured Postgres database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-classes", nargs="+", choices=list(WORKER_CLASSES), default=list(WORKER_CLASSES))
+        parser.add_argument("--workers", nargs="+", type=int, default=sorted({1, CPUS, 2 * CPUS + 1}))
+        parser.add_argument("--threads", nargs="+", type=int, default=[1, 4, 8], help="Only swept for gthread.")
+        parser.add_argument("--routes", nargs="+", choices=ASYNC_ROUTES, default=["profile", "verify-email"])
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per route and configuration.")
+        parser.add_argument("--port", type=int, default=8766)
+
+    def configurations(self, worker_classes, workers, threads):
+        for worker_class in worker_classes:
+            module = WORKER_CLASSES[worker_class][0]
+            if module and importlib.util.find_spec(module) is None:
+                self.stdout.write(f"skipping {worker_class}: {module} is not installed")
+                continue
+            for count, thread_count in product(workers, threads if worker_class == "gthread" else [None]):
+                yield worker_class, count, thread_count
+
+    def handle(self, *args, worker_classes, workers, threads, routes, users, concurrency, duration, port, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The server processes need a shared database; configure a PostgreSQL-compatible one.")
+        if not port_is_free(port):
+            raise CommandError(f"Port {port} is already in use.")
+
+        with benchmark_database():
+            tokens, emails = seed_load_users(users)
+            configurations = list(self.configurations(worker_classes, workers, threads))
+
+            self.stdout.write(f"{CPUS} CPU(s), {concurrency} connections, {duration:.0f} s per run")
+            self.stdout.write(
+                f"{'class':<8} {'workers':>7} {'threads':>7} {'route':<13} {'served/s':>9} {'p50':>10} {'p99':>10}  statuses"
+            )
+            for worker_class, count, thread_count in configurations:
+                env = server_env(
+                    GUNICORN_WORKER_CLASS=worker_class,
+                    WEB_CONCURRENCY=str(count),
+                    GUNICORN_THREADS=str(thread_count or 1),
+                    GUNICORN_LOGLEVEL="warning",
+                    # Keep recycling out of short runs; it is measured in production, not here.
+                    GUNICORN_MAX_REQUESTS="0",
+                )
+                prefix = WORKER_CLASSES[worker_class][1]
+                try:
+                    with server(["gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"], port, env=env):
+                        for route in routes:
+                            latencies, statuses, elapsed = drive(
+                                port, route_requests(route, prefix, tokens, emails), concurrency, duration
+                            )
+                            stats = summarize(latencies)
+                            self.stdout.write(
+                                f"{worker_class:<8} {count:>7} {thread_count or '-':>7} {route:<13} "
+                                f"{len(latencies) / elapsed:>9.1f} {stats['p50_ms']:>7.1f} ms {stats['p99_ms']:>7.1f} ms  "
+                                f"{format_statuses(statuses)}"
+                            )
+                except ServerError as exc:
+                    raise CommandError(f"gunicorn ({worker_class}, {count} workers) did not start:\n{exc}")
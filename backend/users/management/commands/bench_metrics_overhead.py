@@ -0,0 +1,81 @@
+import logging
+import time
+from statistics import median
+from unittest import mock
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import modify_settings, override_settings
+from users.throttling import SharedScopedRateThrottle
+from users.utils.api_bench import ROUTES, ApiFixture, run_route
+from users.utils.bench import StubEmailServer, benchmark_database
+from users.utils.metrics import metrics, time_query
+from users.utils.revocation import token_versions
+
+METRICS_MIDDLEWARE = "users.middleware.MetricsMiddleware"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what users.middleware.MetricsMiddleware costs: the recording calls on their own, then API "
+        "routes driven with and without the middleware in alternating rounds against a seeded throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=3000, help="Users seeded before the run.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per route, round and mode.")
+        parser.add_argument("--rounds", type=int, default=4, help="Rounds alternate which mode runs first.")
+        parser.add_argument("--routes", nargs="+", choices=list(ROUTES),
+                            default=["profile-get", "validate-reset-token", "verify-email", "admin-detail-get"])
+        parser.add_argument("--queries", type=int, default=5, help="Statements per simulated request in the micro run.")
+
+    def handle(self, *args, users, requests, rounds, routes, queries, **options):
+        self.stdout.write(f"recording cost: {self.recording_cost(queries):.1f} µs per request with {queries} queries")
+
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        rates = {scope: "1000000/min" for scope in ("resend_verification", "forgot_password", "change_email")}
+        concurrency = 1 if connection.vendor == "sqlite" else 4
+        samples = {(route, mode): [] for route in routes for mode in ("off", "on")}
+
+        with StubEmailServer() as stub, benchmark_database(), \
+                override_settings(AZURE_EMAIL_CONNECTION_STRING=stub.connection_string, PASSWORD_HASH_WORKERS=0), \
+                mock.patch.object(SharedScopedRateThrottle, "THROTTLE_RATES", rates), \
+                mock.patch.object(token_versions, "interval", 0):
+            fixture = ApiFixture(users)
+            for route in routes:
+                # Untimed, so neither mode pays for cold caches.
+                run_route(route, ROUTES[route](fixture, requests), concurrency)
+            for round_number in range(rounds):
+                modes = ("off", "on") if round_number % 2 == 0 else ("on", "off")
+                for route in routes:
+                    for mode in modes:
+                        change = {"prepend": METRICS_MIDDLEWARE} if mode == "on" else {"remove": METRICS_MIDDLEWARE}
+                        batch = ROUTES[route](fixture, requests)
+                        with modify_settings(MIDDLEWARE=change):
+                            samples[(route, mode)].append(run_route(route, batch, concurrency).metrics())
+
+        self.stdout.write(
+            f"\n{'route':<22} {'p50 off':>9} {'p50 on':>9} {'delta':>9} {'CPU off':>9} {'CPU on':>9} {'delta':>9}"
+        )
+        for route in routes:
+            off, on = samples[(route, "off")], samples[(route, "on")]
+            p50_off, p50_on = (median(run["p50_ms"] for run in runs) for runs in (off, on))
+            cpu_off, cpu_on = (median(run["cpu_ms_per_request"] for run in runs) for runs in (off, on))
+            self.stdout.write(
+                f"{route:<22} {p50_off:>6.2f} ms {p50_on:>6.2f} ms {p50_on - p50_off:>+6.2f} ms "
+                f"{cpu_off:>6.2f} ms {cpu_on:>6.2f} ms {cpu_on - cpu_off:>+6.2f} ms"
+            )
+        self.stdout.write("Medians over rounds; deltas smaller than the spread between rounds are noise.")
+
+    @staticmethod
+    def recording_cost(queries, iterations=20000):
+        """Microseconds the registry adds to one request that runs `queries` statements."""
+        execute = lambda sql, params, many, context: None  # noqa: E731
+        started = time.perf_counter()
+        for _ in range(iterations):
+            token = metrics.start_request("/bench/")
+            for _ in range(queries):
+                time_query(execute, "SELECT 1", None, False, {})
+            metrics.finish_request(token, "bench/", "GET", 200, 0.001)
+        cost = (time.perf_counter() - started) / iterations * 1e6
+        metrics.reset()
+        return cost
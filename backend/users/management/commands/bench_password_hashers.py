@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.hashers import get_hasher, get_hashers
+from django.core.management.base import BaseCommand
+
+
+def _hash_for(hasher_algorithm, seconds):
+    """Hash repeatedly for `seconds` and return how many hashes completed."""
+    hasher = get_hasher(hasher_algorithm)
+    salt = hasher.salt()
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        hasher.encode("Bench-Pa55word!", salt)
+        count += 1
+    return count
+
+
+class Command(BaseCommand):
+    help = "Report password hashes per second per core for each configured hasher."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=3.0, help="Measurement time per hasher.")
+        parser.add_argument("--processes", type=int, default=1, help="Hash on this many cores in parallel.")
+
+    def handle(self, *args, seconds, processes, **options):
+        self.stdout.write(f"{'hasher':<32} {'cost':<34} {'ms/hash':>9} {'hashes/s/core':>14}")
+        for hasher in get_hashers():
+            try:
+                hasher.encode("warm-up", hasher.salt())
+            except ValueError as ex:
+                self.stdout.write(f"{type(hasher).__name__:<32} skipped: {ex}")
+                continue
+
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                counts = list(pool.map(_hash_for, [hasher.algorithm] * processes, [seconds] * processes))
+            per_core = sum(counts) / processes / seconds
+            self.stdout.write(
+                f"{type(hasher).__name__:<32} {self.describe_cost(hasher):<34} "
+                f"{1000 / per_core:9.1f} {per_core:14.1f}"
+            )
+
+    def describe_cost(self, hasher):
+        if hasattr(hasher, "iterations"):
+            return f"iterations={hasher.iterations}"
+        if hasattr(hasher, "work_factor"):
+            return f"N={hasher.work_factor} r={hasher.block_size} p={hasher.parallelism}"
+        if hasattr(hasher, "time_cost"):
+            return f"t={hasher.time_cost} m={hasher.memory_cost} p={hasher.parallelism}"
+        return "-"
@@ -0,0 +1,61 @@
+import os
+import random
+import re
+import string
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from users.password_policy import BreachedPasswordSet, get_breached_passwords, validate_password
+
+
+def legacy_checks(password, email):
+    """The per-view re.search chain the policy engine replaced, for comparison."""
+    if len(password) < 8:
+        return False
+    if not re.search(r"[A-Z]", password) or not re.search(r"[a-z]", password):
+        return False
+    if not re.search(r"\d", password):
+        return False
+    if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+        return False
+    return email.split("@")[0].lower() not in password.lower()
+
+
+class Command(BaseCommand):
+    help = "Measure password policy validations/sec with a breached-password list of the given size loaded."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--breached", type=int, default=1_000_000, help="Entries in the generated breached list.")
+        parser.add_argument("--passwords", type=int, default=100_000, help="Passwords validated per run.")
+
+    def rate(self, label, passwords, func):
+        started = time.perf_counter()
+        for password in passwords:
+            func(password, "bench.user@example.com")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<36} {len(passwords) / elapsed:>12,.0f} validations/s")
+
+    def handle(self, *args, breached, passwords, **options):
+        alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
+        candidates = ["".join(random.choices(alphabet, k=random.randint(6, 16))) for _ in range(passwords)]
+        leaked = candidates[: passwords // 10]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "breached.bin")
+            started = time.perf_counter()
+            digests = (os.urandom(8) for _ in range(breached - len(leaked)))
+            BreachedPasswordSet.write(path, [*digests, *(BreachedPasswordSet.digest(password) for password in leaked)])
+            self.stdout.write(
+                f"Built {breached:,} entry list ({os.path.getsize(path) / 1e6:.1f} MB) "
+                f"in {time.perf_counter() - started:.1f} s"
+            )
+
+            self.rate("legacy re.search checks", candidates, legacy_checks)
+            with override_settings(BREACHED_PASSWORD_LIST=None):
+                self.rate("policy engine, no breached list", candidates, validate_password)
+            with override_settings(BREACHED_PASSWORD_LIST=path):
+                self.rate("policy engine, breached list", candidates, validate_password)
+                flagged = sum(password in get_breached_passwords() for password in leaked)
+                self.stdout.write(f"Breached passwords detected: {flagged}/{len(leaked)}")
+                get_breached_passwords().close()
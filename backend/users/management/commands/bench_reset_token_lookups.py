@@ -0,0 +1,59 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from users.models import UsedPasswordResetToken
+from users.utils.bench import benchmark_database
+from users.utils.reset_tokens import ResetTokenFilter
+from users.views import ValidateResetTokenView
+
+
+class Command(BaseCommand):
+    help = "Seed used reset tokens in a throwaway database and compare lookups/sec with and without the in-process filter."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--used-tokens", type=int, default=100_000, help="Used tokens to seed.")
+        parser.add_argument("--lookups", type=int, default=5000, help="Lookups timed per strategy.")
+
+    def rate(self, label, lookups, func):
+        started = time.perf_counter()
+        for token in lookups:
+            func(token)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<40} {len(lookups) / elapsed:>12,.0f} lookups/s")
+
+    def handle(self, *args, used_tokens, lookups, **options):
+        with benchmark_database():
+            self.stdout.write(f"Seeding {used_tokens} used tokens...")
+            UsedPasswordResetToken.objects.bulk_create(
+                (UsedPasswordResetToken(token=uuid.uuid4()) for _ in range(used_tokens)), batch_size=5000
+            )
+            used = list(UsedPasswordResetToken.objects.values_list("token", flat=True)[:lookups])
+            unknown = [uuid.uuid4() for _ in range(lookups)]
+
+            token_filter = ResetTokenFilter(capacity=used_tokens)
+            started = time.perf_counter()
+            token_filter.might_be_used(unknown[0])
+            self.stdout.write(f"Filter warm-up: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+            live = UsedPasswordResetToken.objects.live()
+            self.rate("blacklist query (unknown token)", unknown, lambda token: live.filter(token=token).exists())
+            self.rate("bloom filter (unknown token)", unknown, token_filter.might_be_used)
+            self.rate("bloom filter (used token)", used, token_filter.might_be_used)
+
+            for token in unknown:
+                token_filter.remember_invalid(token)
+            self.rate("invalid-token LRU (known invalid)", unknown, token_filter.is_known_invalid)
+
+            false_positives = sum(token_filter.might_be_used(uuid.uuid4()) for _ in range(lookups * 10))
+            self.stdout.write(f"Bloom false-positive rate: {false_positives / (lookups * 10):.4%}")
+
+            view = ValidateResetTokenView.as_view()
+            factory = APIRequestFactory()
+            bogus = str(uuid.uuid4())
+            view(factory.post("/api/validate-reset-token/", {"token": bogus}, format="json"))
+            self.rate(
+                "ValidateResetTokenView (repeat bogus token)",
+                [bogus] * lookups,
+                lambda token: view(factory.post("/api/validate-reset-token/", {"token": token}, format="json")),
+            )
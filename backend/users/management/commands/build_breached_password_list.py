@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.password_policy import BreachedPasswordSet
+
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped breached-password file read via BREACHED_PASSWORD_LIST."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Text file with one password, or one SHA-1 hash with --sha1, per line.")
+        parser.add_argument("output", help="File to write, e.g. the path BREACHED_PASSWORD_LIST points at.")
+        parser.add_argument(
+            "--sha1", action="store_true",
+            help='Lines are hex SHA-1 hashes, optionally followed by ":count" (the Pwned Passwords format).',
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=1_000_000,
+            help="Hashes sorted in memory at a time; larger inputs are merged from sorted runs on disk.",
+        )
+
+    def digests(self, source, sha1):
+        with open(source, encoding="utf-8", errors="replace") as fh:
+            for line in fh:
+                line = line.rstrip("\r\n")
+                if not line:
+                    continue
+                if not sha1:
+                    yield BreachedPasswordSet.digest(line)
+                    continue
+                hex_digest = line.split(":", 1)[0]
+                try:
+                    if len(hex_digest) != 40:
+                        raise ValueError
+                    yield bytes.fromhex(hex_digest)
+                except ValueError:
+                    raise CommandError(f"Not a SHA-1 hash: {line!r}")
+
+    def handle(self, *args, source, output, sha1, chunk_size, **options):
+        count = BreachedPasswordSet.write(output, self.digests(source, sha1), chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} breached password hashes to {output}."))
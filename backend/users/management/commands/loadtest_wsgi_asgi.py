@@ -0,0 +1,62 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from users.utils.bench import benchmark_database, summarize
+from users.utils.loadtest import ASYNC_ROUTES, ServerError, drive, format_statuses, port_is_free, route_requests, seed_load_users, server
+
+# Profile -> (server command, URL prefix of the endpoints it is measured on).
+PROFILES = {
+    "wsgi": (["gunicorn", "backend.wsgi:application", "--workers", "{workers}", "--threads", "{threads}",
+              "--bind", "127.0.0.1:{port}", "--backlog", "4096", "--graceful-timeout", "5"], "/api/"),
+    "asgi": (["uvicorn", "backend.asgi:application", "--workers", "{workers}", "--port", "{port}",
+              "--backlog", "4096", "--timeout-graceful-shutdown", "5", "--no-access-log", "--log-level", "warning"], "/api/async/"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the hot endpoints under gunicorn (WSGI, sync views) and uvicorn (ASGI, async views) "
+        "against a throwaway copy of the configured Postgres database, and compare RPS and p50/p99."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000, help="Users seeded into the load-test database.")
+        parser.add_argument("--concurrency", type=int, default=64, help="Concurrent client connections.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per route and profile.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Server worker processes.")
+        parser.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker.")
+        parser.add_argument("--routes", nargs="+", choices=ASYNC_ROUTES, default=list(ASYNC_ROUTES))
+        parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, users, concurrency, duration, workers, threads, routes, profiles, port, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The server processes need a shared database; configure a PostgreSQL-compatible one.")
+        if not port_is_free(port):
+            raise CommandError(f"Port {port} is already in use.")
+
+        with benchmark_database():
+            tokens, emails = seed_load_users(users)
+
+            self.stdout.write(
+                f"{len(tokens)} active users, {concurrency} connections, {duration:.0f} s per run, "
+                f"{workers} worker(s){f', {threads} threads' if 'wsgi' in profiles else ''}, "
+                f"hashers: {settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1]}"
+            )
+            self.stdout.write(f"{'route':<14} {'profile':<8} {'served/s':>9} {'p50':>10} {'p99':>10}  statuses")
+            for profile in profiles:
+                command, prefix = PROFILES[profile]
+                try:
+                    with server([part.format(workers=workers, threads=threads, port=port) for part in command], port):
+                        for route in routes:
+                            latencies, statuses, elapsed = drive(
+                                port, route_requests(route, prefix, tokens, emails), concurrency, duration
+                            )
+                            stats = summarize(latencies)
+                            self.stdout.write(
+                                f"{route:<14} {profile:<8} {len(latencies) / elapsed:>9.1f} "
+                                f"{stats['p50_ms']:>7.1f} ms {stats['p99_ms']:>7.1f} ms  {format_statuses(statuses)}"
+                            )
+                except ServerError as exc:
+                    raise CommandError(f"The {profile} server did not start:\n{exc}")
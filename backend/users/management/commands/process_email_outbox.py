@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from users.utils.email_service import OUTBOX_BATCH_SIZE, process_outbox_batch, purge_sent_emails
+from users.utils.email_transport import get_transport
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE, help="Emails claimed per transaction.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the currently due emails and exit.")
+        parser.add_argument("--purge-interval", type=float, default=3600.0,
+                            help="Seconds between purges of sent emails older than the retention period.")
+
+    def handle(self, *args, batch_size, interval, once, purge_interval, **options):
+        total_sent = total_failed = 0
+        purged_at = float("-inf")
+        try:
+            while True:
+                close_old_connections()
+                if time.monotonic() - purged_at >= purge_interval:
+                    purged = purge_sent_emails()
+                    purged_at = time.monotonic()
+                    if purged:
+                        self.stdout.write(f"Purged {purged} old sent email(s).")
+                sent, failed = process_outbox_batch(batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Delivered {sent} email(s), {failed} failed attempt(s).")
+                    continue
+                if once:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            get_transport().close()
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox worker stopped: {total_sent} sent, {total_failed} failed attempts."))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from users.models import UsedPasswordResetToken
+
+
+class Command(BaseCommand):
+    help = "Delete used password reset tokens older than the token lifetime, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows deleted per statement.")
+        parser.add_argument("--sleep", type=float, default=0.05, help="Pause between batches, in seconds.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        purged = 0
+        # Each batch is its own short autocommit DELETE by primary key, so locks are
+        # held only briefly and concurrent resets are never blocked for long.
+        while ids := list(UsedPasswordResetToken.objects.expired().order_by("used_at").values_list("id", flat=True)[:batch_size]):
+            purged += UsedPasswordResetToken.objects.filter(id__in=ids).delete()[0]
+            if len(ids) < batch_size:
+                break
+            time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired reset token(s)."))
@@ -0,0 +1,65 @@
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from users.models import VERIFICATION_CODE_LIFETIME
+from users.utils.email_service import (
+    BULK_BATCH_SIZE,
+    BULK_MAX_CONCURRENCY,
+    generate_verification_code,
+    send_bulk,
+    verification_email_content,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Send fresh verification codes to every never-verified account whose code has expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Users updated and emailed per round.")
+        parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Messages per provider batch.")
+        parser.add_argument("--concurrency", type=int, default=BULK_MAX_CONCURRENCY, help="Batches sent in parallel.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the accounts that would be emailed.")
+
+    def handle(self, *args, chunk_size, batch_size, concurrency, dry_run, **options):
+        # Verifying clears the code, so an inactive account without one was verified and
+        # later deactivated (or created without verification) and must not be emailed.
+        pending = User.objects.filter(is_active=False, verification_code__isnull=False)
+        stale = (
+            pending.filter(verification_code_sent_at__lt=now() - VERIFICATION_CODE_LIFETIME)
+            .only("id", "email")
+            .order_by("id")
+        )
+
+        if dry_run:
+            self.stdout.write(f"{stale.count()} unverified account(s) have an expired code.")
+            return
+
+        sent = failed = 0
+        users = stale.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(users, chunk_size)):
+            sent_at = now()
+            for user in chunk:
+                user.verification_code = generate_verification_code()
+                user.verification_code_sent_at = sent_at
+            # Filtered like `stale`, so accounts verified since they were read are left alone.
+            if pending.bulk_update(chunk, ["verification_code", "verification_code_sent_at"]) < len(chunk):
+                updated = set(
+                    pending.filter(id__in=[user.id for user in chunk], verification_code_sent_at=sent_at)
+                    .values_list("id", flat=True)
+                )
+                chunk = [user for user in chunk if user.id in updated]
+
+            statuses = send_bulk(
+                ((user.email, *verification_email_content(user.verification_code)) for user in chunk),
+                batch_size=batch_size,
+                max_concurrency=concurrency,
+            )
+            accepted = sum(statuses.values())
+            sent += accepted
+            failed += len(statuses) - accepted
+            self.stdout.write(f"Processed {len(chunk)} account(s), {sent} sent so far.")
+
+        self.stdout.write(self.style.SUCCESS(f"Verification codes resent: {sent} sent, {failed} failed."))
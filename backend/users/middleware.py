@@ -0,0 +1,89 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from users.utils import profiler
+from users.utils.metrics import metrics
+from users.utils.query_budget import budget_mode, check_query_budget
+
+
+class MetricsMiddleware:
+    """Records latency, queries and component time of every request in `users.utils.metrics`.
+
+    Also checks each view's query budget (`users.utils.query_budget`) unless
+    `QUERY_BUDGET_MODE` is "off". Place it first in `MIDDLEWARE` so the time other
+    middleware takes is included. Works under WSGI and ASGI without forcing a
+    sync/async switch.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token, started = self.start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(request, response, token, started)
+        return response
+
+    async def __acall__(self, request):
+        token, started = self.start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(request, response, token, started)
+        return response
+
+    @staticmethod
+    def start(request):
+        return metrics.start_request(request.path, track_shapes=budget_mode() != "off"), time.perf_counter()
+
+    @staticmethod
+    def finish(request, response, token, started):
+        match = request.resolver_match
+        view = match.route if match else "unmatched"
+        status = response.status_code if response is not None else 500
+        stats = metrics.finish_request(token, view, request.method, status, time.perf_counter() - started)
+        if response is not None and match and stats.shapes is not None:
+            check_query_budget(view, match.func, stats.shapes)
+
+
+class ProfilingMiddleware:
+    """Hands the requests picked by the active profiling session to `users.utils.profiler`.
+
+    While no session is active this costs a clock read per request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sample = profiler.sample(request)
+        if sample is None:
+            return self.get_response(request)
+        with sample:
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        sample = profiler.sample(request)
+        if sample is None:
+            return await self.get_response(request)
+        with sample:
+            return await self.get_response(request)
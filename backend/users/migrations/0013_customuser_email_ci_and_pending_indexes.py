@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:03
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def create_email_prefix_index(apps, schema_editor):
+    # LIKE 'prefix%' on LOWER(email) can only use a btree built with pattern ops.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS users_email_lower_like_idx "
+            "ON users_customuser (LOWER(email) text_pattern_ops)"
+        )
+
+
+def drop_email_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS users_email_lower_like_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0012_customuser_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['verification_code_sent_at'], name='users_pending_verify_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('password_reset_token__isnull', False)), fields=['password_reset_requested_at'], name='users_pending_reset_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_email_ci_uniq'),
+        ),
+        migrations.RunPython(create_email_prefix_index, drop_email_prefix_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_customuser_email_ci_and_pending_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usedpasswordresettoken',
+            name='used_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
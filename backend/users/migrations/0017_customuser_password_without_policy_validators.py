@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_customuser_token_version_changed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='password',
+            field=models.CharField(max_length=128, verbose_name='Password'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_deleteduser'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboundemail',
+            index=models.Index(condition=models.Q(('status', 'sent')), fields=['sent_at'], name='users_outbox_sent_idx'),
+        ),
+    ]
@@ -1,9 +1,24 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.core.validators import EmailValidator, MinLengthValidator, RegexValidator
+from django.core.validators import EmailValidator
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Lower
 import uuid
 from datetime import datetime, timedelta
 from django.utils.timezone import now
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from users.throttling import limiter
+
+# How long an emailed verification code stays usable.
+VERIFICATION_CODE_LIFETIME = timedelta(hours=1)
+# How long a code sent to confirm a new email address stays usable.
+EMAIL_CHANGE_CODE_LIFETIME = timedelta(hours=1)
+# How long a password reset link stays usable.
+PASSWORD_RESET_TOKEN_LIFETIME = timedelta(hours=1)
+# Minimum gap between emails of each kind sent to one user.
+VERIFICATION_CODE_COOLDOWN = timedelta(seconds=60)
+PASSWORD_RESET_COOLDOWN = timedelta(minutes=5)
+EMAIL_CHANGE_COOLDOWN = timedelta(seconds=60)
 
 class CustomUserManager(BaseUserManager):
     """Manager for CustomUser model."""
@@ -20,6 +35,15 @@ class CustomUserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def filter_email(self, email):
+        """Case-insensitive email match, served by the unique index on LOWER(email)."""
+        if not isinstance(email, str):
+            return self.none()
+        return self.alias(email_lower=Lower("email")).filter(email_lower=email.lower())
+
+    def get_by_natural_key(self, username):
+        return self.filter_email(username).get()
+
     def create_superuser(self, email, password=None, **extra_fields):
         """Create and return a superuser with admin privileges."""
         extra_fields.setdefault("is_staff", True)
@@ -28,6 +52,61 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    # State transitions as single conditional UPDATEs: each writes only its own columns,
+    # and only while the row is still in the state the transition starts from, so of two
+    # concurrent or repeated submissions at most one succeeds. Each returns whether it did.
+
+    def _pending_verification(self, email, code):
+        return self.filter_email(email).filter(
+            verification_code=code, verification_code_sent_at__gte=now() - VERIFICATION_CODE_LIFETIME
+        )
+
+    def verify_email(self, email, code):
+        """Activate the account if `code` is its current, unexpired verification code."""
+        if not code:
+            return False
+        return bool(self._pending_verification(email, code).update(is_active=True, verification_code=None))
+
+    async def averify_email(self, email, code):
+        if not code:
+            return False
+        return bool(await self._pending_verification(email, code).aupdate(is_active=True, verification_code=None))
+
+    def set_verification_code(self, pk, code):
+        """Replace the verification code of an account that is still unverified."""
+        return bool(self.filter(pk=pk, is_active=False).update(verification_code=code, verification_code_sent_at=now()))
+
+    async def aset_verification_code(self, pk, code):
+        return bool(await self.filter(pk=pk, is_active=False).aupdate(verification_code=code, verification_code_sent_at=now()))
+
+    def set_password_reset_token(self, pk, token):
+        """Issue a new reset token, which invalidates the previous one."""
+        return bool(self.filter(pk=pk).update(password_reset_token=token, password_reset_requested_at=now()))
+
+    def reset_password(self, pk, token, password):
+        """Store the `password` hash if `token` is still the account's reset token, consuming it."""
+        return bool(self.filter(pk=pk, password_reset_token=token).update(
+            password=password, password_reset_token=None, password_reset_requested_at=None
+        ))
+
+    def confirm_email_change(self, pk, code):
+        """Move the pending email into place if `code` is its current, unexpired change code."""
+        if not code:
+            return False
+        return bool(self.filter(
+            pk=pk, pending_email__isnull=False, email_change_code=code,
+            email_change_code_sent_at__gte=now() - EMAIL_CHANGE_CODE_LIFETIME,
+        ).update(email=F("pending_email"), pending_email=None, email_change_code=None, email_change_code_sent_at=None))
+
+    def set_flags(self, pk, **flags):
+        """Set boolean fields such as is_active / is_staff; True only if one of them changed."""
+        if not flags:
+            return False
+        differs = Q()
+        for field, value in flags.items():
+            differs |= ~Q(**{field: value})
+        return bool(self.filter(differs, pk=pk).update(**flags))
+
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     """Custom user model using email instead of username for authentication."""
 
@@ -37,15 +116,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         verbose_name="Email Address"
     )
 
+    # Stores the hash; the raw password is checked by users.password_policy before hashing.
     password = models.CharField(
         max_length=128,
-        validators=[
-            MinLengthValidator(8, message="Password must be at least 8 characters long."),
-            RegexValidator(r".*[A-Z].*", message="Password must contain at least one uppercase letter."),
-            RegexValidator(r".*[a-z].*", message="Password must contain at least one lowercase letter."),
-            RegexValidator(r".*\d.*", message="Password must contain at least one number."),
-            RegexValidator(r".*[!@#$%^&*(),.?\":{}|<>].*", message="Password must contain at least one special character."),
-        ],
         verbose_name="Password"
     )
 
@@ -72,6 +145,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     password_reset_token = models.UUIDField(default=None, null=True, blank=True, unique=True)
     password_reset_requested_at = models.DateTimeField(null=True, blank=True)
 
+    # Copied into issued JWTs; bumping it revokes every outstanding token (users.utils.revocation)
+    token_version = models.PositiveIntegerField(default=0)
+    token_version_changed_at = models.DateTimeField(null=True, blank=True)
+
     groups = models.ManyToManyField(
         "auth.Group",
         related_name="customuser_groups",
@@ -88,36 +165,150 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
+    class Meta:
+        constraints = [
+            # Emails are matched case-insensitively (`filter_email`); this also backs those lookups.
+            models.UniqueConstraint(Lower("email"), name="users_email_ci_uniq"),
+        ]
+        indexes = [
+            # Keyset pages of the admin user list filtered by status.
+            models.Index(fields=["is_active", "id"], name="users_active_id_idx"),
+            models.Index(fields=["is_staff", "id"], name="users_staff_id_idx"),
+            # Accounts still waiting for email verification or holding a reset link.
+            models.Index(
+                fields=["verification_code_sent_at"],
+                condition=models.Q(is_active=False),
+                name="users_pending_verify_idx",
+            ),
+            models.Index(
+                fields=["password_reset_requested_at"],
+                condition=models.Q(password_reset_token__isnull=False),
+                name="users_pending_reset_idx",
+            ),
+            # Users whose tokens were ever revoked; polled by every worker's revocation mirror.
+            models.Index(
+                fields=["token_version_changed_at"],
+                condition=models.Q(token_version_changed_at__isnull=False),
+                name="users_token_revoked_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.email
 
-    def can_request_verification_code(self):
-        """Check if the user can request a new verification code (rate limit: every 60 seconds)."""
-        if self.verification_code_sent_at and (now() - self.verification_code_sent_at < timedelta(seconds=60)):
-            return False
-        return True
+    # The claim_* cooldowns live in the shared throttle store, not on the row: each call
+    # atomically checks and starts the cooldown, so concurrent requests can't both pass.
 
-    def can_request_password_reset(self):
-        """Check if the user can request a password reset (rate limit: every 5 minutes)."""
-        if self.password_reset_requested_at and (now() - self.password_reset_requested_at < timedelta(minutes=5)):
-            return False
-        return True
+    def claim_verification_code_request(self):
+        """Start the verification code cooldown; False if one is running (every 60 seconds)."""
+        return limiter.claim(f"user:{self.pk}:verification_code", VERIFICATION_CODE_COOLDOWN)
+
+    def claim_password_reset_request(self):
+        """Start the password reset cooldown; False if one is running (every 5 minutes)."""
+        return limiter.claim(f"user:{self.pk}:password_reset", PASSWORD_RESET_COOLDOWN)
+
+    def claim_email_change_request(self):
+        """Start the email change cooldown; False if one is running (every 60 seconds)."""
+        return limiter.claim(f"user:{self.pk}:email_change", EMAIL_CHANGE_COOLDOWN)
     
     def is_reset_token_valid(self):
         """Check if the reset token is still valid (1-hour expiration)."""
         if not self.password_reset_token or not self.password_reset_requested_at:
             return False
-        return now() - self.password_reset_requested_at < timedelta(hours=1)
+        return now() - self.password_reset_requested_at < PASSWORD_RESET_TOKEN_LIFETIME
     
-    def is_reset_token_valid(self):
-        """Check if the reset token is still valid (1-hour expiration)."""
-        if not self.password_reset_token or not self.password_reset_requested_at:
-            return False
-        return now() - self.password_reset_requested_at < timedelta(hours=1)
+
+class UsedPasswordResetTokenQuerySet(models.QuerySet):
+    def live(self):
+        """Rows still inside the token lifetime; only these can block a reset."""
+        return self.filter(used_at__gte=now() - PASSWORD_RESET_TOKEN_LIFETIME)
+
+    def expired(self):
+        """Rows older than the token lifetime, safe to purge."""
+        return self.filter(used_at__lt=now() - PASSWORD_RESET_TOKEN_LIFETIME)
 
 class UsedPasswordResetToken(models.Model):
+    """Blacklist of consumed reset tokens.
+
+    A token is useless once PASSWORD_RESET_TOKEN_LIFETIME has passed, so the table is a
+    rolling window: `purge_used_reset_tokens` deletes expired rows in small batches,
+    keeping the table (and the `token` index probed on every reset) bounded.
+    """
+
     token = models.UUIDField(unique=True)
-    used_at = models.DateTimeField(auto_now_add=True)
+    used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = UsedPasswordResetTokenQuerySet.as_manager()
+
+    def __str__(self):
+        return str(self.token)
+
+class DeletedUserQuerySet(models.QuerySet):
+    def live(self):
+        """Tombstones younger than the refresh token lifetime; older ones outlive every token."""
+        return self.filter(deleted_at__gte=now() - jwt_settings.REFRESH_TOKEN_LIFETIME)
+
+    def expired(self):
+        return self.filter(deleted_at__lt=now() - jwt_settings.REFRESH_TOKEN_LIFETIME)
+
+class DeletedUser(models.Model):
+    """Tombstone of a deleted account.
+
+    Deleting the row takes its `token_version` with it, so the revocation mirror of
+    other workers (`users.utils.revocation`) reads these instead and rejects every token
+    of the account until it would have expired anyway.
+    """
+
+    user_id = models.BigIntegerField(primary_key=True)
+    deleted_at = models.DateTimeField(default=now, db_index=True)
+
+    objects = DeletedUserQuerySet.as_manager()
+
+    def __str__(self):
+        return str(self.user_id)
+
+class OutboundEmail(models.Model):
+    """Email queued for delivery by the `process_email_outbox` worker.
+
+    While a worker holds a row, `next_attempt_at` is the end of its lease.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    to_email = models.EmailField(verbose_name="Recipient")
+    subject = models.CharField(max_length=255)
+    plain_text = models.TextField()
+    html = models.TextField(blank=True, default="")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker only ever scans pending rows that are due.
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="users_outbox_due_idx",
+            ),
+            # Sent rows are purged once older than the retention period.
+            models.Index(
+                fields=["sent_at"],
+                condition=models.Q(status="sent"),
+                name="users_outbox_sent_idx",
+            ),
+        ]
 
     def __str__(self):
-        return str(self.token)
\ No newline at end of file
+        return f"{self.subject} -> {self.to_email} ({self.status})"
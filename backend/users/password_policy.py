@@ -0,0 +1,183 @@
+"""The password policy, checked by every path that sets a password.
+
+Character-class rules are compiled at import into a lookup table, so a password is
+checked in a single pass over its characters and every violation is reported at once.
+Optionally, `BREACHED_PASSWORD_LIST` names a file built by `build_breached_password_list`:
+sorted, truncated SHA-1 digests of known-breached passwords, memory-mapped and binary
+searched, so even a list of millions of entries costs no heap and no network.
+"""
+import hashlib
+import heapq
+import mmap
+import os
+import string
+import tempfile
+from contextlib import ExitStack
+from functools import lru_cache, partial
+from itertools import count, islice
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+MIN_LENGTH = 8
+SPECIAL_CHARACTERS = '!@#$%^&*(),.?":{}|<>'
+
+UPPERCASE, LOWERCASE, DIGIT, SPECIAL = 1, 2, 4, 8
+
+# Character -> class bit, built once.
+_CHARACTER_CLASSES = {
+    **dict.fromkeys(string.ascii_uppercase, UPPERCASE),
+    **dict.fromkeys(string.ascii_lowercase, LOWERCASE),
+    **dict.fromkeys(string.digits, DIGIT),
+    **dict.fromkeys(SPECIAL_CHARACTERS, SPECIAL),
+}
+
+CHARACTER_RULES = (
+    (UPPERCASE, "Password must contain at least one uppercase letter."),
+    (LOWERCASE, "Password must contain at least one lowercase letter."),
+    (DIGIT, "Password must contain at least one number."),
+    (SPECIAL, "Password must contain at least one special character."),
+)
+
+BREACHED_MESSAGE = "This password has appeared in a data breach. Please choose a different one."
+
+
+class BreachedPasswordSet:
+    """Read-only set of passwords backed by a file of sorted SHA-1 prefixes.
+
+    Each record is the first `RECORD_SIZE` bytes of the password's SHA-1 digest; at 8
+    bytes the chance of a false match is negligible even for a billion records.
+    """
+
+    RECORD_SIZE = 8
+    # Run files merged at once; well under the usual limit of 1024 open files per process.
+    MERGE_FAN_IN = 64
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(fh.fileno()).st_size else b""
+        self.count = len(self._map) // self.RECORD_SIZE
+
+    @classmethod
+    def digest(cls, password):
+        return hashlib.sha1(password.encode("utf-8")).digest()[:cls.RECORD_SIZE]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, password):
+        key = self.digest(password)
+        size = self.RECORD_SIZE
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._map[middle * size:(middle + 1) * size]
+            if record < key:
+                low = middle + 1
+            elif record > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    @classmethod
+    def write(cls, path, digests, chunk_size=1_000_000, fan_in=MERGE_FAN_IN):
+        """Writes an iterable of SHA-1 digests (bytes, at least RECORD_SIZE long) as a set file.
+
+        An external merge sort: at most `chunk_size` records are held in memory at a time,
+        each chunk is sorted into a run file next to `path`, and the runs are merged and
+        de-duplicated while streaming into `path`. At most `fan_in` runs are open at once;
+        with more, they are first merged `fan_in` at a time into longer runs. Returns the
+        number of records written.
+        """
+        size = cls.RECORD_SIZE
+        digests = iter(digests)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as spill:
+            names = (os.path.join(spill, f"{number}.run") for number in count())
+            runs = []
+            while chunk := {digest[:size] for digest in islice(digests, chunk_size)}:
+                runs.append(next(names))
+                with open(runs[-1], "wb") as fh:
+                    fh.writelines(sorted(chunk))
+
+            while len(runs) > fan_in:
+                merged = []
+                for start in range(0, len(runs), fan_in):
+                    group = runs[start:start + fan_in]
+                    merged.append(next(names))
+                    with open(merged[-1], "wb") as fh:
+                        cls._merge(group, fh)
+                    for run in group:
+                        os.remove(run)
+                runs = merged
+
+            with open(path, "wb") as fh:
+                return cls._merge(runs, fh)
+
+    @classmethod
+    def _merge(cls, runs, out):
+        """Streams the sorted run files into `out` without duplicates; returns the records written."""
+        written = 0
+        previous = None
+        with ExitStack() as files:
+            readers = [iter(partial(files.enter_context(open(run, "rb")).read, cls.RECORD_SIZE), b"") for run in runs]
+            for record in heapq.merge(*readers):
+                if record != previous:
+                    out.write(record)
+                    written += 1
+                    previous = record
+        return written
+
+@lru_cache(maxsize=None)
+def get_breached_passwords():
+    """The set named by `BREACHED_PASSWORD_LIST`, or None when no list is configured."""
+    path = getattr(settings, "BREACHED_PASSWORD_LIST", None)
+    return BreachedPasswordSet(path) if path else None
+
+
+@receiver(setting_changed)
+def reset_breached_passwords(*, setting, **kwargs):
+    if setting == "BREACHED_PASSWORD_LIST":
+        get_breached_passwords.cache_clear()
+
+
+def validate_password(password, email=None):
+    """Returns every policy violation of `password` as a list of messages (empty if it passes)."""
+    violations = []
+    if len(password) < MIN_LENGTH:
+        violations.append(f"Password must be at least {MIN_LENGTH} characters long.")
+
+    seen = 0
+    for character in password:
+        seen |= _CHARACTER_CLASSES.get(character, 0)
+    violations.extend(message for bit, message in CHARACTER_RULES if not seen & bit)
+
+    if email:
+        local_part = email.split("@")[0].lower()
+        if local_part and local_part in password.lower():
+            violations.append("Password is too similar to the email.")
+
+    breached = get_breached_passwords()
+    if breached is not None and password in breached:
+        violations.append(BREACHED_MESSAGE)
+    return violations
+
+
+class PasswordPolicyValidator:
+    """`AUTH_PASSWORD_VALIDATORS` adapter, so createsuperuser and the admin apply the same policy."""
+
+    def validate(self, password, user=None):
+        violations = validate_password(password, getattr(user, "email", None))
+        if violations:
+            raise ValidationError([ValidationError(message, code="password_policy") for message in violations])
+
+    def get_help_text(self):
+        return (
+            f"Your password must be at least {MIN_LENGTH} characters long and contain an uppercase letter, "
+            "a lowercase letter, a number and a special character."
+        )
@@ -1,7 +1,13 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 from rest_framework import serializers
 from users.utils.email_service import generate_verification_code
+from users.utils import password_hashing
+from users.authentication import add_user_claims
+from users.utils.revocation import is_token_revoked
 from .models import CustomUser
 
 User = get_user_model()
@@ -20,7 +26,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         if data["password"] != data["confirm_password"]:
             raise serializers.ValidationError({"confirm_password": "Passwords do not match."})
 
-        if User.objects.filter(email=data["email"]).exists():
+        if User.objects.filter_email(data["email"]).exists():
             raise serializers.ValidationError({"email": "Email is already registered."})
 
         return data
@@ -42,26 +48,45 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
-    """Use email instead of username for JWT authentication."""    
+    """Use email instead of username for JWT authentication.
+
+    The view may pass the already-fetched user as `context["user"]`; the password is
+    then verified once against it and the token pair issued without another lookup
+    or a second pass through the authentication backends. Tokens carry the claims
+    `StatelessJWTAuthentication` relies on.
+    """
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
-        email = attrs.get("email")
+        email = attrs.get(self.username_field)
         password = attrs.get("password")
 
         if not email or not password:
             raise serializers.ValidationError("Email and password are required.")
 
-        try:
-            user = User.objects.get(email=email)
-            if not user.is_active:
-                raise serializers.ValidationError("Email not verified. Please check your inbox.")
-            if not user.check_password(password):
-                raise serializers.ValidationError("Invalid email or password.")
-        except User.DoesNotExist:
+        user = self.context.get("user") or User.objects.filter_email(email).first()
+        if user is None or not password_hashing.check_password(user, password):
             raise serializers.ValidationError("Invalid email or password.")
+        if not user.is_active:
+            raise serializers.ValidationError("Email not verified. Please check your inbox.")
 
-        attrs["username"] = user.email  
-        return super().validate(attrs)
+        self.user = user
+        refresh = self.get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+
+        return {"refresh": str(refresh), "access": str(refresh.access_token)}
     
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses to refresh tokens revoked by a password change, reset or admin update."""
+
+    def validate(self, attrs):
+        if is_token_revoked(self.token_class(attrs["refresh"])):
+            raise InvalidToken("Token has been revoked.")
+        return super().validate(attrs)
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -1,3 +1,1228 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+from io import StringIO
+from unittest import mock, skipUnless
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext, modify_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from users import hashers
+from users.authentication import user_cache
+from users.hashers import password_hashers
+from users.models import OutboundEmail, UsedPasswordResetToken
+from users.serializers import CustomTokenObtainPairSerializer
+from users.utils import password_hashing
+from users.utils.api_bench import ROUTES, ApiFixture, compare
+from users.utils.bench import BENCH_PASSWORD, seed_users
+from users.utils.db_pool import configure_database
+from users.utils import email_service
+from users.utils.email_service import queue_email, send_bulk
+from users.utils.email_transport import AzureEmailTransport, BaseEmailTransport
+from users.utils.metrics import metrics
+from users.utils import profiler
+from users.utils.profile_cache import DjangoProfileCacheBackend, ProfileCache, get_profile_cache
+from users.utils.query_budget import QueryBudgetExceeded, overruns, query_budget, sql_shape
+from users.utils.reset_tokens import BloomFilter, ResetTokenFilter, reset_token_filter
+from users.utils.revocation import revoke_tokens, token_versions
+from users.password_policy import BreachedPasswordSet, validate_password
+from users.throttling import SharedScopedRateThrottle, SlidingWindowLimiter
+from users.views import UserProfileView
 
-# Create your tests here.
+User = get_user_model()
+
+PASSWORD = "Str0ng!Passw0rd"
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"], PASSWORD_HASH_WORKERS=0)
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="login@example.com", password=PASSWORD, is_active=True)
+
+    def login(self, password=PASSWORD):
+        return self.client.post(
+            reverse("token_obtain_pair"),
+            {"email": "login@example.com", "password": password},
+            content_type="application/json",
+        )
+
+    def test_login_runs_one_select_and_one_hash(self):
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch("django.contrib.auth.hashers.check_password", wraps=check_password) as hasher:
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+        self.assertEqual(response.data["user"]["id"], self.user.id)
+        selects = [query["sql"] for query in queries if query["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(selects), 1, selects)
+        self.assertEqual(hasher.call_count, 1)
+
+    def test_login_costs_about_one_hash(self):
+        started = time.perf_counter()
+        self.user.check_password(PASSWORD)
+        one_hash = time.perf_counter() - started
+
+        started = time.perf_counter()
+        response = self.login()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 1.5 * one_hash + 0.05)
+
+    def test_wrong_password_is_rejected(self):
+        response = self.login("Wr0ng!Password")
+        self.assertEqual(response.status_code, 400)
+
+
+class PasswordHashingPoolTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="pool@example.com", password=PASSWORD, is_active=True)
+
+    @override_settings(PASSWORD_HASH_WORKERS=1)
+    def test_pool_verifies_and_sets_passwords(self):
+        self.assertTrue(password_hashing.check_password(self.user, PASSWORD))
+        self.assertFalse(password_hashing.check_password(self.user, "Wr0ng!Password"))
+
+        password_hashing.set_password(self.user, "N3w!Password")
+        self.assertTrue(self.user.check_password("N3w!Password"))
+
+    def test_timed_out_hash_keeps_its_slot_until_it_finishes(self):
+        executor = password_hashing.HashExecutor(workers=1, max_pending=1, timeout=0.05)
+        self.addCleanup(executor.shutdown)
+        self.assertIn(executor._get_pool()._mp_context.get_start_method(), ("forkserver", "spawn"))
+
+        with self.assertRaises(password_hashing.HashingUnavailable):
+            executor.run(time.sleep, 1)
+        # The caller gave up, but the pool is still busy with it.
+        self.assertEqual(executor.pending, 1)
+        with self.assertRaises(password_hashing.HashingUnavailable):
+            executor.run(time.sleep, 0)
+
+        deadline = time.monotonic() + 30
+        while executor.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(executor.pending, 0)
+
+    def test_pool_processes_hash_with_the_parents_work_factors(self):
+        self.addCleanup(hashers._tuned.clear)
+        hashers._tuned["pbkdf2_iterations"] = 1234
+        executor = password_hashing.HashExecutor(workers=1)
+        self.addCleanup(executor.shutdown)
+        self.assertEqual(executor.run(hashers.policy, "pbkdf2_iterations", 0), 1234)
+
+        with mock.patch.dict(os.environ, {password_hashing.POOL_WORKER_ENV: "1"}), \
+                mock.patch("users.hashers.autotune") as autotune:
+            apps.get_app_config("users").ready()
+        autotune.assert_not_called()
+
+    @mock.patch.dict(os.environ, {"PASSWORD_HASH_WORKERS": "2"})
+    def test_pool_size_defaults_to_the_environment(self):
+        self.assertEqual(password_hashing.HashExecutor().workers, 2)
+        self.assertEqual(password_hashing.HashExecutor(workers=0).workers, 0)
+
+    @override_settings(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_MAX_PENDING=1)
+    def test_saturated_pool_returns_503(self):
+        executor = password_hashing.get_executor()
+        executor.pending = executor.max_pending
+        try:
+            response = self.client.post(
+                reverse("token_obtain_pair"),
+                {"email": "pool@example.com", "password": PASSWORD},
+                content_type="application/json",
+            )
+        finally:
+            executor.pending = 0
+        self.assertEqual(response.status_code, 503)
+
+
+@override_settings(
+    PASSWORD_HASHERS=password_hashers("pbkdf2_sha256"),
+    PASSWORD_HASH_POLICY={"pbkdf2_iterations": 1000},
+    PASSWORD_HASH_WORKERS=0,
+)
+class PasswordHashPolicyTests(TestCase):
+    def setUp(self):
+        self.addCleanup(hashers._tuned.clear)
+
+    def login_with_stored_iterations(self, iterations):
+        hasher = hashers.PolicyPBKDF2PasswordHasher()
+        user = User.objects.create_user(email=f"policy{iterations}@example.com", is_active=True)
+        user.password = hasher.encode(PASSWORD, hasher.salt(), iterations=iterations)
+        user.save(update_fields=["password"])
+        response = self.client.post(
+            reverse("token_obtain_pair"), {"email": user.email, "password": PASSWORD}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        return hasher.decode(user.password)["iterations"]
+
+    def test_weaker_hash_is_upgraded_on_login(self):
+        self.assertEqual(self.login_with_stored_iterations(500), 1000)
+
+    def test_stronger_hash_is_left_alone(self):
+        self.assertEqual(self.login_with_stored_iterations(2000), 2000)
+
+    def test_autotune_never_goes_below_the_policy(self):
+        with override_settings(PASSWORD_HASH_POLICY={"pbkdf2_iterations": 1000, "target_ms": 10}), \
+                mock.patch("users.hashers.time_hash", return_value=0.1):
+            self.assertEqual(hashers.autotune(), {"pbkdf2_iterations": 1000})
+        with override_settings(PASSWORD_HASH_POLICY={"pbkdf2_iterations": 1000, "target_ms": 40}), \
+                mock.patch("users.hashers.time_hash", return_value=0.01):
+            self.assertEqual(hashers.autotune(), {"pbkdf2_iterations": 4000})
+        self.assertEqual(hashers.PolicyPBKDF2PasswordHasher().iterations, 4000)
+        with override_settings(PASSWORD_HASH_POLICY={"pbkdf2_iterations": 1000}):
+            self.assertEqual(hashers.autotune(), {})
+
+    @override_settings(PASSWORD_HASHERS=password_hashers("scrypt"), PASSWORD_HASH_POLICY={"scrypt_work_factor": 2 ** 10, "target_ms": 30})
+    def test_autotuned_scrypt_cost_stays_a_power_of_two(self):
+        with mock.patch("users.hashers.time_hash", return_value=0.01):
+            self.assertEqual(hashers.autotune(), {"scrypt_work_factor": 2 ** 12})
+
+
+class AdminUserExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email="admin@example.com", password=PASSWORD)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def seed(self, count, start=0):
+        User.objects.bulk_create([User(email=f"export{i}@example.com", password="!") for i in range(start, start + count)])
+
+    def export(self, **params):
+        response = self.client.get(reverse("admin_users_export"), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_ndjson_export_with_selected_fields(self):
+        self.seed(3)
+        response = self.export(fields="id,email,is_active")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(set(rows[0]), {"id", "email", "is_active"})
+
+    def test_csv_export_never_includes_secrets(self):
+        self.seed(2)
+        lines = b"".join(self.export(output="csv").streaming_content).decode().splitlines()
+
+        self.assertEqual(len(lines), 4)
+        header = set(lines[0].split(","))
+        self.assertTrue(header.isdisjoint({"password", "verification_code", "email_change_code", "password_reset_token"}))
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse("admin_users_export"), {"fields": "password"})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch("users.utils.admin_users.ADMIN_EXPORT_CHUNK_SIZE", 100)
+    def test_peak_memory_stays_flat_as_rows_grow(self):
+        def peak_while_streaming():
+            tracemalloc.start()
+            for _ in self.export(output="csv").streaming_content:
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        self.seed(500)
+        small = peak_while_streaming()
+        self.seed(4500, start=500)
+        large = peak_while_streaming()
+
+        self.assertLess(large, small * 1.5)
+
+
+class AdminUserListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email="list-admin@example.com", password=PASSWORD)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        User.objects.bulk_create([User(email=f"page{i:02}@example.com", password="!") for i in range(7)])
+
+    def pages(self, **params):
+        """Every page of the listing, following next_cursor."""
+        pages, cursor = [], None
+        while True:
+            response = self.client.get(reverse("admin_users"), {**params, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            pages.append([row["email"] for row in response.data["results"]])
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                return pages
+
+    def test_cursor_pages_cover_every_user_once_in_order(self):
+        emails = sorted(User.objects.values_list("email", flat=True))
+        for ordering, expected in (("email", emails), ("-email", emails[::-1])):
+            with self.subTest(ordering=ordering):
+                pages = self.pages(ordering=ordering, page_size=3)
+                self.assertEqual([len(page) for page in pages], [3, 3, 2])
+                self.assertEqual(sum(pages, []), expected)
+        by_id = self.pages(ordering="-id", page_size=5, email="page")
+        self.assertEqual(sum(by_id, []), [f"page{i:02}@example.com" for i in range(6, -1, -1)])
+
+    def test_page_size_is_an_integer_clamped_to_its_bounds(self):
+        response = self.client.get(reverse("admin_users"), {"page_size": "ten"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "page_size must be an integer."})
+        self.assertEqual([len(page) for page in self.pages(page_size=0)], [1] * 8)
+        with mock.patch("users.views.ADMIN_USER_MAX_PAGE_SIZE", 5):
+            self.assertEqual([len(page) for page in self.pages(page_size=1000)], [5, 3])
+
+    def test_malformed_cursors_are_rejected(self):
+        def cursor(value):
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+        for ordering, value in (("id", {"id": 1}), ("id", [1]), ("id", True), ("id", "1"), ("email", 1), ("email", None)):
+            with self.subTest(ordering=ordering, value=value):
+                response = self.client.get(reverse("admin_users"), {"ordering": ordering, "cursor": cursor(value)})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse("admin_users"), {"cursor": "not-base64!"}).status_code, 400)
+
+
+class AdminUserBulkTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email="bulk-admin@example.com", password=PASSWORD)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.users = User.objects.bulk_create(
+            [User(email=f"bulk{i}@example.com", password="!", is_active=True) for i in range(3)]
+        )
+
+    def bulk(self, **payload):
+        return self.client.post(reverse("admin_users_bulk"), payload, format="json")
+
+    def test_ids_apply_the_action_but_spare_the_caller(self):
+        ids = [self.users[0].id, self.users[1].id, self.admin.id]
+        response = self.bulk(action="deactivate", ids=ids)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["affected"], 2)
+        self.assertEqual(set(User.objects.filter(is_active=False).values_list("id", flat=True)), set(ids[:2]))
+        self.assertTrue(User.objects.get(id=self.admin.id).is_active)
+
+    def test_ids_must_be_integers(self):
+        for ids in ([True], ["1"], [1.5], "1"):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.bulk(action="deactivate", ids=ids).status_code, 400)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+    def test_filter_applies_to_matching_users(self):
+        response = self.bulk(action="make_staff", filter={"email": "BULK1@", "is_active": True})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["affected"], 1)
+        self.assertEqual(list(User.objects.filter(is_staff=True, is_superuser=False).values_list("id", flat=True)),
+                         [self.users[1].id])
+
+    def test_unknown_or_empty_filters_are_rejected(self):
+        for filters in ({"id": 1}, {"email": "bulk", "is_superuser": True}, {}, {"email": ""}, []):
+            with self.subTest(filter=filters):
+                self.assertEqual(self.bulk(action="deactivate", filter=filters).status_code, 400)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+    def test_filter_values_of_the_wrong_type_are_rejected(self):
+        for filters in ({"email": ["bulk"]}, {"email": 1}, {"is_active": {"value": True}}, {"is_staff": "maybe"}):
+            with self.subTest(filter=filters):
+                self.assertEqual(self.bulk(action="deactivate", filter=filters).status_code, 400)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+
+class RecordingTransport(BaseEmailTransport):
+    """Keeps every message instead of sending it; messages to a `rejected` address fail."""
+
+    sent = []
+    rejected = set()
+
+    def send(self, message):
+        self.sent.append(message)
+        recipients = message["recipients"]
+        addresses = {entry["address"] for entry in recipients["to"] + recipients.get("bcc", [])}
+        return not addresses & self.rejected
+
+
+@override_settings(EMAIL_TRANSPORT="users.tests.RecordingTransport")
+class BulkEmailTests(TestCase):
+    def setUp(self):
+        RecordingTransport.sent = []
+        RecordingTransport.rejected = set()
+
+    def test_identical_content_is_grouped_into_bcc_messages_per_batch(self):
+        messages = [(f"same{i}@example.com", "Hi", "Same body", "") for i in range(5)]
+        messages.insert(4, ("own@example.com", "Hi", "Own body", ""))
+        RecordingTransport.rejected = {"own@example.com"}
+
+        statuses = send_bulk(iter(messages), batch_size=3, max_concurrency=1)
+
+        self.assertEqual(len(statuses), 6)
+        self.assertEqual([address for address, accepted in statuses.items() if not accepted], ["own@example.com"])
+        shapes = sorted(
+            (len(message["recipients"]["to"]), len(message["recipients"].get("bcc", []))) for message in RecordingTransport.sent
+        )
+        # Batch one: three identical messages in one BCC. Batch two: the odd one out alone, the other two together.
+        self.assertEqual(shapes, [(1, 0), (1, 2), (1, 3)])
+
+    def test_bulk_payload_has_a_to_recipient_and_fits_the_provider_limit(self):
+        transport = AzureEmailTransport()
+        client = mock.Mock()
+        client.begin_send.return_value.result.return_value = {"status": "Succeeded"}
+        messages = [(f"bulk{i}@example.com", "Hi", "Same body", "") for i in range(email_service.BULK_BATCH_SIZE)]
+
+        with mock.patch("users.utils.email_service.get_transport", return_value=transport), \
+                mock.patch.object(transport, "_get_client", return_value=client):
+            self.assertTrue(all(send_bulk(messages).values()))
+
+        (payload,), _ = client.begin_send.call_args
+        self.assertEqual(payload["recipients"]["to"], [{"address": email_service.BULK_TO_ADDRESS}])
+        self.assertTrue(payload["recipients"]["to"][0]["address"])
+        self.assertEqual(len(payload["recipients"]["to"]) + len(payload["recipients"]["bcc"]), 50)
+
+    def test_resend_only_emails_never_verified_accounts_with_expired_codes(self):
+        expired = timezone.now() - timezone.timedelta(hours=2)
+        stale = [
+            User.objects.create_user(email=f"stale{i}@example.com", verification_code="111111", verification_code_sent_at=expired)
+            for i in range(3)
+        ]
+        User.objects.create_user(email="fresh@example.com", verification_code="222222", verification_code_sent_at=timezone.now())
+        # Verified and later deactivated: the code was cleared on verification.
+        User.objects.create_user(email="deactivated@example.com", verification_code_sent_at=expired)
+        User.objects.create_user(email="no-code@example.com")
+        User.objects.create_user(email="active@example.com", is_active=True, verification_code="333333",
+                                 verification_code_sent_at=expired)
+
+        codes = ["100001", "100002", "100003"]
+        with mock.patch("users.management.commands.resend_verification_codes.generate_verification_code", side_effect=codes):
+            call_command("resend_verification_codes", chunk_size=2, stdout=StringIO())
+
+        # Every code is different, so each goes out as its own message.
+        bodies = {message["recipients"]["to"][0]["address"]: message["content"]["plainText"] for message in RecordingTransport.sent}
+        self.assertEqual(set(bodies), {user.email for user in stale})
+        for user in stale:
+            user.refresh_from_db()
+            self.assertNotEqual(user.verification_code, "111111")
+            self.assertIn(user.verification_code, bodies[user.email])
+        self.assertEqual(User.objects.get(email="fresh@example.com").verification_code, "222222")
+        self.assertIsNone(User.objects.get(email="deactivated@example.com").verification_code)
+
+
+@override_settings(EMAIL_TRANSPORT="users.tests.RecordingTransport")
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        RecordingTransport.sent = []
+        RecordingTransport.rejected = {"bounce@example.com"}
+
+    def make_due(self, email):
+        OutboundEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+
+    @mock.patch.object(email_service, "OUTBOX_MAX_ATTEMPTS", 3)
+    def test_failures_back_off_then_give_up(self):
+        queue_email("bounce@example.com", "Hi", "Body")
+        queue_email("ok@example.com", "Hi", "Body")
+
+        self.assertEqual(email_service.process_outbox_batch(), (1, 1))
+        self.assertEqual(email_service.process_outbox_batch(), (0, 0))
+        email = OutboundEmail.objects.get(to_email="bounce@example.com")
+        for attempt in (1, 2):
+            self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_PENDING, attempt))
+            self.assertEqual(email.last_error, "Rejected by email provider.")
+            self.assertAlmostEqual(
+                (email.next_attempt_at - timezone.now()).total_seconds(),
+                email_service.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempt - 1), delta=5,
+            )
+            self.make_due(email)
+            self.assertEqual(email_service.process_outbox_batch(), (0, 1))
+            email.refresh_from_db()
+
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_FAILED, 3))
+        self.assertEqual(OutboundEmail.objects.get(to_email="ok@example.com").status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(len(RecordingTransport.sent), 4)
+
+    def test_claimed_rows_are_leased_to_one_worker(self):
+        queue_email("ok@example.com", "Hi", "Body")
+        claimed = email_service.claim_outbox_batch()
+        self.assertEqual([email.attempts for email in claimed], [1])
+        self.assertEqual(email_service.claim_outbox_batch(), [])
+
+        # The lease runs out before the first worker reports back; another takes over.
+        self.make_due(claimed[0])
+        retaken = email_service.claim_outbox_batch()
+        self.assertEqual([email.attempts for email in retaken], [2])
+        self.assertTrue(email_service.deliver(claimed[0]))
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_PENDING)
+
+        self.assertTrue(email_service.deliver(retaken[0]))
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_SENT)
+
+    def test_purge_removes_only_old_sent_emails(self):
+        old = timezone.now() - timezone.timedelta(days=email_service.OUTBOX_RETENTION_DAYS + 1)
+        for to_email, status, sent_at in (
+            ("old@example.com", OutboundEmail.STATUS_SENT, old),
+            ("recent@example.com", OutboundEmail.STATUS_SENT, timezone.now()),
+            ("failed@example.com", OutboundEmail.STATUS_FAILED, None),
+            ("pending@example.com", OutboundEmail.STATUS_PENDING, None),
+        ):
+            OutboundEmail.objects.create(to_email=to_email, subject="Hi", plain_text="Body", status=status, sent_at=sent_at)
+
+        self.assertEqual(email_service.purge_sent_emails(batch_size=1), 1)
+        self.assertFalse(OutboundEmail.objects.filter(to_email="old@example.com").exists())
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+
+class EmailLookupTests(TestCase):
+    def test_email_lookups_ignore_case(self):
+        user = User.objects.create_user(email="Mixed.Case@Example.com", password=PASSWORD)
+        self.assertEqual(User.objects.filter_email("mixed.case@example.COM").get(), user)
+        self.assertEqual(User.objects.get_by_natural_key("MIXED.CASE@example.com"), user)
+
+    def test_non_string_emails_match_nobody(self):
+        for name, extra in (
+            ("token_obtain_pair", {"password": PASSWORD}),
+            ("verify_email", {"code": "123456"}),
+            ("forgot_password", {}),
+            ("resend_verification", {}),
+        ):
+            for email in (123, ["a"]):
+                with self.subTest(name, email=email):
+                    response = self.client.post(reverse(name), {"email": email, **extra}, content_type="application/json")
+                    self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"], PASSWORD_HASH_WORKERS=0)
+class ResetTokenFilterTests(TestCase):
+    def setUp(self):
+        reset_token_filter.reset()
+        self.addCleanup(reset_token_filter.reset)
+
+    def test_bloom_filter_false_positive_rate(self):
+        for capacity, error_rate in ((1000, 0.05), (10000, 0.01), (10000, 0.001)):
+            bloom = BloomFilter(capacity, error_rate)
+            added = [uuid.uuid4().bytes for _ in range(capacity)]
+            for key in added:
+                bloom.add(key)
+            self.assertTrue(all(key in bloom for key in added))
+
+            probes = 20 * capacity
+            false_positives = sum(uuid.uuid4().bytes in bloom for _ in range(probes))
+            self.assertLess(false_positives / probes, error_rate * 1.5, (capacity, error_rate))
+
+    def test_unknown_tokens_are_answered_from_memory(self):
+        url = reverse("validate-reset-token")
+        token = str(uuid.uuid4())
+        self.assertEqual(self.client.post(url, {"token": token}).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(url, {"token": token}).status_code, 404)
+            self.assertEqual(self.client.post(url, {"token": "not-a-uuid"}).status_code, 404)
+
+    def test_filter_rebuilds_bigger_when_over_capacity(self):
+        tokens = [uuid.uuid4() for _ in range(3)]
+        token_filter = ResetTokenFilter(capacity=2)
+        self.assertFalse(token_filter.might_be_used(tokens[0]))
+        UsedPasswordResetToken.objects.bulk_create([UsedPasswordResetToken(token=token) for token in tokens])
+        for token in tokens:
+            token_filter.mark_used(token)
+        self.assertIsNone(token_filter._bloom)
+        self.assertEqual(token_filter.capacity, 4)
+
+        self.assertTrue(all(token_filter.might_be_used(token) for token in tokens))
+        self.assertEqual(token_filter._bloom.capacity, 6)
+
+    def test_used_token_is_rejected(self):
+        user = User.objects.create_user(email="reset@example.com", password=PASSWORD, is_active=True)
+        self.client.post(reverse("forgot_password"), {"email": user.email})
+        token = str(User.objects.get(id=user.id).password_reset_token)
+        data = {"token": token, "new_password": "N3w!Passw0rd", "confirm_password": "N3w!Passw0rd"}
+
+        self.assertEqual(self.client.post(reverse("reset_password"), data).status_code, 200)
+        response = self.client.post(reverse("reset_password"), data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "This reset link has already been used.")
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        # User ids come round again between tests, and the default backend is the shared cache.
+        cache.clear()
+        get_profile_cache.cache_clear()
+        self.addCleanup(get_profile_cache.cache_clear)
+        self.user = User.objects.create_user(email="profile@example.com", password=PASSWORD, is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("user_profile")
+
+    def test_unchanged_profile_is_served_from_cache_and_revalidated(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        with mock.patch("users.views.UserProfileSerializer") as serializer:
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        serializer.assert_not_called()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertFalse(not_modified.content)
+        self.assertEqual(get_profile_cache().stats()["hits"], 2)
+
+    def test_writes_invalidate_the_cached_profile(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.client.put(self.url, {"first_name": "Ada"}, format="json")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["first_name"], "Ada")
+
+        User.objects.filter(id=self.user.id).update(
+            pending_email="new@example.com", email_change_code="123456", email_change_code_sent_at=timezone.now()
+        )
+        self.user.refresh_from_db()
+        self.client.post(reverse("verify-new-email"), {"code": "123456"}, format="json")
+        # The view updates the row, not the instance force_authenticate() hands to every request.
+        self.user.refresh_from_db()
+        self.assertEqual(self.client.get(self.url).data["email"], "new@example.com")
+
+    def test_invalidation_reaches_every_worker(self):
+        # Two workers, each with its own ProfileCache in front of the shared default backend.
+        first, second = (ProfileCache(DjangoProfileCacheBackend()) for _ in range(2))
+        serialize = lambda user: {"email": user.email}  # noqa: E731
+        first.get(self.user, serialize)
+        self.assertIsNotNone(second.lookup(self.user.pk)[1])
+
+        second.invalidate(self.user.pk)
+        self.assertIsNone(first.lookup(self.user.pk)[1])
+
+    def test_shared_backend_reports_hit_ratio(self):
+        events = []
+        with self.settings(PROFILE_CACHE_METRICS_HOOK=lambda event, stats: events.append((event, stats["hit_ratio"]))):
+            for _ in range(4):
+                self.client.get(self.url)
+        self.assertEqual(events, [("miss", 0.0), ("hit", 0.5), ("hit", 2 / 3), ("hit", 0.75)])
+
+
+class JWTTestCase(TestCase):
+    """Loads the revocation mirror up front and keeps its sync thread out of the test database."""
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        get_profile_cache.cache_clear()
+        interval = mock.patch.object(token_versions, "interval", 0)
+        interval.start()
+        self.addCleanup(interval.stop)
+        token_versions.reset()
+        self.addCleanup(token_versions.reset)
+
+    def client_for(self, user, token=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token or CustomTokenObtainPairSerializer.get_token(user).access_token}")
+        return client
+
+
+class StatelessAuthenticationTests(JWTTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="claims@example.com", password=PASSWORD, is_active=True)
+        self.admin = User.objects.create_superuser(email="claims-admin@example.com", password=PASSWORD)
+        token_versions.is_revoked(self.user.id, 0)
+
+    def test_read_only_requests_trust_the_token_claims(self):
+        client = self.client_for(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(reverse("user_profile")).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(reverse("user_profile")).status_code, 200)
+
+        admin = self.client_for(self.admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(admin.get(reverse("admin_users")).status_code, 200)
+        self.assertEqual(self.client_for(self.user).get(reverse("admin_users")).status_code, 403)
+
+    def test_profile_miss_rebuilds_from_a_fresh_row(self):
+        User.objects.filter(id=self.user.id).update(first_name="Ada")
+        client = self.client_for(self.user)
+        self.assertEqual(client.get(reverse("user_profile")).data["first_name"], "Ada")
+
+        # Another worker saves a change: the row and the shared profile version move, but
+        # this worker's user_cache still holds the row it loaded.
+        User.objects.filter(id=self.user.id).update(first_name="Grace")
+        get_profile_cache().invalidate(self.user.id)
+        self.assertEqual(client.get(reverse("user_profile")).data["first_name"], "Grace")
+
+    def test_writes_and_tokens_without_claims_load_the_user(self):
+        client = self.client_for(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            client.put(reverse("user_profile"), {"first_name": "Grace"}, format="json")
+        self.assertIn("FROM \"users_customuser\"", queries[0]["sql"])
+        self.assertEqual(client.get(reverse("user_profile")).data["first_name"], "Grace")
+
+        legacy = RefreshToken.for_user(self.user).access_token
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client_for(self.user, legacy).get(reverse("admin_users")).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"], PASSWORD_HASH_WORKERS=0)
+class TokenRevocationTests(JWTTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="revoke@example.com", password=PASSWORD, is_active=True)
+        self.admin = User.objects.create_superuser(email="revoke-admin@example.com", password=PASSWORD)
+        self.refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        self.client = self.client_for(self.user, self.refresh.access_token)
+        self.assertEqual(self.client.get(reverse("user_profile")).status_code, 200)
+
+    def assertRevoked(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("user_profile")).status_code, 401)
+        response = APIClient().post(reverse("token_refresh"), {"refresh": str(self.refresh)}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_other_tokens(self):
+        response = self.client.post(
+            reverse("change-password"),
+            {"old_password": PASSWORD, "new_password": "N3w!Passw0rd", "confirm_password": "N3w!Passw0rd"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertRevoked()
+        self.assertEqual(self.client_for(self.user, response.data["access"]).get(reverse("user_profile")).status_code, 200)
+
+    def test_password_reset_revokes_tokens(self):
+        User.objects.filter(id=self.user.id).update(password_reset_token=uuid.uuid4(), password_reset_requested_at=timezone.now())
+        token = str(User.objects.get(id=self.user.id).password_reset_token)
+        APIClient().post(reverse("reset_password"), {"token": token, "new_password": "N3w!Passw0rd", "confirm_password": "N3w!Passw0rd"})
+        self.assertRevoked()
+
+    def test_deactivation_revokes_tokens(self):
+        self.client_for(self.admin).put(reverse("admin_user_detail", args=[self.user.id]), {"is_active": False}, format="json")
+        self.assertRevoked()
+
+    def test_unchanged_flags_keep_tokens(self):
+        admin = self.client_for(self.admin)
+        self.assertEqual(admin.put(reverse("admin_user_detail", args=[self.user.id]), {"is_active": True}, format="json").status_code, 200)
+        self.assertEqual(self.client.get(reverse("user_profile")).status_code, 200)
+        self.assertEqual(admin.put(reverse("admin_user_detail", args=[0]), {"is_active": True}, format="json").status_code, 404)
+
+    def assertDeletedStaffLockedOut(self, delete):
+        staff = User.objects.create_user(email="revoke-staff@example.com", password=PASSWORD, is_active=True, is_staff=True)
+        client = self.client_for(staff)
+        self.assertEqual(client.get(reverse("admin_users")).status_code, 200)
+
+        self.assertEqual(delete(staff).status_code, 200)
+        for mirror_reloaded in (False, True):
+            if mirror_reloaded:
+                # Another worker only has the tombstone to go by.
+                token_versions.reset()
+            for url in (reverse("admin_users"), reverse("admin_users_export")):
+                with self.subTest(url=url, mirror_reloaded=mirror_reloaded):
+                    self.assertIn(client.get(url).status_code, (401, 403))
+
+    def test_deleted_staff_tokens_are_rejected(self):
+        admin = self.client_for(self.admin)
+        self.assertDeletedStaffLockedOut(lambda staff: admin.delete(reverse("admin_user_detail", args=[staff.id])))
+
+    def test_bulk_deleted_staff_tokens_are_rejected(self):
+        admin = self.client_for(self.admin)
+        self.assertDeletedStaffLockedOut(
+            lambda staff: admin.post(reverse("admin_users_bulk"), {"action": "delete", "ids": [staff.id]}, format="json")
+        )
+
+    def test_other_workers_pick_up_revocations_on_sync(self):
+        User.objects.filter(id=self.user.id).update(token_version=1, token_version_changed_at=timezone.now())
+        self.assertEqual(self.client.get(reverse("user_profile")).status_code, 200)
+        token_versions.sync()
+        self.assertRevoked()
+
+    def test_mirror_keeps_only_revocations_younger_than_the_refresh_lifetime(self):
+        lifetime = jwt_settings.REFRESH_TOKEN_LIFETIME
+        User.objects.filter(id=self.user.id).update(token_version=1, token_version_changed_at=timezone.now() - 2 * lifetime)
+        token_versions.reset()
+        token_versions.is_revoked(self.user.id, 0)
+        self.assertNotIn(self.user.id, token_versions.versions)
+
+        revoke_tokens(self.admin.id)
+        self.assertIn(self.admin.id, token_versions.versions)
+        with mock.patch("users.utils.revocation.now", return_value=timezone.now() + 2 * lifetime):
+            token_versions.sync()
+        self.assertEqual(token_versions.versions, {})
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_sliding_window_is_shared_across_limiters(self):
+        workers = [SlidingWindowLimiter(), SlidingWindowLimiter()]
+        with mock.patch("users.throttling.time.time", return_value=600.0):
+            results = [workers[i % 2].hit("ip:1", 3, 60)[0] for i in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+
+        # Halfway through the next window, half of the previous window's hits still count.
+        with mock.patch("users.throttling.time.time", return_value=690.0):
+            self.assertEqual(workers[0].hit("ip:1", 3, 60), (True, 0.0))
+            allowed, retry_after = workers[1].hit("ip:1", 3, 60)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 10.0)
+
+    def test_cooldowns_need_no_row_updates(self):
+        user = User.objects.create_user(email="cooldown@example.com", password=PASSWORD)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.claim_verification_code_request())
+            self.assertFalse(User(pk=user.pk).claim_verification_code_request())
+            self.assertTrue(user.claim_password_reset_request())
+
+    @mock.patch.object(SharedScopedRateThrottle, "THROTTLE_RATES", {"forgot_password": "3/min"})
+    def test_scoped_throttle_counts_across_requests(self):
+        statuses = [self.client.post(reverse("forgot_password"), {"email": "nobody@example.com"}).status_code for _ in range(4)]
+        self.assertEqual(statuses, [404, 404, 404, 429])
+
+
+class PasswordPolicyTests(TestCase):
+    def test_all_violations_are_reported_at_once(self):
+        self.assertEqual(validate_password(PASSWORD, "someone@example.com"), [])
+        self.assertEqual(validate_password("alice", "alice@example.com"), [
+            "Password must be at least 8 characters long.",
+            "Password must contain at least one uppercase letter.",
+            "Password must contain at least one number.",
+            "Password must contain at least one special character.",
+            "Password is too similar to the email.",
+        ])
+
+    def test_breached_passwords_are_rejected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "breached.bin")
+            leaked = ["P@ssw0rd123", "Summer2024!"]
+            BreachedPasswordSet.write(path, [os.urandom(8) for _ in range(1000)] + [BreachedPasswordSet.digest(p) for p in leaked])
+            with self.settings(BREACHED_PASSWORD_LIST=path):
+                for password in leaked:
+                    self.assertIn("data breach", validate_password(password)[-1])
+                self.assertEqual(validate_password(PASSWORD), [])
+
+    def test_list_is_merged_from_sorted_runs(self):
+        digests = [os.urandom(20) for _ in range(50)]
+        # 15 runs: merged at once, and in passes of 2 and 3 runs.
+        for fan_in in (64, 2, 3):
+            with self.subTest(fan_in=fan_in), tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "breached.bin")
+                self.assertEqual(BreachedPasswordSet.write(path, digests + digests[::-1], chunk_size=7, fan_in=fan_in), 50)
+                with open(path, "rb") as fh:
+                    records = [fh.read(8) for _ in range(50)]
+                self.assertEqual(records, sorted(digest[:8] for digest in digests))
+                self.assertEqual(os.listdir(directory), ["breached.bin"])
+
+    def test_sha1_lines_must_be_whole_hashes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, output = os.path.join(directory, "hashes.txt"), os.path.join(directory, "breached.bin")
+            whole = hashlib.sha1(PASSWORD.encode()).hexdigest().upper()
+            for line in (whole[:16], whole + "00", "zz" * 20):
+                with self.subTest(line=line):
+                    with open(source, "w") as fh:
+                        fh.write(f"{whole}:3\n{line}:1\n")
+                    with self.assertRaises(CommandError):
+                        call_command("build_breached_password_list", source, output, "--sha1", stdout=StringIO())
+
+            with open(source, "w") as fh:
+                fh.write(f"{whole}:3\n")
+            call_command("build_breached_password_list", source, output, "--sha1", stdout=StringIO())
+            breached = BreachedPasswordSet(output)
+            self.addCleanup(breached.close)
+            self.assertIn(PASSWORD, breached)
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"], PASSWORD_HASH_WORKERS=0)
+    def test_password_reset_applies_the_policy(self):
+        user = User.objects.create_user(email="policy@example.com", password=PASSWORD, is_active=True)
+        User.objects.filter(id=user.id).update(password_reset_token=uuid.uuid4(), password_reset_requested_at=timezone.now())
+        token = str(User.objects.get(id=user.id).password_reset_token)
+        response = self.client.post(reverse("reset_password"), {"token": token, "new_password": "weak", "confirm_password": "weak"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data["errors"]), 4)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"], PASSWORD_HASH_WORKERS=0)
+class AsyncViewTests(JWTTestCase):
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type="application/json")
+
+    def test_register_verify_login_and_profile(self):
+        credentials = {"email": "async@example.com", "password": PASSWORD}
+        response = self.post("async_register", {**credentials, "confirm_password": PASSWORD})
+        self.assertEqual(response.status_code, 201, response.content)
+        user = User.objects.get(email="async@example.com")
+        self.assertFalse(user.is_active)
+        self.assertTrue(OutboundEmail.objects.filter(to_email=user.email, plain_text__contains=user.verification_code).exists())
+
+        self.assertEqual(self.post("async_verify_email", {"email": user.email, "code": "wrong"}).status_code, 400)
+        self.assertEqual(self.post("async_verify_email", {"email": user.email, "code": user.verification_code}).status_code, 200)
+
+        response = self.post("async_login", credentials)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["user"]["id"], user.id)
+
+        url = reverse("async_user_profile")
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {response.json()['access']}"}
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["email"], user.email)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], **headers).status_code, 304)
+
+    def test_errors_match_the_sync_views(self):
+        User.objects.create_user(email="taken@example.com", password=PASSWORD, is_active=True)
+        cases = [
+            ("register", "async_register", {"email": "taken@example.com", "password": PASSWORD, "confirm_password": PASSWORD}),
+            ("register", "async_register", {"email": "weak@example.com", "password": "short", "confirm_password": "short"}),
+            ("token_obtain_pair", "async_login", {"email": "taken@example.com", "password": "Wr0ng!Password"}),
+            ("token_obtain_pair", "async_login", {"email": "nobody@example.com", "password": PASSWORD}),
+            ("verify_email", "async_verify_email", {"email": "nobody@example.com", "code": "000000"}),
+        ]
+        for sync_name, async_name, data in cases:
+            with self.subTest(async_name, data=data):
+                expected, actual = self.post(sync_name, data), self.post(async_name, data)
+                self.assertEqual(actual.status_code, expected.status_code)
+                self.assertEqual(actual.json(), expected.json())
+
+        self.assertEqual(self.client.get(reverse("async_user_profile")).status_code, 401)
+        self.assertEqual(self.client.get(reverse("async_user_profile"), HTTP_AUTHORIZATION="Bearer junk").status_code, 401)
+
+        # A token that outlived its user, before any revocation reached this worker.
+        gone = User.objects.create_user(email="gone@example.com", password=PASSWORD, is_active=True)
+        client = self.client_for(gone)
+        User.objects.filter(id=gone.id).delete()
+        for name in ("user_profile", "async_user_profile"):
+            with self.subTest(name):
+                self.assertEqual(client.get(reverse(name)).status_code, 401)
+
+
+class DatabasePoolTests(JWTTestCase):
+    def test_modes(self):
+        base = {"ENGINE": "django.db.backends.postgresql", "NAME": "app", "CONN_MAX_AGE": 60, "OPTIONS": {"sslmode": "prefer"}}
+        with mock.patch.dict(os.environ, {"DB_POOL_MAX_SIZE": "7"}):
+            pooled = configure_database(base, "pool")
+        self.assertEqual(pooled["CONN_MAX_AGE"], 0)
+        self.assertEqual(pooled["OPTIONS"]["pool"]["max_size"], 7)
+        self.assertEqual(pooled["OPTIONS"]["sslmode"], "prefer")
+        self.assertNotIn("pool", base["OPTIONS"])
+
+        persistent = configure_database(pooled, "persistent")
+        self.assertNotIn("pool", persistent["OPTIONS"])
+        self.assertEqual(persistent["CONN_MAX_AGE"], 600)
+        self.assertTrue(persistent["CONN_HEALTH_CHECKS"])
+
+        pgbouncer = configure_database(base, "pgbouncer")
+        self.assertTrue(pgbouncer["DISABLE_SERVER_SIDE_CURSORS"])
+        self.assertIsNone(pgbouncer["OPTIONS"]["prepare_threshold"])
+        self.assertEqual(configure_database(base, "none")["CONN_MAX_AGE"], 0)
+        with self.assertRaises(ValueError):
+            configure_database(base, "bogus")
+
+    def test_pool_stats_are_admin_only(self):
+        admin = User.objects.create_superuser(email="pool-admin@example.com", password=PASSWORD)
+        member = User.objects.create_user(email="pool-member@example.com", password=PASSWORD, is_active=True)
+        response = self.client_for(admin).get(reverse("admin_db_pool"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.data["mode"], ("none", "persistent", "pool", "pgbouncer"))
+        self.assertEqual(self.client_for(member).get(reverse("admin_db_pool")).status_code, 403)
+
+
+@modify_settings(MIDDLEWARE={"prepend": "users.middleware.MetricsMiddleware"})
+class MetricsTests(JWTTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.admin = User.objects.create_superuser(email="metrics-admin@example.com", password=PASSWORD)
+
+    def test_requests_are_recorded_per_view(self):
+        member = User.objects.create_user(email="metrics-member@example.com", password=PASSWORD, is_active=True)
+        client = self.client_for(member)
+        with CaptureQueriesContext(connection) as captured:
+            client.get(reverse("user_profile"))
+            client.get(reverse("user_profile"))
+        queries = len(captured)
+        APIClient().post(reverse("token_obtain_pair"), {"email": member.email, "password": PASSWORD}, format="json")
+
+        self.assertEqual(metrics.latency[("api/profile/", "GET")].count, 2)
+        self.assertEqual(metrics.queries["api/profile/"].sum, queries)
+        self.assertEqual(metrics.responses[("api/profile/", "GET", "200")], 2)
+        self.assertEqual(metrics.timings["password_hash"].count, 1)
+        self.assertGreater(metrics.component_seconds[("api/login/", "password_hash")], 0)
+
+        self.assertEqual(self.client_for(member).get(reverse("admin_metrics")).status_code, 403)
+        response = self.client_for(self.admin).get(reverse("admin_metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('users_http_request_duration_seconds_count{view="api/profile/",method="GET"} 2', body)
+        self.assertIn('users_http_request_duration_seconds_bucket{view="api/profile/",method="GET",le="+Inf"} 2', body)
+
+    @override_settings(METRICS_SLOW_QUERY_MS=0)
+    def test_slow_queries_are_sampled(self):
+        self.client_for(self.admin).get(reverse("admin_user_detail", args=[self.admin.id]))
+        samples = self.client_for(self.admin).get(reverse("admin_slow_queries")).data
+        self.assertTrue(any(sample["path"] == reverse("admin_user_detail", args=[self.admin.id]) for sample in samples))
+
+    def test_recording_overhead(self):
+        iterations = 2000
+        started = time.perf_counter()
+        for _ in range(iterations):
+            token = metrics.start_request("/overhead/")
+            for _ in range(5):
+                metrics.record_query("SELECT 1", 0.0001)
+            metrics.finish_request(token, "overhead/", "GET", 200, 0.001)
+        # A generous ceiling; bench_metrics_overhead reports the real figure (~15 µs).
+        self.assertLess((time.perf_counter() - started) / iterations, 0.0005)
+
+
+@override_settings(QUERY_BUDGET_MODE="raise", PASSWORD_HASH_WORKERS=0)
+@modify_settings(MIDDLEWARE={"prepend": "users.middleware.MetricsMiddleware"})
+class QueryBudgetTests(JWTTestCase):
+    def test_every_route_stays_within_its_budget(self):
+        fixture = ApiFixture(200, shared=10)
+        client = APIClient()
+        for route, build in ROUTES.items():
+            for request in build(fixture, 2):
+                with self.subTest(route=route):
+                    if request.token:
+                        client.credentials(HTTP_AUTHORIZATION=f"Bearer {request.token}")
+                    else:
+                        client.credentials()
+                    response = getattr(client, request.method.lower())(request.path, request.data, format="json")
+                    self.assertLess(response.status_code, 500)
+
+    def test_overruns_raise_or_log(self):
+        first, second = (
+            User.objects.create_user(email=f"budget{i}@example.com", password=PASSWORD, is_active=True) for i in range(2)
+        )
+        with mock.patch.object(UserProfileView, "query_budget", 0):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "api/profile/"):
+                self.client_for(first).get(reverse("user_profile"))
+            with override_settings(QUERY_BUDGET_MODE="log"), self.assertLogs("users.utils.query_budget", "WARNING"):
+                self.assertEqual(self.client_for(second).get(reverse("user_profile")).status_code, 200)
+
+    def test_repeated_shapes_are_flagged(self):
+        lookup = 'SELECT "email" FROM "users_customuser" WHERE "id" = %s LIMIT 21'
+        self.assertEqual(sql_shape('SELECT 1 FROM t WHERE id IN (%s, %s, %s) LIMIT 5'), sql_shape('SELECT 1 FROM t WHERE id IN (%s) LIMIT 21'))
+        view = query_budget(10, max_repeats=2)(type("View", (), {}))
+        self.assertEqual(overruns(view, {lookup: 2, "SAVEPOINT \"s1\"": 5}), [])
+        problems = overruns(view, {lookup: 3})
+        self.assertEqual(len(problems), 1)
+        self.assertIn("N+1", problems[0])
+        self.assertEqual(len(overruns(view, {lookup: 11})), 2)
+
+
+@modify_settings(MIDDLEWARE={"prepend": "users.middleware.ProfilingMiddleware"})
+class ProfilerTests(JWTTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(
+            PROFILER_DIR=directory.name, PROFILER_POLL_SECONDS=0, PROFILER_INTERVAL_MS=1, PROFILER_FLUSH_SECONDS=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(profiler.stop_session)
+        self.admin = self.client_for(User.objects.create_superuser(email="profiler-admin@example.com", password=PASSWORD))
+        self.member = User.objects.create_user(email="profiled@example.com", password=PASSWORD, is_active=True)
+
+    def profile(self, **session):
+        """Starts a session for the profile route, serves slow requests under it and returns the session id."""
+        response = self.admin.post(reverse("admin_profiler"), {"route": "user_profile", "rate": 1, **session}, format="json")
+        self.assertEqual(response.status_code, 201)
+        original_get = UserProfileView.get
+
+        def slow_get(view, request):
+            time.sleep(0.02)
+            return original_get(view, request)
+
+        with mock.patch.object(UserProfileView, "get", slow_get):
+            for _ in range(3):
+                self.assertEqual(self.client_for(self.member).get(reverse("user_profile")).status_code, 200)
+        self.assertEqual(self.admin.delete(reverse("admin_profiler")).status_code, 200)
+        profiler.get_sampler(response.data)._thread.join(timeout=10)
+        return response.data["id"]
+
+    def test_sampled_stacks_are_merged_into_a_flamegraph(self):
+        self.assertEqual(self.client_for(self.member).get(reverse("admin_profiler")).status_code, 403)
+        self.assertEqual(self.admin.post(reverse("admin_profiler"), {"route": "nope"}, format="json").status_code, 400)
+
+        session_id = self.profile()
+        response = self.admin.get(reverse("admin_profile_capture", args=[session_id]))
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertTrue(any("slow_get" in line for line in lines))
+        self.assertTrue(all(line.rpartition(" ")[2].isdigit() for line in lines))
+
+        self.assertEqual(self.admin.delete(reverse("admin_profile_capture", args=[session_id])).data["files"], 1)
+        self.assertEqual(self.admin.get(reverse("admin_profile_capture", args=[session_id])).status_code, 404)
+
+    def test_allocation_snapshots(self):
+        session_id = self.profile(tracemalloc=True)
+        self.assertFalse(tracemalloc.is_tracing())
+        allocations = self.admin.get(reverse("admin_profile_capture", args=[session_id]), {"output": "allocations"}).data
+        self.assertTrue(allocations["allocations"])
+
+    def test_tracemalloc_flag_is_parsed_as_a_boolean(self):
+        for value, expected in (("false", False), ("0", False), ("true", True), (1, True)):
+            with self.subTest(value=value):
+                response = self.admin.post(reverse("admin_profiler"), {"route": "user_profile", "tracemalloc": value}, format="json")
+                self.assertEqual(response.status_code, 201)
+                self.assertIs(response.data["tracemalloc"], expected)
+                profiler.stop_session()
+        response = self.admin.post(reverse("admin_profiler"), {"route": "user_profile", "tracemalloc": "maybe"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class StateTransitionTests(TestCase):
+    def setUp(self):
+        # Cooldowns are keyed by user id, which SQLite hands out again after a rollback.
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="transition@example.com", password=PASSWORD,
+            verification_code="123456", verification_code_sent_at=timezone.now(),
+        )
+
+    def test_verification_is_one_partial_update_and_single_use(self):
+        data = {"email": "TRANSITION@example.com", "code": "123456"}
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.post(reverse("verify_email"), data).status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]["sql"].startswith("UPDATE"))
+        self.assertNotIn('"password"', queries[0]["sql"])
+        self.assertTrue(User.objects.get(id=self.user.id).is_active)
+
+        response = self.client.post(reverse("verify_email"), data)
+        self.assertEqual((response.status_code, response.data["error"]), (400, "Invalid verification code."))
+        self.assertEqual(self.client.post(reverse("verify_email"), {"email": "nobody@example.com", "code": "1"}).status_code, 404)
+
+    def test_expired_codes_are_rejected(self):
+        User.objects.filter(id=self.user.id).update(verification_code_sent_at=timezone.now() - timezone.timedelta(hours=2))
+        response = self.client.post(reverse("verify_email"), {"email": self.user.email, "code": "123456"})
+        self.assertEqual(response.data["error"], "Verification code has expired.")
+        self.assertFalse(User.objects.get(id=self.user.id).is_active)
+
+    def test_resend_and_reset_leave_other_columns_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("resend_verification"), {"email": self.user.email})
+            User.objects.filter(id=self.user.id).update(is_active=True)
+            self.client.post(reverse("forgot_password"), {"email": self.user.email})
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(any('"password" =' in sql or '"email" =' in sql for sql in updates))
+        self.assertIsNotNone(User.objects.get(id=self.user.id).password_reset_token)
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"], PASSWORD_HASH_WORKERS=0)
+    def test_password_and_email_writes_keep_concurrent_edits(self):
+        User.objects.filter(id=self.user.id).update(is_active=True)
+        client = APIClient()
+        client.force_authenticate(user=User.objects.get(id=self.user.id))
+        # Another request edits the profile after this one loaded the user.
+        User.objects.filter(id=self.user.id).update(first_name="Ada")
+
+        new = "N3w!Passw0rd"
+        response = client.post(
+            reverse("change-password"), {"old_password": PASSWORD, "new_password": new, "confirm_password": new}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.post(reverse("change-email"), {"new_email": "moved@example.com"}, format="json").status_code, 200)
+
+        token = uuid.uuid4()
+        User.objects.set_password_reset_token(self.user.id, token)
+        response = self.client.post(
+            reverse("reset_password"), {"token": str(token), "new_password": "R3set!Passw0rd", "confirm_password": "R3set!Passw0rd"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual((user.first_name, user.pending_email), ("Ada", "moved@example.com"))
+        self.assertTrue(user.check_password("R3set!Passw0rd"))
+        self.assertIsNone(user.password_reset_token)
+        self.assertFalse(User.objects.reset_password(self.user.id, token, "!"))
+
+    def test_email_change_to_a_taken_address(self):
+        User.objects.create_user(email="taken@example.com", password=PASSWORD)
+        User.objects.filter(id=self.user.id).update(
+            is_active=True, pending_email="taken@example.com", email_change_code="654321", email_change_code_sent_at=timezone.now()
+        )
+        client = APIClient()
+        client.force_authenticate(user=User.objects.get(id=self.user.id))
+        response = client.post(reverse("verify-new-email"), {"code": "654321"}, format="json")
+        self.assertEqual((response.status_code, response.data["error"]), (400, "This email is already in use."))
+        self.assertEqual(User.objects.get(id=self.user.id).email, "transition@example.com")
+
+
+class ApiBenchComparisonTests(TestCase):
+    def test_regressions_are_flagged(self):
+        baseline = {"login": {"rps": 100.0, "p95_ms": 10.0, "cpu_ms_per_request": 5.0, "queries_per_request": 1.0}}
+        current = {
+            "login": {"rps": 70.0, "p95_ms": 11.0, "cpu_ms_per_request": 5.0, "queries_per_request": 2.0},
+            "register": {"rps": 1.0, "p95_ms": 1.0, "cpu_ms_per_request": 1.0, "queries_per_request": 1.0},
+        }
+        regressed = {metric for route, metric, before, after, flag in compare(baseline, current, 0.25) if flag}
+        self.assertEqual(regressed, {"rps", "queries_per_request"})
+
+
+@skipUnless(connection.vendor == "postgresql", "Query plans are only checked on PostgreSQL.")
+class QueryPlanTests(TestCase):
+    """Every users view must reach users rows through an index, not a sequential scan."""
+
+    SEEDED_USERS = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_users(cls.SEEDED_USERS)
+        cls.admin = User.objects.create_superuser(email="plan-admin@example.com", password=PASSWORD)
+        cls.member = User.objects.filter_email("bench1@example.com").get()
+
+    def assertIndexedQueries(self, method, url, data=None, user=None):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            getattr(client, method)(url, data, format="json" if method != "get" else None)
+
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query["sql"].lstrip().upper().startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN " + query["sql"])
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                self.assertNotIn("Seq Scan on users_", plan, f"{method.upper()} {url}\n{query['sql']}\n{plan}")
+
+    def test_public_views_use_indexes(self):
+        email = "BENCH42@example.com"
+        self.assertIndexedQueries("post", reverse("token_obtain_pair"), {"email": email, "password": BENCH_PASSWORD})
+        self.assertIndexedQueries("post", reverse("register"), {"email": email, "password": PASSWORD, "confirm_password": PASSWORD})
+        self.assertIndexedQueries("post", reverse("verify_email"), {"email": "bench4@example.com", "code": "000000"})
+        self.assertIndexedQueries("post", reverse("resend_verification"), {"email": "bench8@example.com"})
+        self.assertIndexedQueries("post", reverse("forgot_password"), {"email": email})
+
+        token = str(User.objects.filter_email(email).get().password_reset_token)
+        self.assertIndexedQueries("post", reverse("validate-reset-token"), {"token": token})
+        self.assertIndexedQueries("post", reverse("reset_password"), {"token": token, "new_password": PASSWORD, "confirm_password": PASSWORD})
+
+    def test_authenticated_views_use_indexes(self):
+        self.assertIndexedQueries("get", reverse("user_profile"), user=self.member)
+        self.assertIndexedQueries("post", reverse("change-email"), {"new_email": "bench7@example.com"}, user=self.member)
+
+    def test_admin_views_use_indexes(self):
+        admin_users = reverse("admin_users")
+        for params in ({}, {"is_active": "false"}, {"is_staff": "true"}, {"email": "Bench123"}, {"ordering": "-email"}):
+            self.assertIndexedQueries("get", admin_users, params, user=self.admin)
+
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        next_cursor = client.get(admin_users).data["next_cursor"]
+        self.assertIndexedQueries("get", admin_users, {"cursor": next_cursor}, user=self.admin)
+        self.assertIndexedQueries("get", reverse("admin_user_detail", args=[self.member.id]), user=self.admin)
@@ -0,0 +1,94 @@
+"""Cluster-wide rate limiting over a shared, atomic counter store.
+
+Counters live in the Django cache named by `THROTTLE_CACHE_ALIAS` (default
+"default"). Point it at Redis or Memcached in production so every worker on every node
+counts against the same limits; LocMemCache is a faithful single-process stand-in for
+tests. Only atomic cache operations (`add`, `incr`, `decr`) are used, so concurrent
+hits never over-admit.
+"""
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class SlidingWindowLimiter:
+    """At most `limit` hits per `period` seconds for each key.
+
+    Larger limits use the sliding-window counter: the current fixed window's count plus
+    the previous window's, weighted by how much of it still overlaps the sliding window.
+    A limit of one is a plain cooldown, which `add()` with a TTL implements exactly.
+    Rejected hits are not counted.
+    """
+
+    prefix = "throttle"
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "THROTTLE_CACHE_ALIAS", "default")]
+
+    def hit(self, key, limit, period):
+        """Records a hit if allowed; returns (allowed, seconds until the next hit would be)."""
+        if limit == 1:
+            return self._cooldown(key, period)
+
+        now = time.time()
+        window, position = divmod(now / period, 1)
+        current_key = f"{self.prefix}:{key}:{int(window)}"
+        previous = self.cache.get(f"{self.prefix}:{key}:{int(window) - 1}", 0)
+
+        self.cache.add(current_key, 0, timeout=math.ceil(period * 2))
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.add(current_key, 1, timeout=math.ceil(period * 2))
+            current = 1
+
+        if previous * (1 - position) + current <= limit:
+            return True, 0.0
+
+        self.cache.decr(current_key)
+        if previous and current <= limit:
+            # Wait until enough of the previous window has slid out.
+            return False, max((1 - (limit - current) / previous - position) * period, 0.0)
+        return False, (1 - position) * period
+
+    def _cooldown(self, key, period):
+        key = f"{self.prefix}:{key}:cooldown"
+        until = time.time() + period
+        if self.cache.add(key, until, timeout=math.ceil(period)):
+            return True, 0.0
+        return False, max(self.cache.get(key, until) - time.time(), 0.0)
+
+    def claim(self, key, cooldown):
+        """True, and the key blocked for the `cooldown` timedelta, if it wasn't blocked already."""
+        return self.hit(key, 1, cooldown.total_seconds())[0]
+
+
+limiter = SlidingWindowLimiter()
+
+
+class SharedScopedRateThrottle(ScopedRateThrottle):
+    """`ScopedRateThrottle` whose counts are shared by every worker through `limiter`."""
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self.retry_after = limiter.hit(self.key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
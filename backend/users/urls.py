@@ -3,7 +3,14 @@ from .views import (
     RegisterView,
     CustomTokenObtainPairView,
     AdminUserListView,
+    AdminUserExportView,
+    AdminUserBulkView,
     AdminUserDetailView,
+    AdminDatabasePoolView,
+    AdminMetricsView,
+    AdminSlowQueriesView,
+    AdminProfilerView,
+    AdminProfileCaptureView,
     VerifyEmailView,
     ForgotPasswordView,
     ResetPasswordView,
@@ -14,18 +21,27 @@ from .views import (
     VerifyNewEmailView, 
     ChangePasswordView
 )
+from .async_views import AsyncLoginView, AsyncRegisterView, AsyncUserProfileView, AsyncVerifyEmailView
+from .serializers import CustomTokenRefreshSerializer
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
     path("login/", CustomTokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/refresh/", TokenRefreshView.as_view(serializer_class=CustomTokenRefreshSerializer), name="token_refresh"),
     path("profile/", UserProfileView.as_view(), name="user_profile"),
     path("change-password/", ChangePasswordView.as_view(), name="change-password"),
 
     # Admin Management
     path("admin/users/", AdminUserListView.as_view(), name="admin_users"),
+    path("admin/users/export/", AdminUserExportView.as_view(), name="admin_users_export"),
+    path("admin/users/bulk/", AdminUserBulkView.as_view(), name="admin_users_bulk"),
     path("admin/users/<int:user_id>/", AdminUserDetailView.as_view(), name="admin_user_detail"),
+    path("admin/db-pool/", AdminDatabasePoolView.as_view(), name="admin_db_pool"),
+    path("admin/metrics/", AdminMetricsView.as_view(), name="admin_metrics"),
+    path("admin/metrics/slow-queries/", AdminSlowQueriesView.as_view(), name="admin_slow_queries"),
+    path("admin/profiler/", AdminProfilerView.as_view(), name="admin_profiler"),
+    path("admin/profiler/<str:session_id>/", AdminProfileCaptureView.as_view(), name="admin_profile_capture"),
 
     # Email Service
     path("verify-email/", VerifyEmailView.as_view(), name="verify_email"),
@@ -36,6 +52,12 @@ urlpatterns = [
     path("change-email/", ChangeEmailView.as_view(), name="change-email"),
     path("verify-new-email/", VerifyNewEmailView.as_view(), name="verify-new-email"),
 
+    # Async variants of the hot endpoints, for the ASGI profile
+    path("async/register/", AsyncRegisterView.as_view(), name="async_register"),
+    path("async/login/", AsyncLoginView.as_view(), name="async_login"),
+    path("async/profile/", AsyncUserProfileView.as_view(), name="async_user_profile"),
+    path("async/verify-email/", AsyncVerifyEmailView.as_view(), name="async_verify_email"),
+
     # Protected Route (For Testing Authentication)
     path("protected/", CustomTokenObtainPairView.as_view(), name="protected"),
 ]
\ No newline at end of file
@@ -0,0 +1,185 @@
+import base64
+import csv
+import json
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.functions import Lower
+from users.utils.revocation import revocation_changes, revoke_deleted_users
+
+User = get_user_model()
+
+ADMIN_USER_FIELDS = ("id", "email", "is_active", "is_staff")
+ADMIN_USER_PAGE_SIZE = getattr(settings, "ADMIN_USER_PAGE_SIZE", 50)
+ADMIN_USER_MAX_PAGE_SIZE = getattr(settings, "ADMIN_USER_MAX_PAGE_SIZE", 500)
+
+ADMIN_EXPORT_CHUNK_SIZE = getattr(settings, "ADMIN_EXPORT_CHUNK_SIZE", 2000)
+# Secrets and one-time codes never leave the database through an export.
+ADMIN_EXPORT_EXCLUDED_FIELDS = {"password", "verification_code", "email_change_code", "password_reset_token"}
+ADMIN_EXPORT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname not in ADMIN_EXPORT_EXCLUDED_FIELDS
+)
+
+ADMIN_BULK_CHUNK_SIZE = getattr(settings, "ADMIN_BULK_CHUNK_SIZE", 1000)
+# Field changes per bulk action; None means delete.
+ADMIN_BULK_ACTIONS = {
+    "activate": {"is_active": True},
+    "deactivate": {"is_active": False},
+    "make_staff": {"is_staff": True},
+    "remove_staff": {"is_staff": False},
+    "delete": None,
+}
+
+# Keys `filter_users()` understands; a bulk filter may use no others.
+ADMIN_USER_FILTERS = ("is_active", "is_staff", "email")
+
+# Each ordering is on a unique, indexed column so it can double as the keyset cursor.
+ADMIN_USER_ORDERINGS = ("id", "-id", "email", "-email")
+# Type a decoded cursor must have for each ordering field.
+ADMIN_USER_CURSOR_TYPES = {"id": int, "email": str}
+
+
+def parse_bool(value):
+    """Parses a query-string boolean; raises ValueError for anything unrecognised."""
+    lowered = str(value).strip().lower()
+    if lowered in ("1", "true", "yes"):
+        return True
+    if lowered in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Invalid boolean value: {value}")
+
+
+def filter_users(params, queryset=None):
+    """Applies the admin filters (`is_active`, `is_staff`, case-insensitive `email` prefix) from `params`."""
+    users = User.objects.all() if queryset is None else queryset
+    for flag in ("is_active", "is_staff"):
+        if params.get(flag) not in (None, ""):
+            users = users.filter(**{flag: parse_bool(params[flag])})
+    email = params.get("email")
+    if email:
+        if not isinstance(email, str):
+            raise ValueError("Email filter must be a string.")
+        users = users.alias(email_lower=Lower("email")).filter(email_lower__startswith=email.lower())
+    return users
+
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of `encode_cursor`; raises ValueError for a tampered or malformed cursor."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError) as ex:
+        raise ValueError("Invalid cursor.") from ex
+
+
+def paginate_users(users, ordering="id", cursor=None, page_size=ADMIN_USER_PAGE_SIZE):
+    """Returns one keyset page of `users` as (rows, next_cursor).
+
+    The cursor holds the last row's ordering value, so every page is a bounded range
+    scan on an index no matter how deep it is.
+    """
+    if ordering not in ADMIN_USER_ORDERINGS:
+        raise ValueError(f"Ordering must be one of: {', '.join(ADMIN_USER_ORDERINGS)}.")
+    if not 1 <= page_size <= ADMIN_USER_MAX_PAGE_SIZE:
+        raise ValueError(f"Page size must be between 1 and {ADMIN_USER_MAX_PAGE_SIZE}.")
+
+    field = ordering.lstrip("-")
+    if cursor:
+        value = decode_cursor(cursor)
+        # A hand-made cursor can decode to any JSON value; only a scalar of the field's type is a position.
+        if not isinstance(value, ADMIN_USER_CURSOR_TYPES[field]) or isinstance(value, bool):
+            raise ValueError("Invalid cursor.")
+        lookup = "lt" if ordering.startswith("-") else "gt"
+        users = users.filter(**{f"{field}__{lookup}": value})
+
+    rows = list(users.order_by(ordering).values(*ADMIN_USER_FIELDS)[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1][field]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def parse_export_fields(value):
+    """Column list for an export from a comma-separated `fields` parameter."""
+    if not value:
+        return ADMIN_EXPORT_FIELDS
+    fields = tuple(name.strip() for name in value.split(",") if name.strip())
+    unknown = [name for name in fields if name not in ADMIN_EXPORT_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown export field(s): {', '.join(unknown)}. Allowed: {', '.join(ADMIN_EXPORT_FIELDS)}.")
+    return fields
+
+
+class _LineBuffer:
+    """File-like sink that hands each csv row straight back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_users(users, fields, output="ndjson", chunk_size=None):
+    """Yields `users` as NDJSON or CSV text, one chunk of rows at a time.
+
+    Rows come from a server-side cursor (`iterator()`), so memory stays bounded by
+    `chunk_size` whatever the size of the table.
+    """
+    chunk_size = chunk_size or ADMIN_EXPORT_CHUNK_SIZE
+    rows = users.order_by("id").values_list(*fields).iterator(chunk_size=chunk_size)
+
+    if output == "csv":
+        writer = csv.writer(_LineBuffer())
+        format_row = writer.writerow
+        yield format_row(fields)
+    else:
+        encoder = DjangoJSONEncoder()
+
+        def format_row(row):
+            return encoder.encode(dict(zip(fields, row))) + "\n"
+
+    lines = []
+    for row in rows:
+        lines.append(format_row(row))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def _id_chunks(users, chunk_size):
+    """Walks the primary keys of `users` in ascending keyset chunks."""
+    last_id = 0
+    while ids := list(users.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:chunk_size]):
+        yield ids
+        last_id = ids[-1]
+
+
+def bulk_apply(action, ids=None, users=None, exclude_id=None, chunk_size=None):
+    """Applies a bulk admin action to explicit `ids` or to a `users` queryset.
+
+    Work is done in chunks of `chunk_size` primary keys, one UPDATE (or one cascading
+    DELETE) per chunk, all inside a single transaction. Changed users have their tokens
+    revoked, since those carry the old flags, and deleted users are tombstoned. `exclude_id` protects the acting admin
+    from locking themselves out. Returns the number of users affected.
+    """
+    changes = ADMIN_BULK_ACTIONS[action]
+    chunk_size = chunk_size or ADMIN_BULK_CHUNK_SIZE
+    if ids is not None:
+        ids = sorted(set(ids) - {exclude_id})
+        chunks = (ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size))
+    else:
+        chunks = _id_chunks(users.exclude(id=exclude_id), chunk_size)
+
+    affected = 0
+    with transaction.atomic():
+        for chunk in chunks:
+            targets = User.objects.filter(id__in=chunk)
+            if changes is None:
+                revoke_deleted_users(*targets.values_list("id", flat=True))
+                affected += targets.delete()[1].get(User._meta.label, 0)
+            else:
+                # Users already in the target state keep their tokens.
+                affected += targets.exclude(**changes).update(**changes, **revocation_changes())
+    return affected
@@ -0,0 +1,310 @@
+"""End-to-end benchmark of every users API route, driven by `manage.py bench_api`.
+
+Routes are exercised in-process through the DRF test client by concurrent threads, each
+with its own database connection, against a throwaway database seeded by `ApiFixture`.
+Requests that change per-user state (password changes, resets, email changes,
+deletions...) each get a user of their own, so none is answered from a cooldown or an
+already consumed code. For every route the run records throughput, latency
+percentiles, queries per request and process CPU time per request. The CPU figure
+includes the test client's share and the hashing done in-process, so compare it only
+against runs with the same settings.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from users.serializers import CustomTokenObtainPairSerializer
+from users.utils.bench import BENCH_PASSWORD, seed_users, summarize
+
+User = get_user_model()
+
+NEW_PASSWORD = "Bench!Passw0rd-2"
+VERIFICATION_CODE = "123456"
+
+
+@dataclass
+class ApiRequest:
+    method: str
+    path: str
+    data: dict = None
+    token: str = None
+
+
+@dataclass
+class RouteResult:
+    route: str
+    latencies: list = field(default_factory=list)
+    cpu: float = 0.0
+    queries: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+    def metrics(self):
+        count = len(self.latencies)
+        stats = summarize(self.latencies)
+        return {
+            "requests": count,
+            "rps": count / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": stats["p50_ms"],
+            "p95_ms": stats["p95_ms"],
+            "p99_ms": stats["p99_ms"],
+            "queries_per_request": self.queries / count if count else 0.0,
+            "cpu_ms_per_request": self.cpu / count * 1000 if count else 0.0,
+            "statuses": {str(code): n for code, n in sorted(self.statuses.items())},
+        }
+
+
+class ApiFixture:
+    """Seeded users and tokens, handed out so that state-changing requests never share a user."""
+
+    def __init__(self, users, shared=200):
+        seed_users(users, prefix="api")
+        self.admin = User.objects.create_superuser(email="api-admin@example.com", password=BENCH_PASSWORD)
+        self.admin_token = self.access_token(self.admin)
+        self._active = list(User.objects.filter(is_active=True, is_staff=False).order_by("pk"))
+        self._inactive = list(User.objects.filter(is_active=False).order_by("pk"))
+        self.shared = self._active[:shared]
+        self._next_active = len(self.shared)
+        self._next_inactive = 0
+        self._tokens = {}
+
+    @staticmethod
+    def access_token(user):
+        return str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+    def token(self, user):
+        if user.pk not in self._tokens:
+            self._tokens[user.pk] = self.access_token(user)
+        return self._tokens[user.pk]
+
+    def refresh_token(self, user):
+        return str(CustomTokenObtainPairSerializer.get_token(user))
+
+    def take(self, count, active=True):
+        """`count` users no other route has been given."""
+        pool, start = (self._active, self._next_active) if active else (self._inactive, self._next_inactive)
+        if start + count > len(pool):
+            raise ValueError(f"Not enough {'active' if active else 'unverified'} users seeded; raise --users.")
+        if active:
+            self._next_active += count
+        else:
+            self._next_inactive += count
+        return pool[start:start + count]
+
+    def cycle(self, count):
+        """`count` users from the shared, read-mostly set."""
+        return [self.shared[i % len(self.shared)] for i in range(count)]
+
+
+def _unverified_with_code(fixture, n):
+    users = fixture.take(n, active=False)
+    User.objects.filter(pk__in=[user.pk for user in users]).update(
+        verification_code=VERIFICATION_CODE, verification_code_sent_at=now()
+    )
+    return users
+
+
+def _with_reset_tokens(fixture, n):
+    users = fixture.take(n)
+    for user in users:
+        user.password_reset_token = uuid.uuid4()
+        user.password_reset_requested_at = now()
+    User.objects.bulk_update(users, ["password_reset_token", "password_reset_requested_at"])
+    return users
+
+
+def _with_pending_email(fixture, n):
+    users = fixture.take(n)
+    for user in users:
+        user.pending_email = f"api-pending-{user.pk}@example.com"
+        user.email_change_code = VERIFICATION_CODE
+        user.email_change_code_sent_at = now()
+    User.objects.bulk_update(users, ["pending_email", "email_change_code", "email_change_code_sent_at"])
+    return users
+
+
+def _register(name):
+    run = time.time_ns()
+    return lambda fixture, n: [
+        ApiRequest("POST", reverse(name), {
+            "email": f"api-new-{run}-{i}@example.com", "password": BENCH_PASSWORD, "confirm_password": BENCH_PASSWORD,
+        })
+        for i in range(n)
+    ]
+
+
+def _verify_email(name):
+    return lambda fixture, n: [
+        ApiRequest("POST", reverse(name), {"email": user.email, "code": VERIFICATION_CODE})
+        for user in _unverified_with_code(fixture, n)
+    ]
+
+
+def _login(name):
+    return lambda fixture, n: [
+        ApiRequest("POST", reverse(name), {"email": user.email, "password": BENCH_PASSWORD}) for user in fixture.cycle(n)
+    ]
+
+
+def _profile(name):
+    return lambda fixture, n: [ApiRequest("GET", reverse(name), token=fixture.token(user)) for user in fixture.cycle(n)]
+
+
+def _admin(method, name, data=None, query=""):
+    return lambda fixture, n: [ApiRequest(method, reverse(name) + query, data, fixture.admin_token) for _ in range(n)]
+
+
+# Route -> builder of its n requests. Names follow users/urls.py; "async-*" are the async variants.
+ROUTES = {
+    "register": _register("register"),
+    "verify-email": _verify_email("verify_email"),
+    "resend-verification": lambda fixture, n: [
+        ApiRequest("POST", reverse("resend_verification"), {"email": user.email}) for user in fixture.take(n, active=False)
+    ],
+    "login": _login("token_obtain_pair"),
+    "token-refresh": lambda fixture, n: [
+        ApiRequest("POST", reverse("token_refresh"), {"refresh": fixture.refresh_token(user)}) for user in fixture.cycle(n)
+    ],
+    "profile-get": _profile("user_profile"),
+    "profile-put": lambda fixture, n: [
+        ApiRequest("PUT", reverse("user_profile"), {"first_name": f"Bench{i}"}, fixture.token(user))
+        for i, user in enumerate(fixture.cycle(n))
+    ],
+    "change-password": lambda fixture, n: [
+        ApiRequest("POST", reverse("change-password"), {
+            "old_password": BENCH_PASSWORD, "new_password": NEW_PASSWORD, "confirm_password": NEW_PASSWORD,
+        }, fixture.token(user))
+        for user in fixture.take(n)
+    ],
+    "change-email": lambda fixture, n: [
+        ApiRequest("POST", reverse("change-email"), {"new_email": f"api-changed-{user.pk}@example.com"}, fixture.token(user))
+        for user in fixture.take(n)
+    ],
+    "verify-new-email": lambda fixture, n: [
+        ApiRequest("POST", reverse("verify-new-email"), {"code": VERIFICATION_CODE}, fixture.token(user))
+        for user in _with_pending_email(fixture, n)
+    ],
+    "forgot-password": lambda fixture, n: [
+        ApiRequest("POST", reverse("forgot_password"), {"email": user.email}) for user in fixture.take(n)
+    ],
+    "validate-reset-token": lambda fixture, n: [
+        ApiRequest("POST", reverse("validate-reset-token"), {"token": str(user.password_reset_token)})
+        for user in _with_reset_tokens(fixture, n)
+    ],
+    "reset-password": lambda fixture, n: [
+        ApiRequest("POST", reverse("reset_password"), {
+            "token": str(user.password_reset_token), "new_password": NEW_PASSWORD, "confirm_password": NEW_PASSWORD,
+        })
+        for user in _with_reset_tokens(fixture, n)
+    ],
+    "admin-list": _admin("GET", "admin_users", query="?page_size=50"),
+    "admin-export": _admin("GET", "admin_users_export", query="?output=ndjson"),
+    "admin-bulk": lambda fixture, n: [
+        ApiRequest("POST", reverse("admin_users_bulk"), {"action": "deactivate", "ids": [user.pk for user in users]},
+                   fixture.admin_token)
+        for users in (fixture.take(5) for _ in range(n))
+    ],
+    "admin-detail-get": lambda fixture, n: [
+        ApiRequest("GET", reverse("admin_user_detail", args=[user.pk]), token=fixture.admin_token) for user in fixture.cycle(n)
+    ],
+    "admin-detail-put": lambda fixture, n: [
+        ApiRequest("PUT", reverse("admin_user_detail", args=[user.pk]), {"is_staff": True}, fixture.admin_token)
+        for user in fixture.take(n)
+    ],
+    "admin-detail-delete": lambda fixture, n: [
+        ApiRequest("DELETE", reverse("admin_user_detail", args=[user.pk]), token=fixture.admin_token)
+        for user in fixture.take(n)
+    ],
+    "admin-db-pool": _admin("GET", "admin_db_pool"),
+    "async-register": _register("async_register"),
+    "async-verify-email": _verify_email("async_verify_email"),
+    "async-login": _login("async_login"),
+    "async-profile": _profile("async_user_profile"),
+}
+
+
+def run_route(route, requests, concurrency):
+    """Sends `requests` from `concurrency` threads and returns the RouteResult."""
+    result = RouteResult(route)
+    lock = threading.Lock()
+    pending = iter(requests)
+
+    def worker():
+        client = APIClient()
+        try:
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                if request.token:
+                    client.credentials(HTTP_AUTHORIZATION=f"Bearer {request.token}")
+                else:
+                    client.credentials()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, request.method.lower())(request.path, request.data, format="json")
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    latency = time.perf_counter() - started
+                with lock:
+                    result.latencies.append(latency)
+                    result.queries += len(captured)
+                    result.statuses[response.status_code] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    cpu_started, started = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed, result.cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return result
+
+
+# Metric -> (higher is worse, relative tolerance used unless overridden). Query counts are
+# deterministic, so any increase of half a query per request or more is a regression.
+COMPARED_METRICS = {
+    "rps": (False, None),
+    "p95_ms": (True, None),
+    "cpu_ms_per_request": (True, None),
+    "queries_per_request": (True, 0.5),
+}
+
+
+def compare(baseline, current, threshold):
+    """Returns [(route, metric, baseline, current, regressed)] for routes in both runs."""
+    rows = []
+    for route, metrics in current.items():
+        if route not in baseline:
+            continue
+        for metric, (higher_is_worse, absolute) in COMPARED_METRICS.items():
+            before, after = baseline[route][metric], metrics[metric]
+            if absolute is not None:
+                regressed = after - before >= absolute
+            elif higher_is_worse:
+                regressed = after > before * (1 + threshold)
+            else:
+                regressed = after < before * (1 - threshold)
+            rows.append((route, metric, before, after, regressed))
+    return rows
+
+
+def save_baseline(path, meta, routes):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "routes": routes}, fh, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
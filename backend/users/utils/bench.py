@@ -0,0 +1,120 @@
+import json
+import statistics
+import threading
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+BENCH_PASSWORD = "Bench!Passw0rd"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """Runs the block against a throwaway test database, never the configured one."""
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def seed_users(count, prefix="bench", batch_size=5000, inactive_every=4):
+    """Bulk-inserts `count` users sharing one precomputed hash of BENCH_PASSWORD.
+
+    Every `inactive_every`-th user is left unverified so status filters have work to do.
+    """
+    User = get_user_model()
+    password = make_password(BENCH_PASSWORD)
+    for start in range(0, count, batch_size):
+        User.objects.bulk_create([
+            User(email=f"{prefix}{i}@example.com", password=password, is_active=bool(i % inactive_every))
+            for i in range(start, min(count, start + batch_size))
+        ])
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {User._meta.db_table}")
+
+
+class _StubEmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.connections.add(self.client_address)
+        operation_id = str(uuid.uuid4())
+        self._reply(202, {"id": operation_id, "status": "Running"}, {
+            "Operation-Location": f"http://{self.headers['Host']}/emails/operations/{operation_id}",
+            "Retry-After": "0",
+        })
+
+    def do_GET(self):
+        operation_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+        self._reply(200, {"id": operation_id, "status": "Succeeded"})
+
+    def _reply(self, code, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubEmailServer:
+    """Local HTTP server speaking enough of the Azure email API for `EmailClient`.
+
+    Use as a context manager; `connection_string` points an `AzureEmailTransport` at it
+    and `connections` records the distinct client sockets that sent mail.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _StubEmailHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.connections = set()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def connection_string(self):
+        host, port = self.httpd.server_address[:2]
+        return f"endpoint=http://{host}:{port}/;accesskey=c3R1Yi1rZXk="
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,89 @@
+"""Connection persistence and pooling for the Postgres backend, chosen per environment.
+
+`configure_database()` turns a plain `DATABASES` entry into one of these modes, taken
+from `DB_POOL_MODE` unless given:
+
+- "none": a new connection for every request, Django's default.
+- "persistent": each worker thread keeps its connection for `DB_CONN_MAX_AGE` seconds
+  (default 600) and checks it is alive before reusing it after a request.
+- "pool": Django's native psycopg 3 pool, shared by the threads of a worker process
+  and sized by `DB_POOL_MIN_SIZE` / `DB_POOL_MAX_SIZE` (default 2 / 10); a request
+  waits at most `DB_POOL_TIMEOUT` seconds (default 10) for a free connection.
+  Connections are checked before they are handed out.
+- "pgbouncer": persistent connections to a PgBouncer in transaction pooling mode.
+  Server-side cursors and prepared statements don't survive transaction pooling, so
+  both are disabled; `.iterator()` then buffers the whole result on the client.
+
+In settings::
+
+    DATABASES = {"default": configure_database({"ENGINE": "django.db.backends.postgresql", ...})}
+"""
+import os
+from django.db import connections
+
+POOL_MODES = ("none", "persistent", "pool", "pgbouncer")
+
+
+def configure_database(database, mode=None):
+    """Returns a copy of the `database` settings dict set up for `mode`."""
+    mode = mode or os.environ.get("DB_POOL_MODE", "none")
+    if mode not in POOL_MODES:
+        raise ValueError(f"Unknown DB_POOL_MODE {mode!r}; expected one of {', '.join(POOL_MODES)}.")
+
+    database = {**database, "OPTIONS": {**database.get("OPTIONS", {})}, "CONN_HEALTH_CHECKS": True}
+    database["OPTIONS"].pop("pool", None)
+    if mode == "none":
+        database["CONN_MAX_AGE"] = 0
+    elif mode == "pool":
+        # The pool owns connection lifetime; Django refuses CONN_MAX_AGE with it.
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }
+    else:
+        database["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", 600))
+    if mode == "pgbouncer":
+        database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        database["OPTIONS"]["prepare_threshold"] = None
+    return database
+
+
+def pool_mode(alias="default"):
+    """The mode an already configured database is in."""
+    settings_dict = connections[alias].settings_dict
+    if settings_dict.get("OPTIONS", {}).get("pool"):
+        return "pool"
+    if settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        return "pgbouncer"
+    return "none" if settings_dict.get("CONN_MAX_AGE", 0) == 0 else "persistent"
+
+
+def pool_stats(alias="default"):
+    """Connection usage of this worker process.
+
+    With a pool: its size, connections in use and available, requests still waiting,
+    and since start-up the requests served, how many had to wait and for how long in
+    total, and timeouts. Without one, only the mode.
+    """
+    stats = {"mode": pool_mode(alias)}
+    pool = getattr(connections[alias], "pool", None)
+    if pool is None:
+        return stats
+    raw = pool.get_stats()
+    stats.update({
+        "size": raw.get("pool_size", 0),
+        "min_size": raw.get("pool_min", 0),
+        "max_size": raw.get("pool_max", 0),
+        "in_use": raw.get("pool_size", 0) - raw.get("pool_available", 0),
+        "available": raw.get("pool_available", 0),
+        "waiting": raw.get("requests_waiting", 0),
+        "requests": raw.get("requests_num", 0),
+        "waits": raw.get("requests_queued", 0),
+        "wait_time_ms": raw.get("requests_wait_ms", 0),
+        "timeouts": raw.get("requests_errors", 0),
+        "connections_opened": raw.get("connections_num", 0),
+        "connections_lost": raw.get("connections_lost", 0) + raw.get("returns_bad", 0),
+    })
+    return stats
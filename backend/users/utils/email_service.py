@@ -1,59 +1,213 @@
+import logging
 import os
 import random
 import string
-from azure.communication.email import EmailClient
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from itertools import islice
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+from users.models import OutboundEmail
+from users.utils.email_transport import get_transport
+from users.utils.metrics import EMAIL_QUEUE, EMAIL_SEND, timed
+
+logger = logging.getLogger(__name__)
 
-AZURE_CONNECTION_STRING = settings.AZURE_EMAIL_CONNECTION_STRING
 AZURE_SENDER_EMAIL = settings.AZURE_SENDER_EMAIL
 
+OUTBOX_BATCH_SIZE = getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 50)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+OUTBOX_RETRY_BASE_SECONDS = getattr(settings, "EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30)
+OUTBOX_RETRY_MAX_SECONDS = getattr(settings, "EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600)
+# How long a worker may hold claimed rows before another worker takes them over.
+OUTBOX_LEASE_SECONDS = getattr(settings, "EMAIL_OUTBOX_LEASE_SECONDS", 300)
+OUTBOX_RETENTION_DAYS = getattr(settings, "EMAIL_OUTBOX_RETENTION_DAYS", 7)
+
+# Azure Communication Services accepts at most 50 recipients per message, and rejects
+# one without a `to` recipient: a bulk message goes to this address, its BCCs fill the rest.
+BULK_TO_ADDRESS = getattr(settings, "EMAIL_BULK_TO_ADDRESS", AZURE_SENDER_EMAIL)
+BULK_BATCH_SIZE = getattr(settings, "EMAIL_BULK_BATCH_SIZE", 49)
+BULK_MAX_CONCURRENCY = getattr(settings, "EMAIL_BULK_MAX_CONCURRENCY", 4)
+
 def generate_verification_code(length=6):
     return "".join(random.choices(string.digits, k=length))
 
-def send_verification_email(to_email: str, verification_code: str):
-    """Sends an email with a verification code."""
-    try:
-        client = EmailClient.from_connection_string(AZURE_CONNECTION_STRING)
-
-        message = {
-            "senderAddress": AZURE_SENDER_EMAIL,
-            "recipients": {"to": [{"address": to_email}]},
-            "content": {
-                "subject": "Verify Your Email",
-                "plainText": f"Your verification code is: {verification_code}",
-                "html": f"<p>Your verification code is: <strong>{verification_code}</strong></p>"
-            }
+def build_message(to_email: str, subject: str, plain_text: str, html: str = ""):
+    """Builds a provider message for a single recipient."""
+    return {
+        "senderAddress": AZURE_SENDER_EMAIL,
+        "recipients": {"to": [{"address": to_email}]},
+        "content": {
+            "subject": subject,
+            "plainText": plain_text,
+            "html": html,
         }
+    }
 
-        poller = client.begin_send(message)
-        result = poller.result()
-        return result.get("status") in ["Succeeded", "InProgress"]
+def build_bulk_message(recipients, subject: str, plain_text: str, html: str = ""):
+    """Builds one provider message to BULK_TO_ADDRESS, delivered to every recipient as a BCC."""
+    message = build_message(BULK_TO_ADDRESS, subject, plain_text, html)
+    message["recipients"]["bcc"] = [{"address": address} for address in recipients]
+    return message
 
-    except Exception as ex:
-        print(f"Error sending verification email: {ex}")
-        return False
+def queue_email(to_email: str, subject: str, plain_text: str, html: str = ""):
+    """Stores an email in the outbox; the worker delivers it outside the request."""
+    with timed(EMAIL_QUEUE):
+        OutboundEmail.objects.create(to_email=to_email, subject=subject, plain_text=plain_text, html=html)
+    return True
+
+async def aqueue_email(to_email: str, subject: str, plain_text: str, html: str = ""):
+    """`queue_email()` for async views: one awaited INSERT, delivery stays with the worker."""
+    with timed(EMAIL_QUEUE):
+        await OutboundEmail.objects.acreate(to_email=to_email, subject=subject, plain_text=plain_text, html=html)
+    return True
+
+def verification_email_content(verification_code: str):
+    """Subject, plain text and HTML body of a verification code email."""
+    return (
+        "Verify Your Email",
+        f"Your verification code is: {verification_code}",
+        f"<p>Your verification code is: <strong>{verification_code}</strong></p>",
+    )
+
+def send_verification_email(to_email: str, verification_code: str):
+    """Queues an email with a verification code."""
+    return queue_email(to_email, *verification_email_content(verification_code))
+
+async def asend_verification_email(to_email: str, verification_code: str):
+    """Queues an email with a verification code without blocking the event loop."""
+    return await aqueue_email(to_email, *verification_email_content(verification_code))
 
 def send_password_reset_email(to_email: str, reset_token: str):
-    """Sends an email with a password reset link."""
-    try:
-        client = EmailClient.from_connection_string(AZURE_CONNECTION_STRING)
-        
-        reset_link = f"https://roughy-measured-ghastly.ngrok-free.app/reset-password?token={reset_token}"
-        
-        message = {
-            "senderAddress": AZURE_SENDER_EMAIL,
-            "recipients": {"to": [{"address": to_email}]},
-            "content": {
-                "subject": "Password Reset Request",
-                "plainText": f"Click the link to reset your password: {reset_link}",
-                "html": f"<p>Click <a href='{reset_link}'>here</a> to reset your password.</p>"
-            }
-        }
+    """Queues an email with a password reset link."""
+    reset_link = f"https://roughy-measured-ghastly.ngrok-free.app/reset-password?token={reset_token}"
+
+    return queue_email(
+        to_email,
+        "Password Reset Request",
+        f"Click the link to reset your password: {reset_link}",
+        f"<p>Click <a href='{reset_link}'>here</a> to reset your password.</p>",
+    )
 
-        poller = client.begin_send(message)
-        result = poller.result()
-        return result.get("status") in ["Succeeded", "InProgress"]
+def retry_delay(attempts: int):
+    """Exponential backoff for the given number of failed attempts."""
+    return timedelta(seconds=min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS))
 
+def claim_outbox_batch(batch_size: int = OUTBOX_BATCH_SIZE):
+    """Leases up to `batch_size` due emails to the caller and returns them.
+
+    The claim is one short transaction: rows are locked with SKIP LOCKED, so concurrent
+    workers take different rows, and leased by moving `next_attempt_at` to the lease
+    expiry and counting the attempt. Rows a crashed worker never finished become due
+    again when the lease runs out.
+    """
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now())
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                attempts=F("attempts") + 1, next_attempt_at=now() + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+            )
+    for email in batch:
+        email.attempts += 1
+    return batch
+
+def deliver(email: OutboundEmail):
+    """Sends one claimed outbox row through the transport and records the outcome on it."""
+    try:
+        message = build_message(email.to_email, email.subject, email.plain_text, email.html)
+        with timed(EMAIL_SEND):
+            accepted = get_transport().send(message)
+        error = "" if accepted else "Rejected by email provider."
     except Exception as ex:
-        print(f"Error sending password reset email: {ex}")
-        return False
\ No newline at end of file
+        accepted, error = False, str(ex)
+
+    outcome = {"last_error": error}
+    if accepted:
+        outcome.update(status=OutboundEmail.STATUS_SENT, sent_at=now())
+    elif email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        outcome.update(status=OutboundEmail.STATUS_FAILED)
+    else:
+        outcome.update(next_attempt_at=now() + retry_delay(email.attempts))
+    # Conditional on the claim, so a worker whose lease ran out can't overwrite the row
+    # after another worker has taken it over.
+    OutboundEmail.objects.filter(
+        pk=email.pk, status=OutboundEmail.STATUS_PENDING, attempts=email.attempts
+    ).update(**outcome)
+    return accepted
+
+def process_outbox_batch(batch_size: int = OUTBOX_BATCH_SIZE):
+    """Delivers up to `batch_size` due emails and returns (sent, failed) counts.
+
+    Sending happens outside any transaction, each result written by its own UPDATE, so
+    no row lock or connection is held open while the provider responds.
+    """
+    sent = failed = 0
+    for email in claim_outbox_batch(batch_size):
+        if deliver(email):
+            sent += 1
+        else:
+            failed += 1
+    return sent, failed
+
+def purge_sent_emails(batch_size: int = 1000):
+    """Deletes sent emails older than OUTBOX_RETENTION_DAYS in small batches; returns how many."""
+    cutoff = now() - timedelta(days=OUTBOX_RETENTION_DAYS)
+    expired = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_SENT, sent_at__lt=cutoff)
+    purged = 0
+    while ids := list(expired.values_list("id", flat=True)[:batch_size]):
+        purged += OutboundEmail.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+    return purged
+
+def _send_batch(transport, batch):
+    """Sends one batch, merging recipients that share identical content into one message."""
+    groups = {}
+    for to_email, subject, plain_text, html in batch:
+        groups.setdefault((subject, plain_text, html), []).append(to_email)
+
+    statuses = {}
+    for content, recipients in groups.items():
+        if len(recipients) == 1:
+            message = build_message(recipients[0], *content)
+        else:
+            message = build_bulk_message(recipients, *content)
+        try:
+            with timed(EMAIL_SEND):
+                accepted = transport.send(message)
+        except Exception:
+            logger.exception("Error sending bulk email to %d recipient(s)", len(recipients))
+            accepted = False
+        statuses.update(dict.fromkeys(recipients, accepted))
+    return statuses
+
+def send_bulk(messages, batch_size: int = BULK_BATCH_SIZE, max_concurrency: int = BULK_MAX_CONCURRENCY):
+    """Sends many emails directly through the transport, bypassing the outbox.
+
+    `messages` is an iterable of (to_email, subject, plain_text, html) tuples and is
+    consumed lazily, so a queryset iterator can be passed straight in. Messages are
+    grouped into provider-sized batches and at most `max_concurrency` batches are in
+    flight at once. Returns a dict mapping each recipient to True if it was accepted.
+    """
+    transport = get_transport()
+    messages = iter(messages)
+    statuses = {}
+    in_flight = set()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while batch := list(islice(messages, batch_size)):
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    statuses.update(future.result())
+            in_flight.add(executor.submit(_send_batch, transport, batch))
+
+        for future in wait(in_flight).done:
+            statuses.update(future.result())
+    return statuses
@@ -0,0 +1,177 @@
+import atexit
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+import requests
+from azure.communication.email import EmailClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+DEFAULT_EMAIL_TRANSPORT = "users.utils.email_transport.AzureEmailTransport"
+
+
+class BaseEmailTransport:
+    """Delivers a single message built by `email_service.build_message`."""
+
+    def send(self, message) -> bool:
+        """Send the message and return True if the provider accepted it."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the transport."""
+
+
+class AzureEmailTransport(BaseEmailTransport):
+    """Sends messages through Azure Communication Services.
+
+    The `EmailClient` and its pooled HTTP session are built lazily and owned by the
+    process that built them: after a fork (e.g. gunicorn with `preload_app`) the child
+    notices the PID change and opens its own instead of sharing the parent's sockets.
+    Consecutive failures are tracked; past `failure_threshold` the client is rebuilt.
+    Pass `reuse_client=False` to fall back to one client per message.
+    """
+
+    def __init__(self, connection_string=None, pool_maxsize=10, failure_threshold=5, reuse_client=True):
+        self.connection_string = connection_string or settings.AZURE_EMAIL_CONNECTION_STRING
+        self.pool_maxsize = pool_maxsize
+        self.failure_threshold = failure_threshold
+        self.reuse_client = reuse_client
+
+        self.consecutive_failures = 0
+        self.last_success_at = None
+        self.last_error = ""
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._session = None
+        atexit.register(self.close)
+
+    @property
+    def healthy(self):
+        return self.consecutive_failures < self.failure_threshold
+
+    def health(self):
+        """Snapshot of the transport state for diagnostics."""
+        return {
+            "healthy": self.healthy,
+            "consecutive_failures": self.consecutive_failures,
+            "last_success_at": self.last_success_at,
+            "last_error": self.last_error,
+            "connected": self._pid == os.getpid() and self._client is not None,
+        }
+
+    def _build_client(self, **kwargs):
+        # `EmailClient.from_connection_string` keeps only the host and forces https;
+        # honour the scheme so the client can also target a local stub server.
+        parts = dict(element.partition("=")[::2] for element in self.connection_string.split(";") if element)
+        parts = {key.lower(): value for key, value in parts.items()}
+        return EmailClient(parts["endpoint"].rstrip("/"), AzureKeyCredential(parts["accesskey"]), **kwargs)
+
+    def _get_client(self):
+        if not self.reuse_client:
+            return self._build_client()
+        if self._pid != os.getpid() or self._client is None:
+            with self._lock:
+                if self._pid != os.getpid() or self._client is None:
+                    self._open()
+        return self._client
+
+    def _open(self):
+        # The previous session is dropped rather than closed: it may be a parent's
+        # (inherited across fork) or still in use by a send on another thread.
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._session = session
+        self._client = self._build_client(transport=RequestsTransport(session=session, session_owner=False))
+        self._pid = os.getpid()
+
+    def send(self, message):
+        try:
+            poller = self._get_client().begin_send(message)
+            result = poller.result()
+        except Exception as ex:
+            self._record_failure(ex)
+            raise
+        accepted = result.get("status") in ["Succeeded", "InProgress"]
+        if accepted:
+            self.consecutive_failures = 0
+            self.last_success_at = time.time()
+        else:
+            self._record_failure(result.get("error") or result.get("status"))
+        return accepted
+
+    def _record_failure(self, error):
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        if not self.healthy and self.reuse_client:
+            with self._lock:
+                self._client = None
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._session is not None:
+                self._session.close()
+            self._client = None
+            self._session = None
+            self._pid = None
+
+
+class InMemoryEmailTransport(BaseEmailTransport):
+    """Keeps sent messages in a list, for tests and benchmarks."""
+
+    def __init__(self):
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.messages.append(message)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.messages.clear()
+
+
+class FileEmailTransport(BaseEmailTransport):
+    """Appends each message as a JSON line to a local file."""
+
+    def __init__(self, path="sent_emails.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps(message) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+        return True
+
+
+@lru_cache(maxsize=None)
+def get_transport():
+    """Return the transport configured by `EMAIL_TRANSPORT` / `EMAIL_TRANSPORT_OPTIONS`."""
+    transport_class = import_string(getattr(settings, "EMAIL_TRANSPORT", DEFAULT_EMAIL_TRANSPORT))
+    return transport_class(**getattr(settings, "EMAIL_TRANSPORT_OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def reset_transport(*, setting, **kwargs):
+    if setting in ("EMAIL_TRANSPORT", "EMAIL_TRANSPORT_OPTIONS", "AZURE_EMAIL_CONNECTION_STRING"):
+        close_transport()
+
+
+def close_transport():
+    """Close the shared transport; the next `get_transport()` call builds a new one."""
+    if get_transport.cache_info().currsize:
+        get_transport().close()
+    get_transport.cache_clear()
@@ -0,0 +1,160 @@
+"""Helpers for load tests that run real server processes against a benchmark database.
+
+Use inside `bench.benchmark_database()`: `server()` starts a server whose settings point
+at that database (via `backend.loadtest_settings`), and `drive()` hammers it with
+concurrent keep-alive connections.
+"""
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+import httpx
+from django.contrib.auth import get_user_model
+from django.db import connection
+from users.serializers import CustomTokenObtainPairSerializer
+from users.utils.bench import BENCH_PASSWORD, seed_users
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+
+ROUTES = ("profile", "verify-email", "validate-reset-token", "login", "register")
+# The routes that also have an async variant under /api/async/.
+ASYNC_ROUTES = ("profile", "verify-email", "login", "register")
+
+
+class ServerError(Exception):
+    pass
+
+
+def server_env(**extra):
+    """Environment for a server process that should use the current (benchmark) database."""
+    return {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "backend.loadtest_settings",
+        "LOADTEST_BASE_SETTINGS": os.environ["DJANGO_SETTINGS_MODULE"],
+        "LOADTEST_DATABASE_NAME": connection.settings_dict["NAME"],
+        **extra,
+    }
+
+
+@contextmanager
+def server(args, port, env=None, startup_timeout=60):
+    """Runs `python -m <args>` from the project directory until the block exits.
+
+    Waits until `port` answers HTTP. The server gets its own process group, so its
+    children (e.g. the hash pool) are stopped with it.
+    """
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [sys.executable, "-m", *args], cwd=PROJECT_DIR, env=env or server_env(),
+        stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+    )
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/api/token/refresh/", timeout=1)
+                break
+            except httpx.TransportError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    log.seek(0)
+                    raise ServerError(log.read().decode(errors="replace")[-2000:])
+                time.sleep(0.2)
+        yield process
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+        log.close()
+
+
+def port_is_free(port):
+    try:
+        httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+    except httpx.TransportError:
+        return True
+    return False
+
+
+def seed_load_users(count, sample=500):
+    """Seeds `count` users; returns access tokens and emails of up to `sample` active ones."""
+    seed_users(count, prefix="load")
+    active = list(get_user_model().objects.filter(is_active=True).order_by("pk")[:sample])
+    # The seed is committed; drop this connection so it holds nothing the servers wait on.
+    connection.close()
+    return [str(CustomTokenObtainPairSerializer.get_token(user).access_token) for user in active], [user.email for user in active]
+
+
+def route_requests(route, prefix, tokens, emails):
+    """Returns a factory of (method, url, kwargs) for one request to `route` under `prefix`."""
+    if route == "profile":
+        return lambda: ("GET", f"{prefix}profile/", {"headers": {"Authorization": f"Bearer {random.choice(tokens)}"}})
+    if route == "verify-email":
+        return lambda: ("POST", f"{prefix}verify-email/", {"json": {"email": random.choice(emails), "code": "000000"}})
+    if route == "validate-reset-token":
+        # Fresh random tokens, so each one costs a lookup rather than a hit in the invalid-token cache.
+        return lambda: ("POST", f"{prefix}validate-reset-token/", {"json": {"token": str(uuid.uuid4())}})
+    if route == "login":
+        return lambda: ("POST", f"{prefix}login/", {"json": {"email": random.choice(emails), "password": BENCH_PASSWORD}})
+    if route == "register":
+        counter = iter(range(sys.maxsize))
+        run = time.time_ns()
+        return lambda: ("POST", f"{prefix}register/", {"json": {
+            "email": f"load-{run}-{next(counter)}@example.com", "password": BENCH_PASSWORD, "confirm_password": BENCH_PASSWORD,
+        }})
+    raise ValueError(f"Unknown route {route!r}")
+
+
+async def _drive(port, make_request, concurrency, duration):
+    latencies, statuses = [], Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                method, url, kwargs = make_request()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except httpx.HTTPError:
+                    statuses["error"] += 1
+                    continue
+                statuses[response.status_code] += 1
+                # Shed (503) and failed requests are reported, not counted as served.
+                if response.status_code < 500:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def drive(port, make_request, concurrency, duration, warmup=1.0):
+    """Keeps `concurrency` connections busy for `duration` seconds.
+
+    Returns (latencies of served requests, Counter of statuses, elapsed seconds). A short
+    untimed warm-up first fills connection pools and per-process caches.
+    """
+    if warmup:
+        asyncio.run(_drive(port, make_request, concurrency, min(warmup, duration)))
+    return asyncio.run(_drive(port, make_request, concurrency, duration))
+
+
+def format_statuses(statuses):
+    return ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items(), key=str))
@@ -0,0 +1,231 @@
+"""Per-process request metrics, served in the Prometheus text format.
+
+`users.middleware.MetricsMiddleware` opens a `RequestStats` for each request. While it
+is open, these are charged to it:
+
+- every SQL statement on a connection, through an execute wrapper installed when the
+  connection is created;
+- password hashing, timed in `HashExecutor.run()` / `arun()`;
+- email enqueueing and transport sends, timed in `email_service` (the outbox INSERT
+  counts as database time too).
+
+When the request finishes it is recorded per view (the URL route, so label values stay
+bounded): a latency histogram, a histogram of queries per request, responses by status
+and the seconds spent in each component. Statements slower than
+`METRICS_SLOW_QUERY_MS` (default 100) are kept, the last `METRICS_SLOW_QUERY_SAMPLES`
+(default 50) of them, for the admin slow-query endpoint.
+
+Recording is a few additions under one lock per request plus one `perf_counter()` pair
+per query, cheap enough to leave on; `manage.py bench_metrics_overhead` measures it.
+Everything lives in the worker process that recorded it, so each scrape sees one
+worker; scrape workers individually or aggregate on the Prometheus side.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.timezone import now
+from users.utils.query_budget import sql_shape
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+COMPONENT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Components timed outside the ORM.
+PASSWORD_HASH = "password_hash"
+EMAIL_QUEUE = "email_queue"
+EMAIL_SEND = "email_send"
+
+
+class Histogram:
+    """Cumulative-bucket histogram; the caller holds the registry lock."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """What one request spent, filled in while it runs."""
+
+    __slots__ = ("path", "queries", "components", "shapes")
+
+    def __init__(self, path, track_shapes=False):
+        self.path = path
+        self.queries = 0
+        self.components = Counter()
+        # Statement shape -> count, for query budgets; None when budgets are off.
+        self.shapes = Counter() if track_shapes else None
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}
+            self.queries = {}
+            self.responses = Counter()
+            self.component_seconds = Counter()
+            self.timings = {}
+            self.slow_queries = deque(maxlen=getattr(settings, "METRICS_SLOW_QUERY_SAMPLES", 50))
+            self.slow_query_seconds = getattr(settings, "METRICS_SLOW_QUERY_MS", 100) / 1000
+
+    def start_request(self, path, track_shapes=False):
+        """Opens a RequestStats for the current context; returns the token for `finish_request()`."""
+        return _current.set(RequestStats(path, track_shapes))
+
+    def finish_request(self, token, view, method, status, seconds):
+        """Records the request and returns its RequestStats."""
+        stats = _current.get()
+        _current.reset(token)
+        with self._lock:
+            key = (view, method)
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.latency[key].observe(seconds)
+            if view not in self.queries:
+                self.queries[view] = Histogram(QUERY_COUNT_BUCKETS)
+            self.queries[view].observe(stats.queries)
+            self.responses[(view, method, str(status))] += 1
+            for component, spent in stats.components.items():
+                self.component_seconds[(view, component)] += spent
+        return stats
+
+    def record_query(self, sql, seconds):
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.components["db"] += seconds
+            if stats.shapes is not None:
+                stats.shapes[sql_shape(sql)] += 1
+        if seconds >= self.slow_query_seconds:
+            with self._lock:
+                self.slow_queries.append({
+                    "sql": sql[:1000],
+                    "duration_ms": round(seconds * 1000, 2),
+                    "path": stats.path if stats else None,
+                    "at": now().isoformat(),
+                })
+
+    def observe(self, component, seconds):
+        stats = _current.get()
+        if stats is not None:
+            stats.components[component] += seconds
+        with self._lock:
+            if component not in self.timings:
+                self.timings[component] = Histogram(COMPONENT_BUCKETS)
+            self.timings[component].observe(seconds)
+
+    def slow_query_samples(self):
+        """The sampled slow statements, oldest first."""
+        with self._lock:
+            return list(self.slow_queries)
+
+    def render(self, extra_gauges=()):
+        """The registry in the Prometheus text exposition format (version 0.0.4).
+
+        `extra_gauges` is an iterable of (name, help, value) appended as gauges.
+        """
+        with self._lock:
+            lines = []
+            _histograms(lines, "users_http_request_duration_seconds", "Request latency by view and method.",
+                        (({"view": view, "method": method}, h) for (view, method), h in sorted(self.latency.items())))
+            _family(lines, "users_http_responses_total", "counter", "Responses by view, method and status.",
+                    (({"view": v, "method": m, "status": s}, n) for (v, m, s), n in sorted(self.responses.items())))
+            _histograms(lines, "users_db_queries_per_request", "SQL statements per request by view.",
+                        (({"view": view}, h) for view, h in sorted(self.queries.items())))
+            _family(lines, "users_request_component_seconds_total", "counter",
+                    "Seconds requests spent in the database, hashing and email, by view.",
+                    (({"view": v, "component": c}, s) for (v, c), s in sorted(self.component_seconds.items())))
+            _histograms(lines, "users_component_duration_seconds", "Duration of password hashing and email operations.",
+                        (({"component": c}, h) for c, h in sorted(self.timings.items())))
+            _family(lines, "users_db_slow_queries_sampled", "gauge", "Slow statements currently held as samples.",
+                    [({}, len(self.slow_queries))])
+        for name, help_text, value in extra_gauges:
+            _family(lines, name, "gauge", help_text, [({}, value)])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+
+def _histograms(lines, name, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in samples:
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def timed(component):
+    """Charges the time spent in the block to `component`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(component, time.perf_counter() - started)
+
+
+def time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(setting_changed)
+def reset_metrics(*, setting, **kwargs):
+    if setting.startswith("METRICS_"):
+        metrics.reset()
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # First in the chain, so wrappers pushed and popped by `execute_wrapper()` blocks
+    # that were open when the connection was created still pop their own.
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
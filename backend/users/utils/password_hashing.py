@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from users import hashers as policy_hashers
+from users.utils.metrics import PASSWORD_HASH, timed
+
+
+class HashingUnavailable(APIException):
+    """Raised when the hashing pool is saturated; DRF turns it into a 503."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The server is busy. Please try again in a moment."
+    default_code = "hashing_unavailable"
+
+
+# Set in pool processes so `UsersConfig.ready()` skips `autotune()`: they hash with
+# their parent's work factors instead of each timing hashes of their own.
+POOL_WORKER_ENV = "PASSWORD_HASH_POOL_WORKER"
+
+
+def _init_worker(tuned):
+    import django
+
+    os.environ[POOL_WORKER_ENV] = "1"
+    django.setup()
+    policy_hashers._tuned.update(tuned)
+
+
+def _verify(password, encoded):
+    """Runs in the pool: returns (is_correct, must_update) for a stored hash."""
+    upgrades = []
+    is_correct = hashers.check_password(password, encoded, setter=upgrades.append)
+    return is_correct, bool(upgrades)
+
+
+def default_workers():
+    """Pool size when the PASSWORD_HASH_WORKERS setting isn't set.
+
+    That comes from the environment variable of the same name, which gunicorn.conf.py sets
+    to split the CPUs between its workers, else one process per CPU.
+    """
+    if "PASSWORD_HASH_WORKERS" in os.environ:
+        return int(os.environ["PASSWORD_HASH_WORKERS"])
+    return os.cpu_count() or 1
+
+
+def _mp_context():
+    # Pool processes start from a clean interpreter rather than a fork of a threaded
+    # server process, which can inherit locks held by threads that don't exist in the child.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class HashExecutor:
+    """Bounded process pool that keeps CPU-bound password hashing off request threads.
+
+    The pool is created lazily by the process that uses it, so gunicorn workers forked
+    from a preloaded master each get their own. At most `max_pending` hashes may be
+    queued or running per process; beyond that callers get `HashingUnavailable` instead
+    of piling up behind a login storm. A hash holds its slot until it has finished, even
+    if its caller gave up waiting. `workers=0` hashes inline on the calling thread.
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=10.0):
+        self.workers = default_workers() if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _get_pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=_mp_context(),
+                        initializer=_init_worker,
+                        initargs=(dict(policy_hashers._tuned),),
+                    )
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _acquire(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HashingUnavailable()
+            self.pending += 1
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def _submit(self, func, *args):
+        """Submits to the pool; the slot is released by the future, once the hash is done or cancelled."""
+        try:
+            future = self._get_pool().submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, func, *args):
+        self._acquire()
+        with timed(PASSWORD_HASH):
+            if not self.workers:
+                try:
+                    return func(*args)
+                finally:
+                    self._release()
+            try:
+                return self._submit(func, *args).result(timeout=self.timeout)
+            except TimeoutError:
+                raise HashingUnavailable()
+
+    async def arun(self, func, *args):
+        """`run()` for async views: awaits the pool without blocking the event loop."""
+        self._acquire()
+        with timed(PASSWORD_HASH):
+            if not self.workers:
+                try:
+                    return func(*args)
+                finally:
+                    self._release()
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(self._submit(func, *args)), self.timeout)
+            except asyncio.TimeoutError:
+                raise HashingUnavailable()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pid = None
+
+
+_executor = None
+
+
+def get_executor():
+    """Return the process-wide executor configured by the PASSWORD_HASH_* settings."""
+    global _executor
+    if _executor is None:
+        _executor = HashExecutor(
+            workers=getattr(settings, "PASSWORD_HASH_WORKERS", None),
+            max_pending=getattr(settings, "PASSWORD_HASH_MAX_PENDING", None),
+            timeout=getattr(settings, "PASSWORD_HASH_TIMEOUT", 10.0),
+        )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+    _executor = None
+
+
+@receiver(setting_changed)
+def reset_executor(*, setting, **kwargs):
+    if setting.startswith("PASSWORD_HASH"):
+        shutdown_executor()
+
+
+def check_password(user, raw_password):
+    """Pool-backed `user.check_password()`, upgrading the stored hash when the policy asks."""
+    if raw_password is None or not user.has_usable_password():
+        return False
+    is_correct, must_update = get_executor().run(_verify, raw_password, user.password)
+    if is_correct and must_update:
+        set_password(user, raw_password)
+        user.save(update_fields=["password"])
+    return is_correct
+
+
+def set_password(user, raw_password):
+    """Pool-backed `user.set_password()`; the caller saves the user."""
+    user.password = get_executor().run(hashers.make_password, raw_password)
+    user._password = raw_password
+
+
+async def acheck_password(user, raw_password):
+    """Async `check_password()`; the upgraded hash is saved with the async ORM."""
+    if raw_password is None or not user.has_usable_password():
+        return False
+    is_correct, must_update = await get_executor().arun(_verify, raw_password, user.password)
+    if is_correct and must_update:
+        await aset_password(user, raw_password)
+        await user.asave(update_fields=["password"])
+    return is_correct
+
+
+async def aset_password(user, raw_password):
+    """Async `set_password()`; the caller saves the user."""
+    user.password = await get_executor().arun(hashers.make_password, raw_password)
+    user._password = raw_password
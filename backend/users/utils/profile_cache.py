@@ -0,0 +1,211 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+# Shared by every worker, like the throttle cooldowns in the same cache, so an
+# invalidation is seen everywhere at once.
+DEFAULT_PROFILE_CACHE_BACKEND = "users.utils.profile_cache.DjangoProfileCacheBackend"
+
+# Marks "no argument" so an explicit timeout=None can mean "never expires", as in Django's cache API.
+_DEFAULT_TIMEOUT = object()
+
+
+class LocalProfileCacheBackend:
+    """Per-process LRU with a TTL, exposing the subset of Django's cache API ProfileCache uses.
+
+    Each worker keeps its own copy, so an invalidation only reaches the worker that made
+    it; other workers serve their entry until the TTL runs out. The TTL is kept to a few
+    seconds for that reason; only use this backend with a single worker or where a
+    profile that briefly lags behind a change is acceptable.
+    """
+
+    def __init__(self, max_entries=10_000, timeout=5):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key, value, timeout):
+        if timeout is _DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        self._entries[key] = (None if timeout is None else time.monotonic() + timeout, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key, value, timeout=_DEFAULT_TIMEOUT):
+        with self._lock:
+            self._store(key, value, timeout)
+
+    def add(self, key, value, timeout=_DEFAULT_TIMEOUT):
+        with self._lock:
+            if key in self._entries and (self._entries[key][0] is None or self._entries[key][0] >= time.monotonic()):
+                return False
+            self._store(key, value, timeout)
+            return True
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            if key not in self._entries:
+                raise ValueError(f"Key '{key}' not found")
+            expires, value = self._entries[key]
+            self._entries[key] = (expires, value + delta)
+            return value + delta
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoProfileCacheBackend:
+    """Shared backend on one of the `CACHES` aliases (Redis, Memcached, or LocMem as a stand-in)."""
+
+    def __init__(self, alias="default", timeout=300):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key, value, timeout=_DEFAULT_TIMEOUT):
+        self.cache.set(key, value, self.timeout if timeout is _DEFAULT_TIMEOUT else timeout)
+
+    def add(self, key, value, timeout=_DEFAULT_TIMEOUT):
+        return self.cache.add(key, value, self.timeout if timeout is _DEFAULT_TIMEOUT else timeout)
+
+    def incr(self, key, delta=1):
+        return self.cache.incr(key, delta)
+
+    def delete(self, key):
+        return self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def profile_etag(data):
+    """Strong ETag derived from the serialized profile, so it is stable across workers."""
+    digest = hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+class ProfileCache:
+    """Serialized profiles keyed by user id and a per-user version counter.
+
+    `invalidate()` bumps the version instead of deleting the entry, so a reader that
+    serialized the old row concurrently can only write under the old, unreachable key.
+    A missing version (never set, evicted or expired) starts from a fresh timestamp,
+    which can never match an entry written before it was lost.
+    """
+
+    def __init__(self, backend, metrics_hook=None):
+        self.backend = backend
+        self.metrics_hook = metrics_hook
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version_key(user_id):
+        return f"profile:{user_id}:version"
+
+    def _version(self, user_id):
+        key = self._version_key(user_id)
+        version = self.backend.get(key)
+        if version is None:
+            version = time.time_ns()
+            if not self.backend.add(key, version, timeout=None):
+                version = self.backend.get(key, version)
+        return version
+
+    def get(self, user, serialize):
+        """Returns (data, etag) for the user's profile, calling `serialize(user)` on a miss."""
+        key, entry = self.lookup(user.pk)
+        if entry is None:
+            entry = self.store(key, serialize(user))
+        return entry
+
+    def lookup(self, user_id):
+        """Returns (key, entry); on a miss entry is None and the data goes to `store(key, ...)`.
+
+        For callers, like async views, that must produce the data themselves.
+        """
+        key = f"profile:{user_id}:{self._version(user_id)}"
+        entry = self.backend.get(key)
+        self._record(entry is not None)
+        return key, entry
+
+    def store(self, key, data):
+        data = dict(data)
+        entry = (data, profile_etag(data))
+        self.backend.set(key, entry)
+        return entry
+
+    def invalidate(self, user_id):
+        try:
+            self.backend.incr(self._version_key(user_id))
+        except ValueError:
+            # No version means nothing is reachable for this user yet.
+            pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+    def _record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if self.metrics_hook:
+            self.metrics_hook("hit" if hit else "miss", self.stats())
+
+
+@lru_cache(maxsize=None)
+def get_profile_cache():
+    """Return the cache configured by `PROFILE_CACHE_BACKEND` / `PROFILE_CACHE_OPTIONS`.
+
+    `PROFILE_CACHE_METRICS_HOOK` may name a callable taking `(event, stats)`; it is called
+    on every lookup with "hit" or "miss" and the running hit/miss counts and hit ratio.
+    """
+    backend_class = import_string(getattr(settings, "PROFILE_CACHE_BACKEND", DEFAULT_PROFILE_CACHE_BACKEND))
+    hook = getattr(settings, "PROFILE_CACHE_METRICS_HOOK", None)
+    return ProfileCache(
+        backend_class(**getattr(settings, "PROFILE_CACHE_OPTIONS", {})),
+        metrics_hook=import_string(hook) if isinstance(hook, str) else hook,
+    )
+
+
+@receiver(setting_changed)
+def reset_profile_cache(*, setting, **kwargs):
+    if setting.startswith("PROFILE_CACHE"):
+        get_profile_cache.cache_clear()
+
+
+def invalidate_profile(user_id):
+    get_profile_cache().invalidate(user_id)
@@ -0,0 +1,268 @@
+"""On-demand sampling profiler for live requests, driven by `users.middleware.ProfilingMiddleware`.
+
+An admin starts a session for one named route of `users/urls.py` with a sample rate and
+a duration. The session lives in the cache named by `PROFILER_CACHE_ALIAS` (default
+"default"), so every worker sharing that cache picks it up within
+`PROFILER_POLL_SECONDS` (default 1) without a restart, and it ends by itself when the
+duration runs out or when an admin stops it.
+
+While a session is on, each worker samples that fraction of the route's requests. A
+background thread reads the stacks of the threads serving sampled requests every
+`PROFILER_INTERVAL_MS` (default 10) and counts them. Workers write their counts to
+`PROFILER_DIR` (default `<tmp>/users-profiles`) as `<session>-<pid>.folded`, and
+`merged_flamegraph()` sums those files into one file in the folded format that
+flamegraph.pl, speedscope and inferno read. Workers on several hosts need a shared
+`PROFILER_DIR` to be merged.
+
+With `tracemalloc` set, workers also trace allocations for the session. They dump a
+snapshot, at most every `PROFILER_SNAPSHOT_SECONDS` (default 30) and at the end, as
+`<session>-<pid>.tracemalloc`; `top_allocations()` combines them. Tracing allocations
+slows the whole worker noticeably, so keep such sessions short.
+
+Async views share the event loop thread, so their samples may include stacks of other
+requests served at the same moment.
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import resolve, Resolver404
+
+CACHE_KEY = "users:profiler:session"
+MAX_DURATION = 3600
+SESSION_ID = re.compile(r"^[0-9a-f]{12}$")
+
+
+def _cache():
+    return caches[getattr(settings, "PROFILER_CACHE_ALIAS", "default")]
+
+
+def profile_dir():
+    path = Path(getattr(settings, "PROFILER_DIR", None) or Path(tempfile.gettempdir()) / "users-profiles")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def route_names():
+    from users.urls import urlpatterns
+
+    return {pattern.name for pattern in urlpatterns if pattern.name}
+
+
+def start_session(route, rate=0.1, duration=300, trace_allocations=False):
+    """Stores a new session for the workers to pick up and returns it."""
+    session = {
+        "id": uuid.uuid4().hex[:12],
+        "route": route,
+        "rate": rate,
+        "tracemalloc": trace_allocations,
+        "started_at": time.time(),
+        "until": time.time() + duration,
+    }
+    _cache().set(CACHE_KEY, session, timeout=duration)
+    return session
+
+
+def stop_session():
+    _cache().delete(CACHE_KEY)
+
+
+_polled = {"at": float("-inf"), "session": None}
+
+
+def current_session():
+    """The active session, re-read from the cache at most every PROFILER_POLL_SECONDS."""
+    if time.monotonic() - _polled["at"] >= getattr(settings, "PROFILER_POLL_SECONDS", 1):
+        session = _cache().get(CACHE_KEY)
+        _polled["session"] = session if session and session["until"] > time.time() else None
+        _polled["at"] = time.monotonic()
+    return _polled["session"]
+
+
+@lru_cache(maxsize=4096)
+def _frame_label(name, filename, line):
+    for prefix in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f"{name} ({filename}:{line})"
+
+
+def fold(frame):
+    """The stack ending at `frame`, outermost first, as one line of a folded profile."""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(_frame_label(code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads of this process for one session.
+
+    The sampling thread starts with the first sampled request and exits once the
+    session has ended, after writing its final counts.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.interval = getattr(settings, "PROFILER_INTERVAL_MS", 10) / 1000
+        self.counts = Counter()
+        self._threads = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_snapshot = time.monotonic()
+
+    def path(self, suffix):
+        return profile_dir() / f"{self.session['id']}-{os.getpid()}.{suffix}"
+
+    def add(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] += 1
+            if self._thread is None:
+                if self.session["tracemalloc"] and not tracemalloc.is_tracing():
+                    tracemalloc.start(getattr(settings, "PROFILER_TRACEMALLOC_FRAMES", 10))
+                self._thread = threading.Thread(target=self._run, name="users-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+
+    def _run(self):
+        flush_every = getattr(settings, "PROFILER_FLUSH_SECONDS", 2)
+        flushed = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.counts[fold(frame)] += 1
+            del frames
+
+            active = current_session()
+            ended = not active or active["id"] != self.session["id"]
+            if ended or time.monotonic() - flushed >= flush_every:
+                self.flush(final=ended)
+                flushed = time.monotonic()
+            if ended:
+                return
+
+    def flush(self, final=False):
+        """Rewrites this worker's folded file with the counts so far; runs on the sampling thread."""
+        lines = [f"{stack} {count}\n" for stack, count in self.counts.items()]
+        path = self.path("folded")
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text("".join(lines), encoding="utf-8")
+        os.replace(temporary, path)
+        if self.session["tracemalloc"] and tracemalloc.is_tracing():
+            every = getattr(settings, "PROFILER_SNAPSHOT_SECONDS", 30)
+            if final or time.monotonic() - self._last_snapshot >= every:
+                tracemalloc.take_snapshot().dump(str(self.path("tracemalloc")))
+                self._last_snapshot = time.monotonic()
+            if final:
+                tracemalloc.stop()
+
+
+_sampler = {"pid": None, "sampler": None}
+_sampler_lock = threading.Lock()
+
+
+def get_sampler(session):
+    """This process's sampler for `session`, replacing one left from an earlier session or a parent process."""
+    with _sampler_lock:
+        current = _sampler["sampler"]
+        if current is None or _sampler["pid"] != os.getpid() or current.session["id"] != session["id"]:
+            current = _sampler["sampler"] = StackSampler(session)
+            _sampler["pid"] = os.getpid()
+        return current
+
+
+class Sample:
+    """Registers the calling thread with the sampler for the duration of the block."""
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.sampler.add(self.thread_id)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sampler.remove(self.thread_id)
+
+
+def sample(request):
+    """A Sample if `request` should be profiled, else None."""
+    session = current_session()
+    if session is None or random.random() >= session["rate"]:
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if match.url_name != session["route"]:
+        return None
+    return Sample(get_sampler(session))
+
+
+def captured_files(session_id, suffix):
+    if not SESSION_ID.match(session_id):
+        return []
+    return sorted(profile_dir().glob(f"{session_id}-*.{suffix}"))
+
+
+def merged_flamegraph(session_id):
+    """The folded stacks of every worker for `session_id`, summed."""
+    counts = Counter()
+    for path in captured_files(session_id, "folded"):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack:
+                counts[stack] += int(count)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def top_allocations(session_id, limit=25):
+    """The source lines holding the most memory in the latest snapshot of each worker."""
+    sizes, blocks = Counter(), Counter()
+    for path in captured_files(session_id, "tracemalloc"):
+        for stat in tracemalloc.Snapshot.load(str(path)).statistics("lineno"):
+            frame = stat.traceback[0]
+            key = f"{frame.filename}:{frame.lineno}"
+            sizes[key] += stat.size
+            blocks[key] += stat.count
+    return [{"line": key, "size_kb": round(size / 1024, 1), "blocks": blocks[key]} for key, size in sizes.most_common(limit)]
+
+
+def delete_captures(session_id):
+    """Removes what the workers wrote for `session_id`; returns how many files went."""
+    paths = captured_files(session_id, "folded") + captured_files(session_id, "tracemalloc")
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return len(paths)
+
+
+def sessions_on_disk():
+    """Session id -> number of worker files, for sessions with captured data."""
+    found = Counter()
+    for path in profile_dir().glob("*-*.folded"):
+        found[path.name.split("-", 1)[0]] += 1
+    return dict(found)
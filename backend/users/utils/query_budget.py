@@ -0,0 +1,79 @@
+"""Per-view SQL budgets, checked by `users.middleware.MetricsMiddleware`.
+
+A view declares the most statements one request may run, as a class attribute or with
+the decorator (which also works on function views)::
+
+    class UserProfileView(APIView):
+        query_budget = 2
+
+    @query_budget(4, max_repeats=1)
+    class ResetPasswordView(APIView): ...
+
+Statements are compared by shape: the SQL with its placeholders, with numbers and IN
+lists of any length collapsed. The same lookup run once per row, an N+1, shows up as one
+shape repeated, and any shape run more than `query_repeat_budget` times (default
+`QUERY_BUDGET_MAX_REPEATS`, 2) is an overrun even for views without a budget.
+Transaction control statements (BEGIN, savepoints...) count toward neither limit.
+
+`QUERY_BUDGET_MODE` chooses what an overrun does: "off" (the default; shapes are not
+collected at all), "log" a warning on this module's logger, or "raise"
+`QueryBudgetExceeded`, which the test suite uses.
+"""
+import logging
+import re
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\(%s(?:, %s)*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE SAVEPOINT")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries, max_repeats=None):
+    """Sets the budget of a view class or function."""
+    def decorate(view):
+        view.query_budget = max_queries
+        if max_repeats is not None:
+            view.query_repeat_budget = max_repeats
+        return view
+    return decorate
+
+
+def budget_mode():
+    return getattr(settings, "QUERY_BUDGET_MODE", "off")
+
+
+def sql_shape(sql):
+    return _NUMBER.sub("N", _IN_LIST.sub("(...)", sql))
+
+
+def overruns(view, shapes):
+    """Descriptions of how the statements in `shapes` (shape -> count) break the budget of `view`."""
+    view = getattr(view, "view_class", view)
+    budget = getattr(view, "query_budget", None)
+    max_repeats = getattr(view, "query_repeat_budget", getattr(settings, "QUERY_BUDGET_MAX_REPEATS", 2))
+    counted = {shape: count for shape, count in shapes.items() if not shape.startswith(TRANSACTION_STATEMENTS)}
+
+    problems = []
+    total = sum(counted.values())
+    if budget is not None and total > budget:
+        problems.append(f"{total} queries, budget {budget}")
+    problems.extend(
+        f"possible N+1: {count}x {shape[:200]}" for shape, count in counted.items() if count > max_repeats
+    )
+    return problems
+
+
+def check_query_budget(route, view, shapes):
+    problems = overruns(view, shapes)
+    if not problems:
+        return
+    message = f"Query budget exceeded by {route}: " + "; ".join(problems)
+    if budget_mode() == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
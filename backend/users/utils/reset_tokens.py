@@ -0,0 +1,125 @@
+import hashlib
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from users.models import PASSWORD_RESET_TOKEN_LIFETIME, UsedPasswordResetToken
+
+
+def parse_reset_token(value):
+    """Returns the token as a UUID, or None if it cannot possibly be a reset token."""
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over bytes keys.
+
+    Sized for `capacity` keys at the given false-positive rate; uses double hashing of a
+    single BLAKE2b digest to derive the bit positions.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ResetTokenFilter:
+    """Per-process answers to "is this reset token worth a query?".
+
+    - A Bloom filter of used tokens, loaded from `UsedPasswordResetToken.live()` on first
+      use and rebuilt once per token lifetime (Bloom filters cannot forget). A miss means
+      the token was certainly not used through this process's view of the table, so the
+      blacklist query is skipped; a hit is confirmed against the database.
+    - An LRU of tokens recently found to match no user. Reset tokens are random UUIDs
+      that are never reissued, so once unknown they stay unknown.
+
+    Tokens used through another worker after this one loaded its filter are not in it;
+    for those the user lookup still fails because the reset cleared the user's token.
+    """
+
+    def __init__(self, capacity=None, error_rate=None, invalid_cache_size=None):
+        self.capacity = capacity or getattr(settings, "RESET_TOKEN_FILTER_CAPACITY", 100_000)
+        self.error_rate = error_rate or getattr(settings, "RESET_TOKEN_FILTER_ERROR_RATE", 0.01)
+        self.invalid_cache_size = invalid_cache_size or getattr(settings, "RESET_TOKEN_INVALID_CACHE_SIZE", 10_000)
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._loaded_at = 0.0
+        self._invalid = OrderedDict()
+
+    def _stale(self):
+        return time.monotonic() - self._loaded_at > PASSWORD_RESET_TOKEN_LIFETIME.total_seconds()
+
+    def _used_tokens(self):
+        # `_bloom` is read once into a local: mark_used() and reset() may drop it at any time.
+        bloom = self._bloom
+        if bloom is None or self._stale():
+            with self._lock:
+                bloom = self._bloom
+                if bloom is None or self._stale():
+                    bloom = self._load()
+        return bloom
+
+    def _load(self):
+        tokens = UsedPasswordResetToken.objects.live().values_list("token", flat=True)
+        bloom = BloomFilter(max(self.capacity, tokens.count() * 2), self.error_rate)
+        for token in tokens.iterator(chunk_size=5000):
+            bloom.add(token.bytes)
+        self._bloom = bloom
+        self._loaded_at = time.monotonic()
+        return bloom
+
+    def might_be_used(self, token):
+        return token.bytes in self._used_tokens()
+
+    def mark_used(self, token):
+        bloom = self._used_tokens()
+        with self._lock:
+            bloom.add(token.bytes)
+            if bloom.count > bloom.capacity and self._bloom is bloom:
+                # Over capacity the false-positive rate climbs; rebuild bigger on next use.
+                self.capacity *= 2
+                self._bloom = None
+
+    def is_known_invalid(self, token):
+        with self._lock:
+            if token in self._invalid:
+                self._invalid.move_to_end(token)
+                return True
+        return False
+
+    def remember_invalid(self, token):
+        with self._lock:
+            self._invalid[token] = None
+            self._invalid.move_to_end(token)
+            while len(self._invalid) > self.invalid_cache_size:
+                self._invalid.popitem(last=False)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._invalid.clear()
+
+
+reset_token_filter = ResetTokenFilter()
@@ -0,0 +1,163 @@
+"""Revoking every outstanding JWT of a user by bumping `CustomUser.token_version`.
+
+Tokens carry the version they were issued at. Each process mirrors the current version
+of every user whose tokens were revoked within the refresh token lifetime in a dict, so
+checking a token is one dict lookup and no query; older revocations are dropped, since
+every token they could reject has expired. The mirror is loaded on first use and then
+kept up to date by a daemon thread that only reads rows whose `token_version_changed_at`
+moved since its previous pass. Revocations made by this process are applied to its own mirror
+immediately; other workers see them within `TOKEN_REVOCATION_SYNC_INTERVAL` seconds.
+
+A deleted user has no row left to bump, so deletions leave a `DeletedUser` tombstone
+that the mirror reads the same way and treats as a version no token can reach.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+from django.utils.timezone import now
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from users.models import DeletedUser
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_SYNC_INTERVAL = getattr(settings, "TOKEN_REVOCATION_SYNC_INTERVAL", 5)
+# A revocation committed late can carry a timestamp older than the previous pass, so
+# each pass re-reads this much history; merging takes the max, so re-reads are harmless.
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=getattr(settings, "TOKEN_REVOCATION_SYNC_OVERLAP", 60))
+# Mirrored version of a deleted user; every token is older.
+DELETED_VERSION = float("inf")
+
+
+class TokenVersionMirror:
+    """Per-process `user_id -> token_version` for users whose tokens were revoked."""
+
+    def __init__(self, interval=REVOCATION_SYNC_INTERVAL):
+        self.interval = interval
+        self.versions = {}
+        self.changed_at = {}
+        self.synced_at = None
+        self._lock = threading.RLock()
+        self._pid = None
+        self._thread_pid = None
+
+    def _ensure_loaded(self):
+        # Checked per PID so workers forked from a preloaded master load their own copy.
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.versions = {}
+                    self.changed_at = {}
+                    self.synced_at = None
+                    self.sync()
+                    if self.interval and self._thread_pid != os.getpid():
+                        threading.Thread(target=self._run, name="token-revocation-sync", daemon=True).start()
+                        self._thread_pid = os.getpid()
+                    self._pid = os.getpid()
+
+    @property
+    def loaded(self):
+        return self._pid == os.getpid()
+
+    def sync(self):
+        """Merges versions changed since the previous pass (all live revocations on the first).
+
+        Then drops entries older than the refresh token lifetime.
+        """
+        started = now()
+        cutoff = started - jwt_settings.REFRESH_TOKEN_LIFETIME
+        users = get_user_model().objects.filter(token_version_changed_at__gte=cutoff)
+        deleted = DeletedUser.objects.live()
+        if self.synced_at is not None:
+            users = users.filter(token_version_changed_at__gte=self.synced_at - REVOCATION_SYNC_OVERLAP)
+            deleted = deleted.filter(deleted_at__gte=self.synced_at - REVOCATION_SYNC_OVERLAP)
+        for user_id, version, changed_at in users.values_list("id", "token_version", "token_version_changed_at").iterator():
+            self.note(user_id, version, changed_at)
+        for user_id, deleted_at in deleted.values_list("user_id", "deleted_at").iterator():
+            self.note(user_id, DELETED_VERSION, deleted_at)
+        self.prune(cutoff)
+        self.synced_at = started
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Token revocation sync failed")
+            finally:
+                # Don't hold a connection through the sleep.
+                connection.close()
+
+    def note(self, user_id, version, changed_at=None):
+        changed_at = changed_at or now()
+        with self._lock:
+            if version >= self.versions.get(user_id, 1):
+                self.versions[user_id] = version
+                self.changed_at[user_id] = max(changed_at, self.changed_at.get(user_id, changed_at))
+
+    def prune(self, cutoff):
+        """Drops revocations made before `cutoff`; tokens they rejected have expired."""
+        with self._lock:
+            for user_id in [user_id for user_id, changed_at in self.changed_at.items() if changed_at < cutoff]:
+                del self.versions[user_id]
+                del self.changed_at[user_id]
+
+    def is_revoked(self, user_id, version):
+        self._ensure_loaded()
+        return version < self.versions.get(user_id, 0)
+
+    def reset(self):
+        with self._lock:
+            self.versions = {}
+            self.changed_at = {}
+            self.synced_at = None
+            self._pid = None
+
+
+token_versions = TokenVersionMirror()
+
+
+def revocation_changes():
+    """Column updates that revoke a user's tokens, for use in a queryset `update()`."""
+    return {"token_version": F("token_version") + 1, "token_version_changed_at": now()}
+
+
+def revoke_tokens(*user_ids):
+    """Invalidates every token issued to the given users; returns their new versions."""
+    users = get_user_model().objects.filter(pk__in=user_ids)
+    users.update(**revocation_changes())
+    versions = dict(users.values_list("id", "token_version"))
+    for user_id, version in versions.items():
+        token_versions.note(user_id, version)
+    return versions
+
+
+def revoke_deleted_users(*user_ids):
+    """Tombstones existing users about to be deleted, so every worker rejects their tokens.
+
+    Call it in the transaction that deletes them. Also drops tombstones that have
+    outlived every token.
+    """
+    DeletedUser.objects.bulk_create([DeletedUser(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+    DeletedUser.objects.expired().delete()
+    for user_id in user_ids:
+        token_versions.note(user_id, DELETED_VERSION)
+
+
+def refresh_revocations():
+    """Pulls revocations made by bulk updates into this process's mirror right away."""
+    if token_versions.loaded:
+        token_versions.sync()
+
+
+def is_token_revoked(token):
+    """True if `token` was issued before its user's tokens were last revoked."""
+    # simplejwt stores the user id claim as a string.
+    user_id = get_user_model()._meta.pk.to_python(token[jwt_settings.USER_ID_CLAIM])
+    return token_versions.is_revoked(user_id, token.get("token_version", 0))
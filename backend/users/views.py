@@ -2,26 +2,51 @@ from users.serializers import CustomTokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework.throttling import ScopedRateThrottle
-from rest_framework import status
+from .password_policy import validate_password
+from .throttling import SharedScopedRateThrottle
+from rest_framework import serializers, status
 from .models import CustomUser, UsedPasswordResetToken
 from .serializers import UserProfileSerializer
+from .authentication import StatelessJWTAuthentication, invalidate_user
 from django.contrib.auth import get_user_model
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from users.utils.email_service import send_verification_email, send_password_reset_email, generate_verification_code
+from users.utils import password_hashing
+from users.utils.profile_cache import get_profile_cache, invalidate_profile
+from users.utils.db_pool import pool_stats
+from users.utils import profiler
+from users.utils.metrics import metrics
+from users.utils.reset_tokens import parse_reset_token, reset_token_filter
+from users.utils.revocation import refresh_revocations, revoke_deleted_users, revoke_tokens
+from users.utils.admin_users import (
+    ADMIN_BULK_ACTIONS,
+    ADMIN_USER_FILTERS,
+    ADMIN_USER_MAX_PAGE_SIZE,
+    ADMIN_USER_PAGE_SIZE,
+    bulk_apply,
+    filter_users,
+    paginate_users,
+    parse_export_fields,
+    stream_users,
+)
 from django.utils.timezone import now, timedelta
 from datetime import timedelta
 import random
 import uuid
-import re
 
 User = get_user_model()
 
 ### User Registration with Email Verification
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    query_budget = 3
 
     def post(self, request):
         email = request.data.get("email")
@@ -39,24 +64,14 @@ class RegisterView(APIView):
         except ValidationError:
             return Response({"error": "Invalid email format."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if len(password) < 8:
-            return Response({"error": "Password must be at least 8 characters long."}, status=status.HTTP_400_BAD_REQUEST)
-        if not re.search(r"[A-Z]", password) or not re.search(r"[a-z]", password):
-            return Response({"error": "Password must contain at least one uppercase and one lowercase letter."}, status=status.HTTP_400_BAD_REQUEST)
-        if not re.search(r"\d", password):
-            return Response({"error": "Password must contain at least one number."}, status=status.HTTP_400_BAD_REQUEST)
-        if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-            return Response({"error": "Password must contain at least one special character."}, status=status.HTTP_400_BAD_REQUEST)
-        if email.split("@")[0].lower() in password.lower():
-            return Response({"error": "Password is too similar to the email."}, status=status.HTTP_400_BAD_REQUEST)
+        violations = validate_password(password, email)
+        if violations:
+            return Response({"error": violations[0], "errors": violations}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = User.objects.filter(email=email).first()
-
-        EMAIL_VERIFICATION_COOLDOWN = timedelta(seconds=60)
+        user = User.objects.filter_email(email).first()
 
         if user and not user.is_active:
-            last_sent = user.verification_code_sent_at
-            if last_sent and now() - last_sent < EMAIL_VERIFICATION_COOLDOWN:
+            if not user.claim_verification_code_request():
                 return Response(
                     {"error": "User already exists but is not verified. Please wait before requesting another verification code."},
                     status=status.HTTP_400_BAD_REQUEST
@@ -64,11 +79,8 @@ class RegisterView(APIView):
 
             # If cooldown has passed, generate and send a new code
             verification_code = generate_verification_code()
-            user.verification_code = verification_code
-            user.verification_code_sent_at = now()
-            user.save()
-
-            send_verification_email(email, verification_code)
+            if User.objects.set_verification_code(user.pk, verification_code):
+                send_verification_email(email, verification_code)
 
             return Response(
                 {"error": "User already exists but is not verified. A new verification code has been sent to your email."},
@@ -79,11 +91,15 @@ class RegisterView(APIView):
             return Response({"error": "Email is already registered."}, status=status.HTTP_400_BAD_REQUEST)
 
         verification_code = generate_verification_code()
-        user = User.objects.create_user(email=email, password=password)
-        user.is_active = False
-        user.verification_code = verification_code
-        user.verification_code_sent_at = now()
+        user = User(
+            email=User.objects.normalize_email(email),
+            is_active=False,
+            verification_code=verification_code,
+            verification_code_sent_at=now(),
+        )
+        password_hashing.set_password(user, password)
         user.save()
+        user.claim_verification_code_request()
 
         send_verification_email(email, verification_code)
 
@@ -92,45 +108,45 @@ class RegisterView(APIView):
 ### Verify Email
 class VerifyEmailView(APIView):
     permission_classes = [AllowAny]
+    query_budget = 2
 
     def post(self, request):
         email = request.data.get("email")
         verification_code = request.data.get("code")
 
-        try:
-            user = User.objects.get(email=email)
-            if user.verification_code == verification_code:
-                user.is_active = True
-                user.verification_code = None
-                user.save()
-                return Response({"message": "Email verified successfully."}, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Invalid verification code."}, status=status.HTTP_400_BAD_REQUEST)
-        except User.DoesNotExist:
+        if User.objects.verify_email(email, verification_code):
+            return Response({"message": "Email verified successfully."}, status=status.HTTP_200_OK)
+
+        # Only failures pay for a second query, to tell the caller why.
+        user = User.objects.filter_email(email).values("verification_code").first()
+        if user is None:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        if not verification_code or user["verification_code"] != verification_code:
+            return Response({"error": "Invalid verification code."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"error": "Verification code has expired."}, status=status.HTTP_400_BAD_REQUEST)
 
 ### Resend Verification Code
 class ResendVerificationEmailView(APIView):
     permission_classes = [AllowAny]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [SharedScopedRateThrottle]
     throttle_scope = 'resend_verification'
+    query_budget = 3
 
     def post(self, request):
         email = request.data.get("email")
 
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.filter_email(email).only("is_active").get()
             if user.is_active:
                 return Response({"message": "Email is already verified."}, status=status.HTTP_400_BAD_REQUEST)
 
-            if not user.can_request_verification_code():
+            if not user.claim_verification_code_request():
                 return Response({"error": "Please wait before requesting another verification code."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
 
-            # Generate and send the new code
+            # Generate and send the new code, unless the account was verified in the meantime
             verification_code = generate_verification_code()
-            user.verification_code = verification_code
-            user.verification_code_sent_at = now()
-            user.save()
+            if not User.objects.set_verification_code(user.pk, verification_code):
+                return Response({"message": "Email is already verified."}, status=status.HTTP_400_BAD_REQUEST)
 
             send_verification_email(email, verification_code)
 
@@ -142,25 +158,26 @@ class ResendVerificationEmailView(APIView):
 ### Forgot Password Request
 class ForgotPasswordView(APIView):
     permission_classes = [AllowAny]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [SharedScopedRateThrottle]
     throttle_scope = 'forgot_password'
+    query_budget = 3
 
     def post(self, request):
         email = request.data.get("email")
         try:
-            user = User.objects.get(email=email)
-            if not user.can_request_password_reset():
+            user = User.objects.filter_email(email).only("pk").get()
+            if not user.claim_password_reset_request():
                 return Response(
                     {"error": "Please wait before requesting another password reset."},
                     status=status.HTTP_429_TOO_MANY_REQUESTS
                 )
 
             # Invalidate the old reset token by generating a new one
-            user.password_reset_token = uuid.uuid4()  
-            user.password_reset_requested_at = now()
-            user.save()
+            token = uuid.uuid4()
+            if not User.objects.set_password_reset_token(user.pk, token):
+                raise User.DoesNotExist  # Deleted in the meantime.
 
-            send_password_reset_email(email, str(user.password_reset_token)) 
+            send_password_reset_email(email, str(token))
 
             return Response({"message": "If this email exists, a reset link has been sent."}, status=status.HTTP_200_OK)
         except User.DoesNotExist:
@@ -169,6 +186,7 @@ class ForgotPasswordView(APIView):
 ### Reset Password
 class ResetPasswordView(APIView):
     permission_classes = [AllowAny]
+    query_budget = 7
 
     def post(self, request):
         token = request.data.get("token")
@@ -187,9 +205,17 @@ class ResetPasswordView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        token = parse_reset_token(token)
         try:
-            # Check if token has already been used (blacklist check)
-            if UsedPasswordResetToken.objects.filter(token=token).exists():
+            if token is None or reset_token_filter.is_known_invalid(token):
+                raise User.DoesNotExist
+
+            # Check if token has already been used (blacklist check); the filter only
+            # lets through tokens that might be on the list.
+            if (
+                reset_token_filter.might_be_used(token)
+                and UsedPasswordResetToken.objects.live().filter(token=token).exists()
+            ):
                 return Response(
                     {"error": "This reset link has already been used."},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -203,19 +229,29 @@ class ResetPasswordView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
+            violations = validate_password(new_password, user.email)
+            if violations:
+                return Response({"error": violations[0], "errors": violations}, status=status.HTTP_400_BAD_REQUEST)
+
             # Check if the new password is the same as the current one
-            if user.check_password(new_password):
+            if password_hashing.check_password(user, new_password):
                 return Response(
                     {"error": "Your new password cannot be the same as your old password."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             # Set new password and mark token as used
-            user.set_password(new_password)
+            password_hashing.set_password(user, new_password)
+            if not User.objects.reset_password(user.pk, token, user.password):
+                return Response(
+                    {"error": "This reset link has already been used."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             UsedPasswordResetToken.objects.create(token=token)
-            user.password_reset_token = None
-            user.password_reset_requested_at = None
-            user.save()
+            reset_token_filter.mark_used(token)
+            invalidate_user(user.id)
+            # Sign out every session that may belong to whoever lost the old password.
+            revoke_tokens(user.id)
 
             return Response(
                 {"message": "Password reset successfully. You can now log in."},
@@ -223,6 +259,8 @@ class ResetPasswordView(APIView):
             )
 
         except User.DoesNotExist:
+            if token is not None:
+                reset_token_filter.remember_invalid(token)
             return Response(
                 {"error": "Invalid or expired reset token."},
                 status=status.HTTP_404_NOT_FOUND,
@@ -231,11 +269,15 @@ class ResetPasswordView(APIView):
 ### Validate Password Reset Token Before Showing Form
 class ValidateResetTokenView(APIView):
     permission_classes = [AllowAny]
+    query_budget = 3
 
     def post(self, request):
-        token = request.data.get("token")
+        token = parse_reset_token(request.data.get("token"))
 
         try:
+            if token is None or reset_token_filter.is_known_invalid(token):
+                raise User.DoesNotExist
+
             user = User.objects.get(password_reset_token=token)
 
             if not user.is_reset_token_valid():
@@ -244,44 +286,45 @@ class ValidateResetTokenView(APIView):
             return Response({"message": "Token is valid."}, status=status.HTTP_200_OK)
 
         except User.DoesNotExist:
+            if token is not None:
+                reset_token_filter.remember_invalid(token)
             return Response({"error": "Invalid or expired reset token."}, status=status.HTTP_404_NOT_FOUND)
 
 ### User Login
 class CustomTokenObtainPairView(TokenObtainPairView):
+    serializer_class = CustomTokenObtainPairSerializer
+    query_budget = 2
+
     def post(self, request, *args, **kwargs):
         email = request.data.get("email")
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        # The only user lookup of the login; the serializer reuses this instance.
+        user = self.user = User.objects.filter_email(email).first()
+        if user is None:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Check if the user is not active
         if not user.is_active:
-            EMAIL_VERIFICATION_COOLDOWN = timedelta(seconds=60)
-            last_sent = user.verification_code_sent_at
-
-            if last_sent and now() - last_sent < EMAIL_VERIFICATION_COOLDOWN:
+            if not user.claim_verification_code_request():
                 return Response(
                     {"error": "Email not verified. Please check your email."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
             verification_code = generate_verification_code()
-            user.verification_code = verification_code
-            user.verification_code_sent_at = now()
-            user.save()
-
-            send_verification_email(email, verification_code)
+            if User.objects.set_verification_code(user.pk, verification_code):
+                send_verification_email(email, verification_code)
 
             return Response(
                 {"error": "Email not verified. A new verification code has been sent."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # If user is verified, proceed with normal login
-        response = super().post(request, *args, **kwargs)
+        # If user is verified, check the password and issue the token pair
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
+        response = Response(serializer.validated_data, status=status.HTTP_200_OK)
         response.data["user"] = {
             "id": user.id,
             "email": user.email,
@@ -291,14 +334,38 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
         return response
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["user"] = getattr(self, "user", None)
+        return context
+
 ### User profile    
 class UserProfileView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    query_budget = 2
 
     def get(self, request):
-        user = request.user
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data)
+        data, etag = get_profile_cache().get(request.user, self.serialize)
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response["ETag"] = etag
+        # Let the browser keep the profile but revalidate it with If-None-Match every time.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    @staticmethod
+    def serialize(user):
+        # A fresh row, not the user cache's copy: the entry is shared by every worker, and a
+        # copy cached here before another worker's update would be served to all of them.
+        try:
+            return UserProfileSerializer(User.objects.get(pk=user.pk)).data
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
 
     def put(self, request):
         user = request.user
@@ -306,14 +373,18 @@ class UserProfileView(APIView):
 
         if serializer.is_valid():
             serializer.save()
+            invalidate_profile(user.id)
+            invalidate_user(user.id)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 ### Change Email
 class ChangeEmailView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [SharedScopedRateThrottle]
     throttle_scope = "change_email"
+    query_budget = 4
 
     def post(self, request):
         new_email = request.data.get("new_email")
@@ -325,19 +396,19 @@ class ChangeEmailView(APIView):
         except ValidationError:
             return Response({"error": "Invalid email format."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if User.objects.filter(email=new_email).exists():
+        if User.objects.filter_email(new_email).exists():
             return Response({"error": "This email is already in use."}, status=status.HTTP_400_BAD_REQUEST)
 
         user = request.user
 
-        if user.email_change_code_sent_at and (now() - user.email_change_code_sent_at < timedelta(seconds=60)):
+        if not user.claim_email_change_request():
             return Response({"error": "Please wait before requesting another email change."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
 
         verification_code = generate_verification_code()
         user.pending_email = new_email
         user.email_change_code = verification_code
         user.email_change_code_sent_at = now()
-        user.save()
+        user.save(update_fields=["pending_email", "email_change_code", "email_change_code_sent_at"])
 
         send_verification_email(new_email, verification_code)
 
@@ -345,7 +416,9 @@ class ChangeEmailView(APIView):
 
 ### Verify New Email
 class VerifyNewEmailView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    query_budget = 2
 
     def post(self, request):
         code = request.data.get("code")
@@ -353,24 +426,28 @@ class VerifyNewEmailView(APIView):
             return Response({"error": "Verification code is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         user = request.user
-        if user.email_change_code != code:
-            return Response({"error": "Invalid verification code."}, status=status.HTTP_400_BAD_REQUEST)
-
-        expiration = user.email_change_code_sent_at + timedelta(hours=1)
-        if now() > expiration:
+        try:
+            with transaction.atomic():
+                changed = User.objects.confirm_email_change(user.id, code)
+        except IntegrityError:
+            # Another account took the address after the code was sent.
+            return Response({"error": "This email is already in use."}, status=status.HTTP_400_BAD_REQUEST)
+        if not changed:
+            pending = User.objects.filter(id=user.id).values("email_change_code", "pending_email").get()
+            if pending["email_change_code"] != code or not pending["pending_email"]:
+                return Response({"error": "Invalid verification code."}, status=status.HTTP_400_BAD_REQUEST)
             return Response({"error": "Verification code has expired."}, status=status.HTTP_400_BAD_REQUEST)
 
-        user.email = user.pending_email
-        user.pending_email = None
-        user.email_change_code = None
-        user.email_change_code_sent_at = None
-        user.save()
+        invalidate_profile(user.id)
+        invalidate_user(user.id)
 
         return Response({"message": "Email updated successfully."}, status=status.HTTP_200_OK)
 
 ### Change Password
 class ChangePasswordView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    query_budget = 4
 
     def post(self, request):
         old_password = request.data.get("old_password")
@@ -387,47 +464,224 @@ class ChangePasswordView(APIView):
 
         user = request.user
 
-        if not user.check_password(old_password):
+        if not password_hashing.check_password(user, old_password):
             return Response({"error": "Old password is incorrect."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        if user.check_password(new_password):
+        # The old password was just verified, so comparing the strings is enough.
+        if new_password == old_password:
             return Response({"error": "Your new password cannot be the same as your old password."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        if len(new_password) < 8:
-            return Response({"error": "Password must be at least 8 characters long."},
-                            status=status.HTTP_400_BAD_REQUEST)
-        if not re.search(r"[A-Z]", new_password) or not re.search(r"[a-z]", new_password):
-            return Response({"error": "Password must contain at least one uppercase and one lowercase letter."},
-                            status=status.HTTP_400_BAD_REQUEST)
-        if not re.search(r"\d", new_password):
-            return Response({"error": "Password must contain at least one number."},
-                            status=status.HTTP_400_BAD_REQUEST)
-        if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", new_password):
-            return Response({"error": "Password must contain at least one special character."},
-                            status=status.HTTP_400_BAD_REQUEST)
-        email_username = user.email.split("@")[0].lower()
-        if email_username in new_password.lower():
-            return Response({"error": "Password is too similar to the email."},
-                            status=status.HTTP_400_BAD_REQUEST)
+        violations = validate_password(new_password, user.email)
+        if violations:
+            return Response({"error": violations[0], "errors": violations}, status=status.HTTP_400_BAD_REQUEST)
 
-        user.set_password(new_password)
-        user.save()
+        password_hashing.set_password(user, new_password)
+        user.save(update_fields=["password"])
+        invalidate_user(user.id)
+
+        # Sign out every other session; this one continues with a fresh token pair.
+        user.token_version = revoke_tokens(user.id)[user.id]
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
 
-        return Response({"message": "Password updated successfully."}, status=status.HTTP_200_OK)
+        return Response(
+            {"message": "Password updated successfully.", "refresh": str(refresh), "access": str(refresh.access_token)},
+            status=status.HTTP_200_OK,
+        )
 
 ### Admin: Get All Users
 class AdminUserListView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    query_budget = 1
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            page_size = int(params.get("page_size", ADMIN_USER_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "page_size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            users = filter_users(params)
+            page, next_cursor = paginate_users(
+                users,
+                ordering=params.get("ordering", "id"),
+                cursor=params.get("cursor"),
+                page_size=min(max(page_size, 1), ADMIN_USER_MAX_PAGE_SIZE),
+            )
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": page, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+### Admin: Export Users
+class AdminUserExportView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+    def get(self, request):
+        params = request.query_params
+        # Not "format": DRF reserves that parameter for renderer negotiation.
+        output = params.get("output", "ndjson")
+        if output not in self.CONTENT_TYPES:
+            return Response({"error": "Output must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            fields = parse_export_fields(params.get("fields"))
+            users = filter_users(params)
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_users(users, fields, output), content_type=self.CONTENT_TYPES[output])
+        response["Content-Disposition"] = f'attachment; filename="users.{output}"'
+        return response
+
+### Admin: Bulk User Operations
+class AdminUserBulkView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    query_budget = 4
+
+    def post(self, request):
+        action = request.data.get("action")
+        ids = request.data.get("ids")
+        filters = request.data.get("filter")
+
+        if action not in ADMIN_BULK_ACTIONS:
+            return Response({"error": f"Action must be one of: {', '.join(ADMIN_BULK_ACTIONS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if (ids is None) == (filters is None):
+            return Response({"error": "Provide either a list of ids or a filter."}, status=status.HTTP_400_BAD_REQUEST)
+
+        users = None
+        if ids is not None:
+            if not isinstance(ids, list) or not all(
+                isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in ids
+            ):
+                return Response({"error": "Ids must be a list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            if not isinstance(filters, dict):
+                return Response({"error": "Filter must be an object."}, status=status.HTTP_400_BAD_REQUEST)
+            unknown = [key for key in filters if key not in ADMIN_USER_FILTERS]
+            if unknown:
+                return Response({"error": f"Unknown filter(s): {', '.join(map(str, unknown))}. "
+                                          f"Allowed: {', '.join(ADMIN_USER_FILTERS)}."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            # An empty filter would match every account; require at least one condition.
+            if not any(value not in (None, "") for value in filters.values()):
+                return Response({"error": "Filter must contain at least one condition."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                users = filter_users(filters)
+            except ValueError as ex:
+                return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        affected = bulk_apply(action, ids=ids, users=users, exclude_id=request.user.id)
+        refresh_revocations()
+
+        return Response({"message": f"Bulk {action} applied.", "affected": affected}, status=status.HTTP_200_OK)
+
+### Admin: Database Connection Pool
+class AdminDatabasePoolView(APIView):
+    """Connection pool usage of the worker process that answers."""
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    query_budget = 0
+
+    def get(self, request):
+        return Response(pool_stats())
+
+### Admin: Metrics
+class AdminMetricsView(APIView):
+    """Request metrics of the worker process that answers, for a Prometheus scrape."""
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    query_budget = 0
+
+    def get(self, request):
+        gauges = [
+            (f"users_db_pool_{key}", f"Connection pool {key.replace('_', ' ')}.", value)
+            for key, value in pool_stats().items() if key != "mode"
+        ]
+        return HttpResponse(metrics.render(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+class AdminSlowQueriesView(APIView):
+    """The slowest recent SQL statements sampled by the worker process that answers."""
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    query_budget = 0
+
+    def get(self, request):
+        return Response(metrics.slow_query_samples())
+
+### Admin: Profiling
+class AdminProfilerView(APIView):
+    """Starts, inspects and stops the sampling profiler session shared by all workers."""
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAdminUser]
+    query_budget = 0
 
     def get(self, request):
-        users = User.objects.all().values("id", "email", "is_active", "is_staff")
-        return Response(users, status=status.HTTP_200_OK)
+        return Response({"session": profiler.current_session(), "captures": profiler.sessions_on_disk()})
+
+    def post(self, request):
+        route = request.data.get("route")
+        if route not in profiler.route_names():
+            return Response({"error": "Route must be the name of a route in users/urls.py."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rate = float(request.data.get("rate", 0.1))
+            duration = int(request.data.get("duration", 300))
+        except (TypeError, ValueError):
+            return Response({"error": "Rate and duration must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            trace_allocations = serializers.BooleanField().to_internal_value(request.data.get("tracemalloc", False))
+        except serializers.ValidationError:
+            return Response({"error": "tracemalloc must be a boolean."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < rate <= 1 or not 0 < duration <= profiler.MAX_DURATION:
+            return Response(
+                {"error": f"Rate must be in (0, 1] and duration between 1 and {profiler.MAX_DURATION} seconds."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session = profiler.start_session(route, rate, duration, trace_allocations)
+        return Response(session, status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        profiler.stop_session()
+        return Response({"message": "Profiling stopped."})
+
+class AdminProfileCaptureView(APIView):
+    """What the workers captured for one session: a folded flamegraph or the top allocations."""
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    query_budget = 0
+
+    def get(self, request, session_id):
+        output = request.query_params.get("output", "flamegraph")
+        if output == "allocations":
+            return Response({"allocations": profiler.top_allocations(session_id)})
+        if output != "flamegraph":
+            return Response({"error": "Output must be 'flamegraph' or 'allocations'."}, status=status.HTTP_400_BAD_REQUEST)
+        if not profiler.captured_files(session_id, "folded"):
+            return Response({"error": "Nothing captured for this session."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = HttpResponse(profiler.merged_flamegraph(session_id), content_type="text/plain; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="profile-{session_id}.folded"'
+        return response
+
+    def delete(self, request, session_id):
+        return Response({"message": "Capture deleted.", "files": profiler.delete_captures(session_id)})
 
 ### Admin: Manage Users
 class AdminUserDetailView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAdminUser]
+    query_budget = 8
 
     def get(self, request, user_id):
         user = self.get_user(user_id)
@@ -436,26 +690,30 @@ class AdminUserDetailView(APIView):
         return Response({"id": user.id, "email": user.email, "is_active": user.is_active, "is_staff": user.is_staff})
 
     def put(self, request, user_id):
-        user = self.get_user(user_id)
-        if not user:
+        flags = {
+            field: bool(request.data[field])
+            for field in ("is_active", "is_staff")
+            if request.data.get(field) is not None
+        }
+        if User.objects.set_flags(user_id, **flags):
+            invalidate_profile(user_id)
+            invalidate_user(user_id)
+            # Outstanding tokens carry the old flags as claims.
+            revoke_tokens(user_id)
+        elif not User.objects.filter(id=user_id).exists():
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        is_active = request.data.get("is_active")
-        is_staff = request.data.get("is_staff")
-
-        if is_active is not None:
-            user.is_active = bool(is_active)
-        if is_staff is not None:
-            user.is_staff = bool(is_staff)
-        user.save()
-
         return Response({"message": "User updated successfully"})
 
     def delete(self, request, user_id):
         user = self.get_user(user_id)
         if not user:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
-        user.delete()
+        with transaction.atomic():
+            revoke_deleted_users(user.id)
+            user.delete()
+        invalidate_profile(user_id)
+        invalidate_user(user_id)
         return Response({"message": "User deleted successfully"})
 
     def get_user(self, user_id):